@@ -1,6 +1,7 @@
 const fs = require("fs");
 const readline = require("readline");
 const { appendCSV } = require("../utils/csvUtils");
+const sqliteStore = require("../utils/sqliteStore");
 
 const path = require("path");
 const dietCSV = path.join(__dirname, "../ml_model/data/diet_logs.csv");
@@ -30,6 +31,19 @@ exports.saveDiet = async (req, res) => {
     fooditem: fooditem.join("|")
   };
 
+  if (sqliteStore.enabled) {
+    // Indexed on (username, date), so the duplicate check doesn't scan the log
+    const exists = sqliteStore.get(
+      "SELECT 1 FROM diet_logs WHERE username = ? AND date = ? AND meal_type = ? LIMIT 1",
+      roundedEntry.username, roundedEntry.date, roundedEntry.meal_type
+    );
+    if (exists) {
+      return res.status(200).json({ message: "Entry already exists" });
+    }
+    sqliteStore.insertRow("diet_logs", roundedEntry);
+    return res.status(200).json({ message: "Diet saved successfully" });
+  }
+
   // Check if the entry already exists before saving
   const lineExists = await checkIfEntryExists(roundedEntry);
 
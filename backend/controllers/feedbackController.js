@@ -2,10 +2,11 @@ const fs = require("fs");
 const path = require("path");
 const readline = require("readline");
 const { ensureCSV, readCSV, appendCSV, writeCSV } = require("../utils/csvUtils");
+const sqliteStore = require("../utils/sqliteStore");
 
 const feedbackCSV = path.join(__dirname, "../ml_model/data/feedback_logs.csv");
 
-ensureCSV(feedbackCSV, [
+if (!sqliteStore.enabled) ensureCSV(feedbackCSV, [
   "username", "date", "exercise_name", "category", "actual_reps", "actual_weight", "number_of_sets",
   "pain_level", "intensity", "fitness_level", "gender", "bicep_cm", "chest_cm", "shoulder_cm",
   "lat_cm", "waist_cm", "abs_cm", "thigh_cm", "calf_cm", "blood_sugar_mg_dl", "cholesterol_mg_dl",
@@ -27,14 +28,18 @@ exports.saveFeedback = (req, res) => {
     return res.status(400).json({ error: "Missing required fields." });
   }
 
-  const data = readCSV(feedbackCSV);
-
-  const alreadyExists = data.some(entry =>
-    entry.username.toLowerCase() === username.toLowerCase() &&
-    entry.date === date &&
-    entry.exercise_name.toLowerCase() === exercise_name.toLowerCase() &&
-    entry.category.toLowerCase() === category.toLowerCase()
-  );
+  const alreadyExists = sqliteStore.enabled
+    ? Boolean(sqliteStore.get(
+        "SELECT 1 FROM feedback_logs WHERE username = ? COLLATE NOCASE AND date = ? " +
+        "AND exercise_name = ? COLLATE NOCASE AND category = ? COLLATE NOCASE LIMIT 1",
+        username, date, exercise_name, category
+      ))
+    : readCSV(feedbackCSV).some(entry =>
+        entry.username.toLowerCase() === username.toLowerCase() &&
+        entry.date === date &&
+        entry.exercise_name.toLowerCase() === exercise_name.toLowerCase() &&
+        entry.category.toLowerCase() === category.toLowerCase()
+      );
 
   if (alreadyExists) {
     return res.status(409).json({
@@ -68,7 +73,11 @@ exports.saveFeedback = (req, res) => {
     weight_kg: Math.round(weight_kg || 0)
   };
 
-  appendCSV(feedbackCSV, entry);
+  if (sqliteStore.enabled) {
+    sqliteStore.insertRow("feedback_logs", entry);
+  } else {
+    appendCSV(feedbackCSV, entry);
+  }
 
   res.status(200).json({ message: "Feedback saved successfully." });
 };
@@ -79,13 +88,16 @@ exports.getFeedback = (req, res) => {
   const username = req.params.username.toLowerCase();
   const today = new Date().toISOString().split("T")[0]; // YYYY-MM-DD format
 
-  const data = readCSV(feedbackCSV);
-
   // Filter feedback for this user and today's date
-  const todayFeedback = data.filter(row => 
-    row.username.toLowerCase() === username &&
-    row.date === today
-  );
+  const todayFeedback = sqliteStore.enabled
+    ? sqliteStore.all(
+        "SELECT category, exercise_name FROM feedback_logs WHERE username = ? COLLATE NOCASE AND date = ?",
+        username, today
+      )
+    : readCSV(feedbackCSV).filter(row =>
+        row.username.toLowerCase() === username &&
+        row.date === today
+      );
 
   if (todayFeedback.length === 0) {
     return res.status(404).json({ error: "No feedback found for this user today." });
@@ -1,9 +1,10 @@
 const fs = require("fs");
 const path = require("path");
 const { ensureCSV, readCSV, writeCSV } = require("../utils/csvUtils");
+const sqliteStore = require("../utils/sqliteStore");
 
 const csvPath = path.join(__dirname, "../profile.csv");
-ensureCSV(csvPath, [
+if (!sqliteStore.enabled) ensureCSV(csvPath, [
   "username", "name", "age", "height_cm", "weight_kg", "email",
   "fitness_level", "gender",
   "bicep_cm", "chest_cm", "shoulder_cm", "lat_cm", "waist_cm", "abs_cm", "thigh_cm", "calf_cm",
@@ -20,39 +21,27 @@ exports.saveProfile = (req, res) => {
     return res.status(400).json({ error: "Username is required." });
   }
 
+  if (sqliteStore.enabled) {
+    // Only this user's row is read and rewritten
+    const existing = sqliteStore.get("SELECT * FROM user_profiles WHERE username = ?", username);
+    const profile = existing
+      ? mergeProfile(sqliteStore.asCSVRow(existing), input)
+      : newProfile(sqliteStore.columns("user_profiles"), input);
+    sqliteStore.upsertRow("user_profiles", "username", profile);
+    return res.status(200).json({ message: existing ? "Profile updated successfully." : "Profile saved successfully." });
+  }
+
   const data = readCSV(csvPath);
   const index = data.findIndex(row => row.username === username);
   let message = "";
 
   if (index !== -1) {
-    // Existing user — update only provided fields
-    const existingProfile = data[index];
-    const updatedProfile = { ...existingProfile };
-
-    for (let key in existingProfile) {
-      if (key === "dietary_restrictions") {
-        if (Array.isArray(input[key])) {
-          updatedProfile[key] = input[key].join("|");
-        }
-      } else if (input[key] !== undefined && input[key] !== "") {
-        updatedProfile[key] = input[key];
-      }
-    }
-
-    data[index] = updatedProfile;
+    data[index] = mergeProfile(data[index], input);
     message = "Profile updated successfully.";
   } else {
     // New user — create full profile, fill missing fields with empty string
     const headers = Object.keys(readCSV(csvPath)[0] || {});
-    const newProfile = {};
-    headers.forEach(header => {
-      if (header === "dietary_restrictions" && Array.isArray(input[header])) {
-        newProfile[header] = input[header].join("|");
-      } else {
-        newProfile[header] = input[header] || "";
-      }
-    });
-    data.push(newProfile);
+    data.push(newProfile(headers, input));
     message = "Profile saved successfully.";
   }
 
@@ -60,10 +49,45 @@ exports.saveProfile = (req, res) => {
   return res.status(200).json({ message });
 };
 
+// Existing user — update only provided fields
+function mergeProfile(existingProfile, input) {
+  const updatedProfile = { ...existingProfile };
+
+  for (let key in existingProfile) {
+    if (key === "dietary_restrictions") {
+      if (Array.isArray(input[key])) {
+        updatedProfile[key] = input[key].join("|");
+      }
+    } else if (input[key] !== undefined && input[key] !== "") {
+      updatedProfile[key] = input[key];
+    }
+  }
+
+  return updatedProfile;
+}
+
+// New user — create full profile, fill missing fields with empty string
+function newProfile(headers, input) {
+  const profile = {};
+  headers.forEach(header => {
+    if (header === "dietary_restrictions" && Array.isArray(input[header])) {
+      profile[header] = input[header].join("|");
+    } else {
+      profile[header] = input[header] || "";
+    }
+  });
+  return profile;
+}
+
 exports.getProfile = (req, res) => {
   const username = req.params.username.toLowerCase();
-  const data = readCSV(csvPath);
-  const profile = data.find(row => row.username.toLowerCase() === username);
+  let profile;
+  if (sqliteStore.enabled) {
+    const row = sqliteStore.get("SELECT * FROM user_profiles WHERE username = ? COLLATE NOCASE LIMIT 1", username);
+    profile = row && sqliteStore.asCSVRow(row);
+  } else {
+    profile = readCSV(csvPath).find(row => row.username.toLowerCase() === username);
+  }
 
   if (profile) {
     if (profile.dietary_restrictions) {
@@ -1,7 +1,24 @@
 # app.py
-from flask import Flask, request, jsonify
-from model.recommender import recommend_meals
-from model.workout import recommend_workout, load_model_and_scalers, train_workout_model
+import time
+PROCESS_START = time.time()
+
+from flask import Flask, Response, request, jsonify, g, make_response, send_file
+from model.recommender import DEFAULT_FORECASTER, DEFAULT_PLANNER, PLANNERS, diet_data_version, recommend_meals, recommend_meals_batch
+from model.forecaster_registry import default_registry as forecaster_registry
+from model.global_forecaster import global_forecaster_status
+from model.daily_macros import default_daily_macros as daily_macros
+from model.food_catalog import get_food_catalog
+from model.batcher import InferenceBatcher, BatchedModel
+from model.metrics import default_metrics as stage_metrics, set_endpoint, reset_endpoint
+from model.profiler import default_profiler as request_profiler
+from model.response_cache import default_response_cache as response_cache
+from model.precompute import default_precomputed as precomputed
+from model.bootstrap import ModelBootstrap, ModelNotReady, training_progress_callback
+from model.model_store import ModelStore, artifact_paths, current_model_dir
+from model.numpy_backend import load_numpy_model_and_scalers
+from model.workout import (recommend_workout, recommend_workout_batch, load_model_and_scalers, train_workout_model,
+                           uses_exercise_encoding, workout_data_version)
+import functools
 import logging
 import os
 
@@ -10,52 +27,308 @@ logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 MODEL_DIR = "models"
-MODEL_PATH = os.path.join(MODEL_DIR, "workout_model.h5")
-SCALER_X_PATH = os.path.join(MODEL_DIR, "scaler_X.pkl")
-SCALER_Y_PATH = os.path.join(MODEL_DIR, "scaler_y.pkl")
+# "numpy" serves the exported weights without TensorFlow; "keras" loads the .h5 model
+WORKOUT_BACKEND = os.environ.get("WORKOUT_BACKEND", "numpy")
 FEEDBACK_CSV = "data/feedback_logs.csv"
+MAX_BATCH_USERS = int(os.environ.get("MAX_BATCH_USERS", 5000))
+# On by default: concurrent predicts (threaded workers, the Flask dev server)
+# share forward passes, and a lone request is dispatched without waiting, so
+# non-threaded serve.py workers only pay the thread handoff (~15us)
+INFERENCE_BATCHING = os.environ.get("INFERENCE_BATCHING", "1") == "1"
+# When set, the profile flag must carry this value
+PROFILE_TOKEN = os.environ.get("PROFILE_TOKEN")
+TRAIN_EPOCHS = 50
+# Set by serve.py, which loads the model before forking workers and starts the
+# background threads (bootstrap, model watcher) itself, in the right process
+PREFORK = os.environ.get("ML_PREFORK") == "1"
+
+# Group concurrent workout predicts into shared forward passes
+inference_batcher = InferenceBatcher()
+
+# Load the model and scalers saved in model_dir with the configured backend
+def load_workout_bundle(model_dir):
+    paths = artifact_paths(model_dir)
+    if WORKOUT_BACKEND == "numpy" and os.path.exists(paths['npz']):
+        model, scaler_X, scaler_y = load_numpy_model_and_scalers(paths['npz'])
+    else:
+        if WORKOUT_BACKEND == "numpy":
+            logger.warning(f"{paths['npz']} not found; falling back to the Keras backend")
+        model, scaler_X, scaler_y = load_model_and_scalers(paths['model'], paths['scaler_X'], paths['scaler_y'])
+    if not uses_exercise_encoding(scaler_X):
+        logger.error(f"The workout model in {model_dir} was trained without exercise encoding, so every exercise "
+                     f"gets the same predicted reps and weight. Train a new one with train_workout_model (or "
+                     f"remove its artifacts and restart); retraining with model.retrain keeps the old features.")
 
-# Ensure model and scalers are available
-def ensure_model_and_scalers():
-    if not (os.path.exists(MODEL_PATH) and os.path.exists(SCALER_X_PATH) and os.path.exists(SCALER_Y_PATH)):
+    if INFERENCE_BATCHING:
+        model = BatchedModel(model, inference_batcher)
+    return model, scaler_X, scaler_y
+
+# Serves the current model version; retrained versions published by
+# `python -m model.retrain` are swapped in by the store's watcher thread
+workout_store = ModelStore(load_workout_bundle, base_dir=MODEL_DIR)
+
+# Ensure model and scalers are available. Runs on the bootstrap thread, training
+# a new model first if none has been saved yet.
+def ensure_model_and_scalers(bootstrap):
+    paths = artifact_paths(current_model_dir(base_dir=MODEL_DIR))
+    if not (os.path.exists(paths['model']) and os.path.exists(paths['scaler_X']) and os.path.exists(paths['scaler_y'])):
         logger.warning("Model or scaler files not found. Training new model...")
-        train_workout_model(csv_path=FEEDBACK_CSV, save_dir=MODEL_DIR)
+        bootstrap.set_state("training", epoch=0, epochs=TRAIN_EPOCHS)
+        train_workout_model(csv_path=FEEDBACK_CSV, save_dir=MODEL_DIR, epochs=TRAIN_EPOCHS, verbose=0,
+                            callbacks=[training_progress_callback(bootstrap, TRAIN_EPOCHS)])
         logger.info("Workout model and scalers trained and saved.")
 
-    return load_model_and_scalers()
+    bootstrap.set_state("loading", backend=WORKOUT_BACKEND)
+    workout_store.refresh()
+    if not PREFORK:
+        workout_store.start_watcher()
+    startup_timings['model_ready_seconds'] = round(time.time() - PROCESS_START, 3)
+    return workout_store.get()
+
+# Cold-start timings, all relative to process start
+startup_timings = {}
+
+# Load workout model and scalers in the background; routes that need them
+# answer 503 until /readyz reports ready
+workout_bootstrap = ModelBootstrap(ensure_model_and_scalers)
+if not PREFORK:
+    workout_bootstrap.start()
+
+def not_ready_response():
+    return jsonify({'error': 'Workout model is not ready yet', 'status': workout_bootstrap.status()}), 503
+
+# Label stage timings recorded while handling a request with its route
+@app.before_request
+def label_stage_metrics():
+    g.metrics_token = set_endpoint(request.url_rule.rule if request.url_rule else 'unmatched')
+
+@app.teardown_request
+def unlabel_stage_metrics(exc):
+    token = g.pop('metrics_token', None)
+    if token is not None:
+        reset_endpoint(token)
+
+@app.after_request
+def record_first_request(response):
+    if 'first_request_seconds' not in startup_timings and request.endpoint not in ('healthz', 'readyz', 'metrics'):
+        startup_timings['first_request_seconds'] = round(time.time() - PROCESS_START, 3)
+        logger.info(f"First request served {startup_timings['first_request_seconds']}s after process start")
+    return response
 
-# Load workout model and scalers once at startup
-workout_model, scaler_X, scaler_y = ensure_model_and_scalers()
+# Profile a request when it carries "X-Profile: 1" or "?profile=1" (or the
+# PROFILE_TOKEN value if configured). Profiles are rate-limited; the response
+# names the saved profile in X-Profile-Id, or why none was taken.
+def profiled(view):
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        flag = request.headers.get('X-Profile') or request.args.get('profile')
+        if not flag or flag != (PROFILE_TOKEN or '1'):
+            return view(*args, **kwargs)
+        if not request_profiler.acquire():
+            response = make_response(view(*args, **kwargs))
+            response.headers['X-Profile-Status'] = 'rate-limited'
+            return response
+        try:
+            result = request_profiler.run(request.path, lambda: make_response(view(*args, **kwargs)))
+        finally:
+            request_profiler.release()
+        response = result.value
+        if result.profile_id:
+            response.headers['X-Profile-Id'] = result.profile_id
+            response.headers['X-Profile-Url'] = f"/profiles/{result.profile_id}.txt"
+        return response
+    return wrapper
+
+# Whether this request may be answered from stored results (the response
+# cache or the precomputed table); "Cache-Control: no-cache" and profiled
+# requests always recompute
+def stored_results_allowed():
+    return (request.headers.get('Cache-Control') != 'no-cache'
+            and not (request.headers.get('X-Profile') or request.args.get('profile')))
+
+def cache_lookup(key):
+    with stage_metrics.stage('response_cache'):
+        return response_cache.get(*key)
+
+# A stored result for key and its X-Cache status ("hit" from the response
+# cache, "precomputed" from the nightly table), or (None, None)
+def stored_lookup(key):
+    if response_cache.enabled:
+        cached = cache_lookup(key)
+        if cached is not None:
+            return cached, 'hit'
+    with stage_metrics.stage('precomputed'):
+        stored = precomputed.get(*key)
+    if stored is None:
+        return None, None
+    if response_cache.enabled:
+        response_cache.put(*key, stored)
+    return stored, 'precomputed'
+
+def json_response(result, cache_status):
+    response = jsonify(result)
+    response.headers['X-Cache'] = cache_status
+    return response
 
 @app.route("/recommend-diet", methods=["POST"])
+@profiled
 def recommend_diet():
     data = request.get_json()
     username = data.get("username")
+    planner = data.get("planner")
 
     if not username:
         return jsonify({"error": "Username is required"}), 400
+    if planner is not None and planner not in PLANNERS:
+        return jsonify({"error": f"planner must be one of {', '.join(PLANNERS)}"}), 400
+
+    cache_key = None
+    if stored_results_allowed():
+        cache_key = ("/recommend-diet", username, diet_data_version(username), planner or DEFAULT_PLANNER)
+        stored, status = stored_lookup(cache_key)
+        if stored is not None:
+            return json_response(stored, status)
 
-    result = recommend_meals(username)
+    result = recommend_meals(username, planner)
 
     if result is None:
         return jsonify({"error": "No recommendation generated"}), 500
 
-    return jsonify(result)
+    if cache_key and response_cache.enabled:
+        response_cache.put(*cache_key, result)
+    return json_response(result, "miss" if cache_key else "bypass")
 
 @app.route('/recommend-workout', methods=['POST'])
+@profiled
 def recommend_workout_route():
     data = request.get_json()
     username = data.get('username')
     if not username:
         return jsonify({'error': 'Username is required'}), 400
 
+    try:
+        (workout_model, scaler_X, scaler_y), model_version = workout_store.current()
+    except ModelNotReady:
+        return not_ready_response()
+
+    cache_key = None
+    if stored_results_allowed():
+        cache_key = ('/recommend-workout', username, workout_data_version(username), model_version)
+        stored, status = stored_lookup(cache_key)
+        if stored is not None:
+            return json_response(stored, status), 200
+
     try:
         result = recommend_workout(username, model=workout_model, scaler_X=scaler_X, scaler_y=scaler_y)
-        return jsonify(result), 200
+        if cache_key and response_cache.enabled:
+            response_cache.put(*cache_key, result)
+        return json_response(result, 'miss' if cache_key else 'bypass'), 200
     except Exception as e:
         logger.error(f"Workout recommendation failed: {e}")
         return jsonify({'error': str(e)}), 500
 
+# Validate {"usernames": [...]} batch payloads; returns (usernames, error_response)
+def parse_batch_usernames(data):
+    usernames = (data or {}).get('usernames')
+    if not isinstance(usernames, list) or not usernames:
+        return None, (jsonify({'error': 'A non-empty list of usernames is required'}), 400)
+    if len(usernames) > MAX_BATCH_USERS:
+        return None, (jsonify({'error': f'At most {MAX_BATCH_USERS} usernames per batch'}), 400)
+    return usernames, None
+
+@app.route('/recommend-diet/batch', methods=['POST'])
+def recommend_diet_batch():
+    data = request.get_json()
+    usernames, error = parse_batch_usernames(data)
+    if error:
+        return error
+    planner = data.get('planner')
+    if planner is not None and planner not in PLANNERS:
+        return jsonify({'error': f"planner must be one of {', '.join(PLANNERS)}"}), 400
+
+    try:
+        return jsonify({'results': recommend_meals_batch(usernames, planner)}), 200
+    except Exception as e:
+        logger.error(f"Batch diet recommendation failed: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/recommend-workout/batch', methods=['POST'])
+def recommend_workout_batch_route():
+    usernames, error = parse_batch_usernames(request.get_json())
+    if error:
+        return error
+
+    try:
+        workout_model, scaler_X, scaler_y = workout_store.get()
+    except ModelNotReady:
+        return not_ready_response()
+
+    try:
+        results = recommend_workout_batch(usernames, model=workout_model, scaler_X=scaler_X, scaler_y=scaler_y)
+        return jsonify({'results': results}), 200
+    except Exception as e:
+        logger.error(f"Batch workout recommendation failed: {e}")
+        return jsonify({'error': str(e)}), 500
+
+# Liveness: the process is up and serving (diet recommendations work even
+# while the workout model is still loading)
+@app.route('/healthz', methods=['GET'])
+def healthz():
+    return jsonify({'status': 'ok', 'uptime_seconds': round(time.time() - PROCESS_START, 3),
+                    'startup': startup_timings, 'workout_model': workout_bootstrap.status()}), 200
+
+# Readiness: every route, including /recommend-workout, can be served
+@app.route('/readyz', methods=['GET'])
+def readyz():
+    status = dict(workout_bootstrap.status(), serving=workout_store.status())
+    if workout_store.ready():
+        # False for legacy models that predict the same targets for every exercise
+        status['exercise_encoding'] = uses_exercise_encoding(workout_store.get()[1])
+    return jsonify({'ready': workout_store.ready(), 'workout_model': status}), 200 if workout_store.ready() else 503
+
+@app.route('/inference/stats', methods=['GET'])
+def inference_stats():
+    return jsonify(inference_batcher.stats()), 200
+
+# Per-stage latency histograms and response cache counters in Prometheus text format
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    return Response(stage_metrics.render_prometheus() + response_cache.render_prometheus(),
+                    mimetype='text/plain; version=0.0.4')
+
+@app.route('/cache/stats', methods=['GET'])
+def cache_stats():
+    return jsonify(response_cache.stats()), 200
+
+@app.route('/precomputed/stats', methods=['GET'])
+def precomputed_stats():
+    return jsonify(precomputed.stats()), 200
+
+@app.route('/profiles', methods=['GET'])
+def list_profiles():
+    return jsonify({'profiles': request_profiler.list()}), 200
+
+# <id>.txt is the readable report, <id>.pstats the raw cProfile data
+@app.route('/profiles/<profile_id>.<kind>', methods=['GET'])
+def download_profile(profile_id, kind):
+    path = request_profiler.path(profile_id, kind)
+    if path is None:
+        return jsonify({'error': 'Profile not found'}), 404
+    return send_file(os.path.abspath(path), as_attachment=kind == 'pstats')
+
+@app.route('/catalog/stats', methods=['GET'])
+def catalog_stats():
+    return jsonify(get_food_catalog().stats()), 200
+
+@app.route('/forecasters/stats', methods=['GET'])
+def forecaster_stats():
+    stats = dict(forecaster_registry.stats(), forecaster=DEFAULT_FORECASTER, global_model=global_forecaster_status(),
+                 daily_macros=daily_macros.stats())
+    return jsonify(stats), 200
+
+startup_timings['import_seconds'] = round(time.time() - PROCESS_START, 3)
+
+# Development server; use serve.py for multi-worker production serving
 if __name__ == '__main__':
     logger.info("Starting the Flask server...")
     app.run(debug=True, host='0.0.0.0', port=5001)
@@ -0,0 +1,72 @@
+# Cold-start time of the Flask service, measured from outside the process.
+#
+# Starts the app in a fresh interpreter, then polls until /healthz answers
+# (port bound), until a /recommend-diet request succeeds (first served
+# request) and until /readyz reports the workout model ready. Prints the
+# client-side timings next to the server's own startup timings. Run from
+# backend/ml_model:
+#
+#     python -m benchmarks.bench_cold_start --username some_user
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+
+LAUNCH = "import app; app.app.run(host='127.0.0.1', port={port}, debug=False, threaded=True)"
+
+
+def request(url, payload=None, timeout=5):
+    data = json.dumps(payload).encode() if payload is not None else None
+    req = urllib.request.Request(url, data=data, headers={'Content-Type': 'application/json'})
+    try:
+        with urllib.request.urlopen(req, timeout=timeout) as resp:
+            return resp.status, json.loads(resp.read() or b'null')
+    except urllib.error.HTTPError as e:
+        return e.code, json.loads(e.read() or b'null')
+    except (urllib.error.URLError, ConnectionError):
+        return None, None
+
+
+def wait_for(check, deadline, interval=0.02):
+    while time.perf_counter() < deadline:
+        if check():
+            return time.perf_counter()
+        time.sleep(interval)
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--port', type=int, default=5055)
+    parser.add_argument('--username', default=None, help='user to request a diet recommendation for')
+    parser.add_argument('--timeout', type=float, default=600)
+    args = parser.parse_args()
+
+    base = f"http://127.0.0.1:{args.port}"
+    start = time.perf_counter()
+    deadline = start + args.timeout
+    proc = subprocess.Popen([sys.executable, '-c', LAUNCH.format(port=args.port)],
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                            env={**os.environ, 'TF_CPP_MIN_LOG_LEVEL': '3'})
+    try:
+        results = {}
+        up = wait_for(lambda: request(base + '/healthz')[0] == 200, deadline)
+        results['healthz_seconds'] = up and up - start
+        if args.username:
+            served = wait_for(lambda: request(base + '/recommend-diet', {'username': args.username}, timeout=120)[0] == 200, deadline)
+            results['first_diet_request_seconds'] = served and served - start
+        ready = wait_for(lambda: request(base + '/readyz')[0] == 200, deadline, interval=0.1)
+        results['ready_seconds'] = ready and ready - start
+        results['server_startup'] = request(base + '/healthz')[1].get('startup')
+        print(json.dumps(results, indent=2))
+    finally:
+        proc.terminate()
+        proc.wait()
+
+
+if __name__ == '__main__':
+    main()
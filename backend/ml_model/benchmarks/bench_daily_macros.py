@@ -0,0 +1,88 @@
+# Cost of getting one user's forecast windows as their diet history grows.
+#
+# For each history length a synthetic log of one user (three meals a day)
+# is built. Then, for --appends rows appended one at a time to the current
+# day, the time to get that user's 7-day windows is measured two ways:
+#
+#   regroup  what recommend_meals did: sort and group the user's whole log
+#            by date (get_user_sequence), then build the windows with a
+#            Python loop and np.array
+#   store    DailyMacroStore: add the appended row to the current day, then
+#            take sliding-window views over the user's daily totals
+#
+# Both produce the same windows. Run from backend/ml_model:
+#
+#     python -m benchmarks.bench_daily_macros
+import argparse
+import logging
+import time
+import numpy as np
+import pandas as pd
+from model.daily_macros import DailyMacroStore
+from model.forecaster_registry import WINDOW_SIZE
+from model.recommender import get_user_sequence
+from model.schema import DIET_LOG_SCHEMA
+
+
+class FrameSnapshot:
+    def __init__(self, frame):
+        self.frame = frame
+        self.generation = 0
+        self.settled_rows = len(frame)
+
+
+def synthetic_logs(days, appends, seed=0):
+    rng = np.random.default_rng(seed)
+    dates = np.repeat(pd.date_range('2020-01-01', periods=days).strftime('%Y-%m-%d'), 3)
+    # The appended rows all land on the last day
+    dates = np.r_[dates, [dates[-1]] * appends]
+    n = len(dates)
+    return DIET_LOG_SCHEMA.apply(pd.DataFrame({
+        'username': 'bench', 'date': dates, 'weight_kg': 70.0,
+        'meal_type': np.resize(['breakfast', 'lunch', 'dinner'], n),
+        'calories': rng.normal(600, 150, n).round(), 'protein_g': rng.normal(30, 8, n).round(),
+        'carbs_g': rng.normal(70, 15, n).round(), 'fat_g': rng.normal(20, 6, n).round(), 'fooditem': 'Rice',
+    }))
+
+
+# The loop recommend_meals used to build windows with
+def loop_windows(data, window_size=WINDOW_SIZE):
+    X = []
+    for i in range(len(data) - window_size + 1):
+        X.append(data[i:i + window_size])
+    return np.array(X)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Per-request window building: regroup vs DailyMacroStore')
+    parser.add_argument('--days', type=int, nargs='+', default=[30, 365, 1095, 1825])
+    parser.add_argument('--appends', type=int, default=200, help='rows appended, one per request')
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+
+    print(f"{'days':>6} {'regroup ms':>12} {'store ms':>10} {'speedup':>8}")
+    for days in args.days:
+        logs = synthetic_logs(days, args.appends)
+        base = len(logs) - args.appends
+        slices = [logs.iloc[:base + i + 1] for i in range(args.appends)]
+
+        start = time.perf_counter()
+        for frame in slices:
+            regrouped = loop_windows(get_user_sequence(frame))
+        regroup = (time.perf_counter() - start) / args.appends
+
+        current = [FrameSnapshot(logs.iloc[:base])]
+        store = DailyMacroStore(source=lambda: current[0])
+        store.refresh()
+        start = time.perf_counter()
+        for frame in slices:
+            current[0] = FrameSnapshot(frame)
+            windows = store.windows('bench')
+        incremental = (time.perf_counter() - start) / args.appends
+
+        assert np.array_equal(regrouped, windows)
+        print(f"{days:>6} {regroup * 1e3:12.2f} {incremental * 1e3:10.2f} {regroup / incremental:7.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+# Accuracy and latency of the global diet forecaster vs one LSTM per user.
+#
+# Each user's last logged day is held out. The global model is trained on
+# every user's remaining days, the way `python -m model.global_forecaster
+# train` does offline, and forecasts the held-out day for all users in one
+# batched call. For a sample of --per-user-users users a ForecasterRegistry
+# (in a scratch directory, so nothing is reused from disk) fits the per-user
+# LSTM recommend_meals used to train on request. Both are compared on that
+# sample with the naive forecast (mean of the last WINDOW_SIZE days) by mean
+# absolute error and mean absolute percentage error per macro. Run from
+# backend/ml_model:
+#
+#     python -m benchmarks.synth_data --users 5000 --diet-days 30 --out /tmp/synth
+#     python -m benchmarks.bench_diet_forecaster --data /tmp/synth
+import argparse
+import logging
+import os
+import tempfile
+import time
+import warnings
+import numpy as np
+from model.forecaster_registry import WINDOW_SIZE, ForecasterRegistry
+from model.global_forecaster import MACRO_COLUMNS, TRAIN_EPOCHS, daily_sequences, train_global_forecaster
+from model.schema import DIET_LOG_SCHEMA
+
+
+def report(name, predicted, actual):
+    error = np.abs(predicted - actual)
+    mape = error / np.maximum(actual, 1.0)
+    print(f"{name:<20} " + ' '.join(f"{m:10.2f}" for m in error.mean(axis=0)) + ' '
+          + ' '.join(f"{m:9.1%}" for m in mape.mean(axis=0)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Global vs per-user diet forecaster accuracy')
+    parser.add_argument('--data', required=True, help='directory with data/, e.g. from synth_data')
+    parser.add_argument('--per-user-users', type=int, default=25,
+                        help='users to fit per-user LSTMs for (each takes seconds)')
+    parser.add_argument('--epochs', type=int, default=TRAIN_EPOCHS)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+    # build_lstm_model passes input_shape, which Keras 3 warns about per model
+    warnings.filterwarnings('ignore', category=UserWarning)
+
+    sequences = daily_sequences(DIET_LOG_SCHEMA.read_csv(os.path.join(args.data, 'data', 'diet_logs.csv')))
+    # The per-user LSTM needs at least one training window before the held-out day
+    users = [u for u, data in sequences.items() if len(data) > WINDOW_SIZE + 1]
+    if not users:
+        raise SystemExit(f"No user has more than {WINDOW_SIZE + 1} days of diet logs")
+    history = [sequences[u][:-1] for u in users]
+    actual = np.array([sequences[u][-1] for u in users])
+    print(f"{len(users)} users with {min(map(len, history))}-{max(map(len, history))} days of history")
+
+    start = time.perf_counter()
+    forecaster = train_global_forecaster(history, epochs=args.epochs)
+    train_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    global_predicted = np.array(forecaster.forecast_batch(history))
+    batch_seconds = time.perf_counter() - start
+    naive = np.array([data[-WINDOW_SIZE:].mean(axis=0) for data in history])
+
+    sample = np.random.default_rng(args.seed).choice(len(users), min(args.per_user_users, len(users)), replace=False)
+    per_user, per_user_seconds = [], []
+    with tempfile.TemporaryDirectory() as model_dir:
+        registry = ForecasterRegistry(model_dir=model_dir)
+        for i in sample:
+            start = time.perf_counter()
+            per_user.append(registry.forecast(users[i], history[i]))
+            per_user_seconds.append(time.perf_counter() - start)
+    per_user = np.array(per_user)
+
+    header = ' '.join(f"{'MAE ' + m[:7]:>10}" for m in MACRO_COLUMNS) + ' ' + ' '.join(
+        f"{'MAPE ' + m[:4]:>9}" for m in MACRO_COLUMNS)
+    print(f"\nHeld-out day, {len(sample)} sampled users\n{'forecaster':<20} {header}")
+    report('per-user LSTM', per_user, actual[sample])
+    report('global LSTM', global_predicted[sample], actual[sample])
+    report('naive 7-day mean', naive[sample], actual[sample])
+    print(f"\nHeld-out day, all {len(users)} users\n{'forecaster':<20} {header}")
+    report('global LSTM', global_predicted, actual)
+    report('naive 7-day mean', naive, actual)
+
+    print(f"\nglobal: trained offline in {train_seconds:.1f}s; forecast {len(users)} users in one call in "
+          f"{batch_seconds * 1000:.1f}ms ({batch_seconds / len(users) * 1e6:.1f}us/user)")
+    print(f"per-user: {np.mean(per_user_seconds):.2f}s/user to fit and forecast on request "
+          f"(p95 {np.percentile(per_user_seconds, 95):.2f}s)")
+
+
+if __name__ == '__main__':
+    main()
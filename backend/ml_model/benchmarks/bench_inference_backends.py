@@ -0,0 +1,90 @@
+# Keras vs NumPy workout-model inference: parity, latency and memory.
+#
+# Exports the Keras model to a temporary .npz, asserts both backends agree on
+# random inputs (the parity check), then times predict + inverse_transform
+# at several batch sizes. Peak RSS of a process that only loads each backend
+# is measured in a fresh subprocess. Run from backend/ml_model:
+#
+#     python -m benchmarks.bench_inference_backends
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import numpy as np
+
+LOAD_SNIPPETS = {
+    'keras': "from model.workout import load_model_and_scalers as load; m = load({model!r}, {sx!r}, {sy!r})",
+    'numpy': "from model.numpy_backend import load_numpy_model_and_scalers as load; m = load({npz!r})",
+}
+# VmHWM rather than ru_maxrss, which Linux carries over from the forking parent
+RSS_SNIPPET = ("import re, time; t = time.perf_counter(); {load}; "
+               "print(re.search(r'VmHWM:\\s+(\\d+)', open('/proc/self/status').read()).group(1), time.perf_counter() - t)")
+
+
+def peak_rss_and_load_time(backend, paths):
+    code = RSS_SNIPPET.format(load=LOAD_SNIPPETS[backend].format(**paths))
+    out = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True,
+                         env={**os.environ, 'TF_CPP_MIN_LOG_LEVEL': '3'})
+    rss_kb, seconds = out.stdout.split()[-2:]
+    return int(rss_kb) / 1024, float(seconds)
+
+
+def check_parity(keras_backend, numpy_backend, n_features, rows=2048, seed=0, rtol=1e-4, atol=1e-3):
+    rng = np.random.default_rng(seed)
+    X = rng.normal(size=(rows, n_features)) * 10 + 50
+    expected = keras_backend[2].inverse_transform(keras_backend[0].predict(keras_backend[1].transform(X), verbose=0))
+    actual = numpy_backend[2].inverse_transform(numpy_backend[0].predict(numpy_backend[1].transform(X)))
+    max_err = float(np.max(np.abs(expected - actual)))
+    assert np.allclose(expected, actual, rtol=rtol, atol=atol), f"NumPy backend diverges from Keras (max abs error {max_err})"
+    return max_err
+
+
+def time_predict(backend, X, repeat):
+    model, scaler_X, scaler_y = backend
+    start = time.perf_counter()
+    for _ in range(repeat):
+        scaler_y.inverse_transform(model.predict(scaler_X.transform(X), verbose=0))
+    return (time.perf_counter() - start) / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--model', default='models/workout_model.h5')
+    parser.add_argument('--scaler-x', default='models/scaler_X.pkl')
+    parser.add_argument('--scaler-y', default='models/scaler_y.pkl')
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[1, 84, 1024, 8192])
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    from model.workout import load_model_and_scalers
+    from model.numpy_backend import export_numpy_artifact, load_numpy_model_and_scalers
+
+    keras_backend = load_model_and_scalers(args.model, args.scaler_x, args.scaler_y)
+    with tempfile.TemporaryDirectory() as tmp:
+        npz = os.path.join(tmp, 'workout_model.npz')
+        export_numpy_artifact(*keras_backend, path=npz)
+        numpy_backend = load_numpy_model_and_scalers(npz)
+        n_features = keras_backend[1].n_features_in_
+
+        max_err = check_parity(keras_backend, numpy_backend, n_features)
+        print(f"parity: OK (max abs error {max_err:.2e} over 2048 random rows)")
+
+        print(f"{'rows':>6} {'keras ms':>10} {'numpy ms':>10} {'speedup':>8}")
+        rng = np.random.default_rng(1)
+        for rows in args.batch_sizes:
+            X = rng.normal(size=(rows, n_features)) * 10 + 50
+            keras_s = time_predict(keras_backend, X, args.repeat)
+            numpy_s = time_predict(numpy_backend, X, args.repeat)
+            print(f"{rows:>6} {keras_s * 1000:10.3f} {numpy_s * 1000:10.3f} {keras_s / numpy_s:7.1f}x")
+
+        paths = {'model': args.model, 'sx': args.scaler_x, 'sy': args.scaler_y, 'npz': npz}
+        print(f"{'backend':>8} {'peak RSS MB':>12} {'load s':>8}")
+        for backend in LOAD_SNIPPETS:
+            rss_mb, seconds = peak_rss_and_load_time(backend, paths)
+            print(f"{backend:>8} {rss_mb:12.1f} {seconds:8.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+# Greedy vs joint (KD-tree pruned) meal planning: latency and macro error.
+#
+# For each catalog size, plans a day for a set of random daily targets with
+# both planners, validates every plan (1.05x macro caps, no food repeated)
+# and reports per-plan latency percentiles and the mean weighted relative
+# macro error. The optimizer's first call, which builds its index, is timed
+# separately and its p95 is checked against --budget-ms. Run from
+# backend/ml_model:
+#
+#     python -m benchmarks.bench_meal_optimizer --sizes 1000 10000 50000 100000
+import argparse
+import time
+import numpy as np
+from benchmarks.bench_meal_selection import synthetic_catalog
+from model.meal_engine import FoodMatrix, MACRO_CAP, MACRO_KEYS, select_meal_from_matrix
+from model.meal_optimizer import macro_error, plan_day_optimized
+from model.recommender import MEAL_SHARES, calculate_macros
+
+
+# Daily targets like plan_meals produces: the calculate_macros split of a
+# calorie target, perturbed the way an intake forecast would be
+def random_day_targets(n, seed=0):
+    rng = np.random.default_rng(seed)
+    days = []
+    for calories in rng.uniform(1500, 3500, n):
+        daily = np.array(calculate_macros(calories)) * rng.normal(1, 0.1, 4)
+        days.append({meal: {k: float(v * share) for k, v in zip(MACRO_KEYS, daily)} for meal, share in MEAL_SHARES})
+    return days
+
+
+def plan_greedy(matrix, day):
+    used, plan = [], {}
+    for meal, target in day.items():
+        plan[meal] = select_meal_from_matrix(matrix, target, used)
+        used.extend(plan[meal])
+    return plan
+
+
+# Mean per-meal error of a plan; raises if it breaks the cap or no-repeat rule
+def evaluate(lookup, plan, day, check_repeats):
+    names = [name for items in plan.values() for name in items]
+    if check_repeats and len(names) != len(set(names)):
+        raise AssertionError(f"food repeated in plan {plan}")
+    errors = []
+    for meal, items in plan.items():
+        target = np.array([day[meal][k] for k in MACRO_KEYS])
+        total = sum((lookup[name] for name in items), np.zeros(4))
+        if np.any(total > target * MACRO_CAP + 1e-9):
+            raise AssertionError(f"{meal} exceeds the macro cap: {total} vs {target}")
+        errors.append(macro_error(total, target))
+    return float(np.mean(errors))
+
+
+def run(planner, matrix, days, check_repeats):
+    lookup = {name: matrix.nutrients[i] for i, name in enumerate(matrix.names)}
+    latencies, errors = [], []
+    for day in days:
+        start = time.perf_counter()
+        plan = planner(matrix, day)
+        latencies.append(time.perf_counter() - start)
+        errors.append(evaluate(lookup, plan, day, check_repeats))
+    ms = np.array(latencies) * 1000
+    return np.percentile(ms, 50), np.percentile(ms, 95), float(np.mean(errors))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare greedy and optimized meal planning')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 50000])
+    parser.add_argument('--days', type=int, default=50, help='random daily targets planned per size')
+    parser.add_argument('--budget-ms', type=float, default=50.0, help='p95 latency budget for the optimizer')
+    args = parser.parse_args()
+
+    days = random_day_targets(args.days)
+    print(f"{'foods':>7} {'planner':>9} {'p50 ms':>8} {'p95 ms':>8} {'macro err':>10} {'first ms':>9}")
+    within_budget = True
+    for n in args.sizes:
+        matrix = FoodMatrix.from_frame(synthetic_catalog(n))
+        start = time.perf_counter()
+        plan_day_optimized(matrix, days[0])
+        index_ms = (time.perf_counter() - start) * 1000
+        # Greedy may pick one food twice within a meal, as it always has
+        for name, planner, check_repeats in (('greedy', plan_greedy, False),
+                                             ('optimizer', plan_day_optimized, True)):
+            p50, p95, error = run(planner, matrix, days, check_repeats)
+            extra = f"{index_ms:9.1f}" if name == 'optimizer' else f"{'-':>9}"
+            print(f"{n:>7} {name:>9} {p50:8.2f} {p95:8.2f} {error:10.4f} {extra}")
+            if name == 'optimizer' and p95 > args.budget_ms:
+                within_budget = False
+    print(f"optimizer p95 {'within' if within_budget else 'OVER'} the {args.budget_ms:.0f} ms budget")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+# Meal selection throughput across catalog sizes.
+#
+# Compares the original pandas greedy loop (apply + iterrows per pick) with the
+# FoodMatrix engine and reports selections per second; tests/test_meal_selection.py
+# checks the picks agree item for item. Run from backend/ml_model:
+#
+#     python -m benchmarks.bench_meal_selection --sizes 31 1000 5000 20000
+import argparse
+import time
+import numpy as np
+import pandas as pd
+from model.recommender import score_food
+from model.meal_engine import FoodMatrix, select_meal_from_matrix
+
+MEAL_TARGETS = {
+    'breakfast': {'calories': 660.0, 'protein': 49.5, 'carbs': 66.0, 'fat': 22.0},
+    'lunch': {'calories': 880.0, 'protein': 66.0, 'carbs': 88.0, 'fat': 29.3},
+    'dinner': {'calories': 660.0, 'protein': 49.5, 'carbs': 66.0, 'fat': 22.0},
+}
+
+
+# Reference implementation: the pre-vectorization select_meal
+def legacy_select_meal(food_df, target_macros, used_items=None):
+    if used_items is None:
+        used_items = []
+    selected_items = []
+    total = {'calories': 0.0, 'protein': 0.0, 'carbs': 0.0, 'fat': 0.0}
+    food_df = food_df.copy()
+    food_df = food_df[~food_df['name'].isin(used_items)]
+    while True:
+        remaining = {k: target_macros[k] - total[k] for k in total}
+        food_df['score'] = food_df.apply(lambda row: score_food(row, remaining), axis=1)
+        food_df_sorted = food_df.sort_values(by='score', ascending=False)
+        for _, food in food_df_sorted.iterrows():
+            new_total = {
+                'calories': total['calories'] + food['calories'],
+                'protein': total['protein'] + food['protein_g'],
+                'carbs': total['carbs'] + food['carbs_g'],
+                'fat': total['fat'] + food['fat_g']
+            }
+            if all(new_total[key] <= target_macros[key] * 1.05 for key in total):
+                total = new_total
+                selected_items.append(food['name'])
+                break
+        else:
+            break
+    return selected_items
+
+
+def synthetic_catalog(n, seed=0, base_path='data/food_items.csv'):
+    base = pd.read_csv(base_path)
+    if n <= len(base):
+        return base.head(n).reset_index(drop=True)
+    rng = np.random.default_rng(seed)
+    rows = base.sample(n=n, replace=True, random_state=seed).reset_index(drop=True)
+    jitter = rng.uniform(0.6, 1.6, size=(n, 4))
+    rows[['calories', 'protein_g', 'carbs_g', 'fat_g']] = (rows[['calories', 'protein_g', 'carbs_g', 'fat_g']].to_numpy() * jitter).round(1)
+    rows['name'] = [f"{name} #{i}" for i, name in enumerate(rows['name'])]
+    return rows
+
+
+def plan_day(select, catalog):
+    used, plan = [], {}
+    for meal, target in MEAL_TARGETS.items():
+        plan[meal] = select(catalog, target, used)
+        used.extend(plan[meal])
+    return plan
+
+
+def time_call(fn, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = fn()
+    return (time.perf_counter() - start) / repeat, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Greedy meal selection: pandas loop vs FoodMatrix')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[31, 500, 2000, 10000])
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--legacy-max', type=int, default=5000,
+                        help='skip the pandas baseline above this catalog size')
+    args = parser.parse_args()
+
+    print(f"{'foods':>8} {'legacy ms':>11} {'matrix ms':>11} {'speedup':>8} {'plans/s':>9}")
+    for n in args.sizes:
+        catalog = synthetic_catalog(n)
+        matrix_s, _ = time_call(lambda: plan_day(
+            lambda df, t, u: select_meal_from_matrix(FoodMatrix.from_frame(df), t, u), catalog), args.repeat)
+        if n <= args.legacy_max:
+            legacy_s, _ = time_call(lambda: plan_day(legacy_select_meal, catalog), 1)
+            legacy_ms = f"{legacy_s * 1000:11.1f}"
+            speedup = f"{legacy_s / matrix_s:7.1f}x"
+        else:
+            legacy_ms, speedup = f"{'-':>11}", f"{'-':>8}"
+        print(f"{n:>8} {legacy_ms} {matrix_s * 1000:11.2f} {speedup} {1 / matrix_s:9.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,117 @@
+# Throughput scaling of serve.py with the number of forked workers.
+#
+# For each worker count, starts serve.py inside the data directory, warms
+# every worker up, then drives --concurrency clients at each endpoint and
+# reports requests/sec, latency percentiles and scaling efficiency against
+# one worker (rps_n / (n * rps_1)). Memory is reported as the workers' summed
+# RSS next to their summed PSS: the gap is the preloaded model and data that
+# the workers share copy-on-write. The response cache is disabled so every
+# request does the full work. Run from backend/ml_model:
+#
+#     python -m benchmarks.synth_data --users 10000 --out /tmp/synth
+#     python -m benchmarks.bench_prefork --data /tmp/synth --workers 1 2 4 8
+import argparse
+import os
+import subprocess
+import sys
+import time
+import numpy as np
+import pandas as pd
+from benchmarks.bench_cold_start import request, wait_for
+from benchmarks.bench_suite import ML_MODEL_DIR, load_endpoint, service_env
+
+SERVE = os.path.join(ML_MODEL_DIR, 'serve.py')
+
+
+def worker_pids(parent):
+    pids = []
+    for name in os.listdir('/proc'):
+        if not name.isdigit():
+            continue
+        try:
+            with open(f'/proc/{name}/stat') as f:
+                ppid = int(f.read().rsplit(')', 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        if ppid == parent:
+            pids.append(int(name))
+    return pids
+
+
+def memory_mb(pids):
+    totals = {'rss_mb': 0.0, 'pss_mb': 0.0}
+    for pid in pids:
+        with open(f'/proc/{pid}/smaps_rollup') as f:
+            for line in f:
+                key, _, value = line.partition(':')
+                if key in ('Rss', 'Pss'):
+                    totals[f'{key.lower()}_mb'] += int(value.split()[0]) / 1024
+    return {k: round(v, 1) for k, v in totals.items()}
+
+
+def bench_workers(data_dir, workers, warmup, payloads, args):
+    base = f"http://127.0.0.1:{args.port}"
+    env = dict(service_env(), RESPONSE_CACHE_SIZE='0')
+    command = [sys.executable, SERVE, '--workers', str(workers), '--port', str(args.port), '--host', '127.0.0.1']
+    if args.threads_per_worker:
+        command += ['--threads-per-worker', str(args.threads_per_worker)]
+    proc = subprocess.Popen(command, cwd=data_dir, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, env=env)
+    try:
+        if wait_for(lambda: request(base + '/readyz')[0] == 200, time.perf_counter() + args.timeout, interval=0.1) is None:
+            raise RuntimeError(f"serve.py with {workers} workers did not become ready within {args.timeout}s")
+        results = {}
+        for endpoint, endpoint_payloads in payloads.items():
+            # Every user a few times per worker, so no worker is still cold
+            load_endpoint(base + endpoint, warmup * workers, args.concurrency)
+            results[endpoint] = load_endpoint(base + endpoint, endpoint_payloads, args.concurrency)
+        results['memory'] = memory_mb(worker_pids(proc.pid))
+        return results
+    finally:
+        proc.terminate()
+        proc.wait()
+
+
+def main():
+    cores = len(os.sched_getaffinity(0))
+    parser = argparse.ArgumentParser(description='Throughput of serve.py by worker count')
+    parser.add_argument('--data', required=True, help='directory with data/ and models/, e.g. from synth_data')
+    parser.add_argument('--workers', type=int, nargs='+',
+                        default=sorted({1, *[n for n in (2, 4, 8, 16) if n <= cores], cores}))
+    parser.add_argument('--threads-per-worker', type=int, help='passed to serve.py (default: cores // workers)')
+    parser.add_argument('--endpoints', nargs='+', default=['/recommend-workout', '/recommend-diet'])
+    parser.add_argument('--requests', type=int, default=400, help='requests per endpoint and worker count')
+    parser.add_argument('--users', type=int, default=50, help='distinct users requested')
+    parser.add_argument('--concurrency', type=int, default=None, help='clients in flight (default: 2 x max workers)')
+    parser.add_argument('--warmup-rounds', type=int, default=2, help='warm-up requests per user, worker and endpoint')
+    parser.add_argument('--port', type=int, default=5057)
+    parser.add_argument('--timeout', type=float, default=900, help='seconds to wait for the service to be ready')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    args.concurrency = args.concurrency or 2 * max(args.workers)
+
+    data_dir = os.path.abspath(args.data)
+    usernames = pd.read_csv(os.path.join(data_dir, 'data', 'user_profiles.csv'), usecols=['username'])['username']
+    rng = np.random.default_rng(args.seed)
+    users = rng.choice(usernames.to_numpy(), min(args.users, len(usernames)), replace=False)
+    payloads = {endpoint: [{'username': str(u)} for u in rng.choice(users, args.requests)] for endpoint in args.endpoints}
+    warmup = [{'username': str(u)} for u in users] * args.warmup_rounds
+
+    print(f"{cores} cores, {args.concurrency} clients, {args.requests} requests per endpoint")
+    print(f"{'workers':>7} {'endpoint':<20} {'rps':>8} {'p50 ms':>8} {'p99 ms':>8} {'errors':>6} {'scaling':>8}")
+    baseline, memory = {}, []
+    for workers in args.workers:
+        results = bench_workers(data_dir, workers, warmup, payloads, args)
+        for endpoint in args.endpoints:
+            r = results[endpoint]
+            baseline.setdefault(endpoint, r['rps'] / workers)
+            efficiency = r['rps'] / (workers * baseline[endpoint]) if baseline[endpoint] else 0.0
+            print(f"{workers:>7} {endpoint:<20} {r['rps']:8.1f} {r.get('p50_ms', 0):8.1f} {r.get('p99_ms', 0):8.1f} "
+                  f"{r['errors']:>6} {efficiency:8.2f}")
+        memory.append((workers, results['memory']))
+    print(f"\n{'workers':>7} {'sum RSS MB':>11} {'sum PSS MB':>11}")
+    for workers, m in memory:
+        print(f"{workers:>7} {m['rss_mb']:11.1f} {m['pss_mb']:11.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+# Memory of the log and catalog frames with pandas' default dtypes vs the
+# compact dtypes in model.schema, and of the workout training matrix.
+#
+# Each CSV under --data/data is loaded both ways; the report gives bytes per
+# row (deep memory_usage, so string objects are counted), the total and the
+# parse time. The training matrix is built from the schema-loaded feedback
+# log and compared with the float64 matrix the same features used to produce.
+# Run from backend/ml_model:
+#
+#     python -m benchmarks.synth_data --users 20000 --out /tmp/synth
+#     python -m benchmarks.bench_schema_memory --data /tmp/synth
+import argparse
+import logging
+import os
+import time
+import numpy as np
+import pandas as pd
+from model.schema import DIET_LOG_SCHEMA, EXERCISE_SCHEMA, FEEDBACK_SCHEMA, PROFILE_SCHEMA
+from model.workout import build_training_matrix, merge_exercise_details, prepare_training_frame
+
+FILES = {
+    'feedback_logs': FEEDBACK_SCHEMA,
+    'diet_logs': DIET_LOG_SCHEMA,
+    'user_profiles': PROFILE_SCHEMA,
+    'exercise_items': EXERCISE_SCHEMA,
+}
+
+
+def timed(load):
+    start = time.perf_counter()
+    frame = load()
+    return frame, time.perf_counter() - start
+
+
+def row(name, rows, before, after, seconds_before, seconds_after):
+    seconds_before = f"{seconds_before:8.2f}" if seconds_before is not None else f"{'-':>8}"
+    print(f"{name:<16} {rows:>9} {before / rows:10.1f} {after / rows:10.1f} {before / after:7.1f}x "
+          f"{before / 2**20:10.1f} {after / 2**20:10.1f} {seconds_before} {seconds_after:8.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Frame memory with default vs schema dtypes')
+    parser.add_argument('--data', required=True, help='directory with data/, e.g. from synth_data')
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+
+    print(f"{'file':<16} {'rows':>9} {'B/row old':>10} {'B/row new':>10} {'ratio':>8} "
+          f"{'MB old':>10} {'MB new':>10} {'s old':>8} {'s new':>8}")
+    frames = {}
+    for name, schema in FILES.items():
+        path = os.path.join(args.data, 'data', f'{name}.csv')
+        if not os.path.exists(path):
+            continue
+        default, seconds_before = timed(lambda: pd.read_csv(path))
+        compact, seconds_after = timed(lambda: schema.read_csv(path))
+        before = default.memory_usage(deep=True).sum()
+        after = compact.memory_usage(deep=True).sum()
+        row(name, len(compact), before, after, seconds_before, seconds_after)
+        frames[name] = compact
+        del default
+
+    if 'feedback_logs' in frames and 'exercise_items' in frames:
+        exercise_df = frames['exercise_items']
+        df, _ = prepare_training_frame(merge_exercise_details(frames['feedback_logs'], exercise_df))
+        (X, y), seconds = timed(lambda: build_training_matrix(df, exercise_df))
+        after = X.nbytes + y.nbytes
+        before = (X.size + y.size) * np.dtype(np.float64).itemsize
+        row('training matrix', len(X), before, after, None, seconds)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,181 @@
+# Read and write throughput of the SQLite storage backend vs the CSV files.
+#
+# The CSVs under --data/data are copied to a scratch directory and migrated
+# into a database there; nothing under --data is modified. Reported:
+#
+#   load        whole-table load: CSV parse vs SQLite read, both cold
+#   user read   one user's diet logs, profile and latest feedback: the
+#               cached-CSV filter and FeedbackIndex vs indexed queries
+#   append      one diet row per write as appendCSV does it (read the file
+#               for its header, append a line) vs one committed INSERT
+#   profile     one profile update: rewrite the whole file as writeCSV does
+#               vs a single-row upsert
+#   concurrent  whole-profile-table reads while another process keeps
+#               updating profiles; reads that saw fewer rows than the table
+#               holds (a file caught mid-rewrite) are counted as torn
+#
+# Run from backend/ml_model:
+#
+#     python -m benchmarks.synth_data --users 20000 --out /tmp/synth
+#     python -m benchmarks.bench_storage --data /tmp/synth
+import argparse
+import logging
+import multiprocessing
+import os
+import shutil
+import tempfile
+import time
+import numpy as np
+import pandas as pd
+from model.datastore import read_csv_cached
+from model.feedback_index import FeedbackIndex
+from model.storage import TABLES, SqliteStore, connect, migrate
+
+
+def timed(fn, n=1):
+    start = time.perf_counter()
+    for _ in range(n):
+        fn()
+    return (time.perf_counter() - start) / n
+
+
+def row(name, csv_seconds, sqlite_seconds, unit='ms'):
+    scale = 1e3 if unit == 'ms' else 1e6
+    print(f"{name:<28} {csv_seconds * scale:12.1f} {sqlite_seconds * scale:12.1f} {unit:>4} "
+          f"{csv_seconds / sqlite_seconds:8.1f}x")
+
+
+# As appendCSV: read the file for its header, then append "\n" + row
+def csv_append(path, values):
+    with open(path) as f:
+        f.read()
+    with open(path, 'a') as f:
+        f.write('\n' + ','.join(f'"{v}"' for v in values))
+
+
+def diet_values(i):
+    return [f'bench{i % 100}', '2025-06-01', 70, 'lunch', 500, 30, 60, 10, 'Rice|Beans']
+
+
+def rewrite_profiles_csv(path, stop):
+    profiles = pd.read_csv(path)
+    while not stop.is_set():
+        profiles.to_csv(path, index=False)
+
+
+def upsert_profiles(db_path, stop):
+    conn = connect(db_path)
+    usernames = [r[0] for r in conn.execute('SELECT username FROM user_profiles')]
+    i = 0
+    while not stop.is_set():
+        with conn:
+            conn.execute('UPDATE user_profiles SET weight_kg = ? WHERE username = ?', (60 + i % 40, usernames[i % len(usernames)]))
+        i += 1
+
+
+# Full reads of the profiles while `writer` runs in another process; returns
+# (reads per second, torn reads, total reads)
+def concurrent_reads(read, expected_rows, writer, args, seconds):
+    stop = multiprocessing.Event()
+    process = multiprocessing.get_context('fork').Process(target=writer, args=args + (stop,))
+    process.start()
+    time.sleep(0.2)
+    reads = torn = 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < seconds:
+        try:
+            torn += read() != expected_rows
+        except Exception:
+            torn += 1
+        reads += 1
+    elapsed = time.perf_counter() - start
+    stop.set()
+    process.join()
+    return reads / elapsed, torn, reads
+
+
+def main():
+    parser = argparse.ArgumentParser(description='SQLite storage backend vs CSV files')
+    parser.add_argument('--data', required=True, help='directory with data/, e.g. from synth_data')
+    parser.add_argument('--users', type=int, default=200, help='users sampled for per-user reads')
+    parser.add_argument('--writes', type=int, default=500, help='diet rows appended per backend')
+    parser.add_argument('--profile-writes', type=int, default=50, help='profile updates per backend')
+    parser.add_argument('--seconds', type=float, default=3.0, help='duration of the concurrent read test')
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+
+    scratch = tempfile.mkdtemp(prefix='bench_storage_')
+    try:
+        paths = {}
+        for table, (path, _) in TABLES.items():
+            paths[table] = os.path.join(scratch, os.path.basename(path))
+            shutil.copy(os.path.join(args.data, path), paths[table])
+        db_path = os.path.join(scratch, 'storage.sqlite')
+        seconds = timed(lambda: migrate(db_path, paths))
+        print(f"migrated {sum(1 for _ in open(paths['diet_logs'])) - 1} diet rows, "
+              f"{sum(1 for _ in open(paths['feedback_logs'])) - 1} feedback rows in {seconds:.1f}s\n")
+
+        print(f"{'operation':<28} {'csv':>12} {'sqlite':>12} {'':>4} {'speedup':>9}")
+        for table, (_, schema) in TABLES.items():
+            row(f'load {table}', timed(lambda: schema.read_csv(paths[table])),
+                timed(lambda: SqliteStore(db_path).read_table(table)))
+
+        store = SqliteStore(db_path)
+        logs = read_csv_cached(paths['diet_logs'], TABLES['diet_logs'][1])
+        profiles = read_csv_cached(paths['user_profiles'], TABLES['user_profiles'][1])
+        index = FeedbackIndex(paths['feedback_logs'], index_path=os.path.join(scratch, 'feedback_index.pkl'))
+        users = np.random.default_rng(0).choice(profiles['username'].unique(), args.users).tolist()
+        index.lookup(users[0])
+        row('user read diet logs', timed(lambda: [logs[logs['username'] == u] for u in users]) / len(users),
+            timed(lambda: [store.user_rows('diet_logs', u) for u in users]) / len(users), 'us')
+        row('user read profile', timed(lambda: [profiles[profiles['username'] == u] for u in users]) / len(users),
+            timed(lambda: [store.user_rows('user_profiles', u) for u in users]) / len(users), 'us')
+        row('user read latest feedback', timed(lambda: [index.lookup(u) for u in users]) / len(users),
+            timed(lambda: [store.latest_feedback(u) for u in users]) / len(users), 'us')
+
+        conn = connect(db_path)
+        columns = store.columns('diet_logs')
+        insert = f"INSERT INTO diet_logs ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})"
+
+        def sqlite_append(i):
+            with conn:
+                conn.execute(insert, diet_values(i))
+
+        counter = iter(range(10 ** 9))
+        row('append diet row', timed(lambda: csv_append(paths['diet_logs'], diet_values(next(counter))), args.writes),
+            timed(lambda: sqlite_append(next(counter)), args.writes))
+
+        profile_columns = store.columns('user_profiles')
+        upsert = (f"INSERT INTO user_profiles ({', '.join(profile_columns)}) VALUES "
+                  f"({', '.join('?' * len(profile_columns))}) ON CONFLICT(username) DO UPDATE SET "
+                  + ', '.join(f'{c} = excluded.{c}' for c in profile_columns if c != 'username'))
+
+        def csv_profile_update():
+            frame = pd.read_csv(paths['user_profiles'], dtype=str, keep_default_na=False)
+            frame.loc[frame['username'] == users[0], 'weight_kg'] = '71'
+            frame.to_csv(paths['user_profiles'], index=False)
+
+        def sqlite_profile_update():
+            current = conn.execute(f"SELECT {', '.join(profile_columns)} FROM user_profiles WHERE username = ?",
+                                   (users[0],)).fetchone()
+            with conn:
+                conn.execute(upsert, current[:4] + (71,) + current[5:])
+
+        row('profile update', timed(csv_profile_update, args.profile_writes),
+            timed(sqlite_profile_update, args.profile_writes))
+        conn.close()
+
+        n_profiles = len(pd.read_csv(paths['user_profiles']))
+        reader = SqliteStore(db_path)
+        print(f"\nconcurrent full reads of {n_profiles} profiles while another process updates them:")
+        for name, read, writer, writer_args in (
+                ('csv', lambda: len(pd.read_csv(paths['user_profiles'])), rewrite_profiles_csv, (paths['user_profiles'],)),
+                ('sqlite', lambda: len(reader.read_table('user_profiles')), upsert_profiles, (db_path,))):
+            rate, torn, reads = concurrent_reads(read, n_profiles, writer, writer_args, args.seconds)
+            print(f"  {name:<8} {rate:8.1f} reads/s, {torn}/{reads} torn")
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,221 @@
+# End-to-end benchmark of the ML service against a (synthetic) data set.
+#
+# Starts app.py in a subprocess inside the data directory, fires concurrent
+# requests at each endpoint and reports latency percentiles, requests/sec,
+# error counts and the server's peak RSS. With --train it also times
+# train_workout_model in its own process (rows/sec and peak RSS). Results are
+# written as JSON to --results-dir so runs can be compared with --compare.
+# Run from backend/ml_model:
+#
+#     python -m benchmarks.synth_data --users 10000 --out /tmp/synth
+#     python -m benchmarks.bench_suite --data /tmp/synth --train
+#     python -m benchmarks.bench_suite --data /tmp/synth --compare benchmarks/results/<earlier>.json
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import pandas as pd
+from benchmarks.bench_cold_start import request, wait_for
+
+ML_MODEL_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+LAUNCH = "import app; app.app.run(host='127.0.0.1', port={port}, debug=False, threaded=True)"
+TRAIN_SNIPPET = """
+import json, re, tempfile, time
+import pandas as pd
+from model.workout import train_workout_model
+rows = len(pd.read_csv('data/feedback_logs.csv', usecols=['username']))
+start = time.perf_counter()
+with tempfile.TemporaryDirectory() as save_dir:
+    model = train_workout_model(save_dir=save_dir, sample_frac={sample_frac}, epochs={epochs}, verbose=0,
+                                chunk_rows={chunk_rows})[0]
+seconds = time.perf_counter() - start
+hwm = int(re.search(r'VmHWM:\\s+(\\d+)', open('/proc/self/status').read()).group(1))
+print(json.dumps({{'rows': int(rows * {sample_frac}), 'seconds': seconds, 'peak_rss_mb': hwm / 1024}}))
+"""
+# Metrics where a larger value is an improvement, for --compare
+HIGHER_IS_BETTER = ('rps', 'rows_per_second')
+
+
+def service_env():
+    return {**os.environ, 'PYTHONPATH': ML_MODEL_DIR + os.pathsep + os.environ.get('PYTHONPATH', ''),
+            'TF_CPP_MIN_LOG_LEVEL': '3'}
+
+
+def read_proc_status(pid):
+    fields = {}
+    with open(f'/proc/{pid}/status') as f:
+        for line in f:
+            key, _, value = line.partition(':')
+            if key in ('VmHWM', 'VmRSS'):
+                fields[key] = int(value.split()[0]) / 1024
+    return {'peak_rss_mb': round(fields.get('VmHWM', 0), 1), 'rss_mb': round(fields.get('VmRSS', 0), 1)}
+
+
+def summarize(latencies, errors, wall_seconds):
+    ms = np.array(latencies) * 1000
+    summary = {'requests': len(latencies), 'errors': errors, 'rps': round(len(latencies) / wall_seconds, 2)}
+    if len(ms):
+        for p in (50, 90, 99):
+            summary[f'p{p}_ms'] = round(float(np.percentile(ms, p)), 2)
+        summary['max_ms'] = round(float(ms.max()), 2)
+    return summary
+
+
+# Send one payload per request with `concurrency` requests in flight
+def load_endpoint(url, payloads, concurrency):
+    def send(payload):
+        start = time.perf_counter()
+        status, _ = request(url, payload, timeout=600)
+        return time.perf_counter() - start, status == 200
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        results = list(pool.map(send, payloads))
+    wall = time.perf_counter() - start
+    return summarize([seconds for seconds, _ in results], sum(not ok for _, ok in results), wall)
+
+
+def endpoint_payloads(usernames, n_requests, batch_size, rng):
+    singles = [{'username': str(u)} for u in rng.choice(usernames, n_requests)]
+    batches = [{'usernames': [str(u) for u in rng.choice(usernames, batch_size, replace=False)]}
+               for _ in range(max(1, n_requests // batch_size))]
+    return {
+        '/recommend-diet': singles,
+        '/recommend-workout': singles,
+        '/recommend-diet/batch': batches,
+        '/recommend-workout/batch': batches,
+    }
+
+
+def bench_service(data_dir, args):
+    usernames = pd.read_csv(os.path.join(data_dir, 'data', 'user_profiles.csv'), usecols=['username'])['username'].to_numpy()
+    payloads = endpoint_payloads(usernames, args.requests, min(args.batch_size, len(usernames)),
+                                 np.random.default_rng(args.seed))
+    endpoints = [e for e in payloads if not args.endpoints or e in args.endpoints]
+    base = f"http://127.0.0.1:{args.port}"
+    start = time.perf_counter()
+    proc = subprocess.Popen([sys.executable, '-c', LAUNCH.format(port=args.port)], cwd=data_dir,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, env=service_env())
+    try:
+        ready = wait_for(lambda: request(base + '/readyz')[0] == 200, start + args.timeout, interval=0.1)
+        if ready is None:
+            raise RuntimeError(f"service in {data_dir} did not become ready within {args.timeout}s")
+        results = {'ready_seconds': round(ready - start, 3), 'endpoints': {}}
+        for endpoint in endpoints:
+            # Warm up caches (CSV snapshots, forecasters) on a few of the same requests
+            load_endpoint(base + endpoint, payloads[endpoint][:args.warmup], args.concurrency)
+            results['endpoints'][endpoint] = load_endpoint(base + endpoint, payloads[endpoint], args.concurrency)
+            print(f"{endpoint:<26} {json.dumps(results['endpoints'][endpoint])}")
+        results['server'] = read_proc_status(proc.pid)
+        return results
+    finally:
+        proc.terminate()
+        proc.wait()
+
+
+def bench_training(data_dir, args):
+    code = TRAIN_SNIPPET.format(sample_frac=args.train_sample_frac, epochs=args.train_epochs,
+                               chunk_rows=args.train_chunk_rows)
+    out = subprocess.run([sys.executable, '-c', code], cwd=data_dir, capture_output=True, text=True,
+                         check=True, env=service_env())
+    result = json.loads(out.stdout.strip().splitlines()[-1])
+    result['epochs'] = args.train_epochs
+    result['chunk_rows'] = args.train_chunk_rows
+    result['rows_per_second'] = round(result['rows'] / result['seconds'], 1)
+    return result
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ML_MODEL_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def data_set_size(data_dir):
+    sizes = {}
+    for name in ('user_profiles', 'diet_logs', 'feedback_logs', 'food_items', 'exercise_items'):
+        path = os.path.join(data_dir, 'data', f'{name}.csv')
+        if os.path.exists(path):
+            with open(path, 'rb') as f:
+                sizes[name] = sum(1 for _ in f) - 1
+    return sizes
+
+
+def flatten(results, prefix=''):
+    flat = {}
+    for key, value in results.items():
+        if isinstance(value, dict):
+            flat.update(flatten(value, f"{prefix}{key}."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[f"{prefix}{key}"] = value
+    return flat
+
+
+def compare(previous, current):
+    before = flatten({key: previous.get(key, {}) for key in ('service', 'training')})
+    after = flatten({key: current.get(key, {}) for key in ('service', 'training')})
+    print(f"\ncompared with {previous.get('timestamp')} ({previous.get('git_commit')}):")
+    for key in sorted(before.keys() & after.keys()):
+        if not before[key]:
+            continue
+        change = (after[key] - before[key]) / before[key] * 100
+        better = change > 0 if key.endswith(HIGHER_IS_BETTER) else change < 0
+        mark = '' if abs(change) < 5 else (' better' if better else ' WORSE')
+        print(f"  {key:<50} {before[key]:>12} -> {after[key]:>12} ({change:+.1f}%){mark}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Latency, throughput, training and memory benchmarks')
+    parser.add_argument('--data', required=True, help='directory with data/ and models/, e.g. from synth_data')
+    parser.add_argument('--requests', type=int, default=200, help='requests per single-user endpoint')
+    parser.add_argument('--batch-size', type=int, default=50, help='usernames per batch request')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--warmup', type=int, default=10)
+    parser.add_argument('--endpoints', nargs='*', help='subset of endpoints to load')
+    parser.add_argument('--train', action='store_true', help='also benchmark train_workout_model')
+    parser.add_argument('--train-epochs', type=int, default=3)
+    parser.add_argument('--train-sample-frac', type=float, default=1.0)
+    parser.add_argument('--train-chunk-rows', type=int, default=0,
+                        help='stream the feedback log in chunks of this many rows (0 trains in memory)')
+    parser.add_argument('--skip-service', action='store_true')
+    parser.add_argument('--port', type=int, default=5056)
+    parser.add_argument('--timeout', type=float, default=900, help='seconds to wait for the service to be ready')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--results-dir', default=os.path.join(ML_MODEL_DIR, 'benchmarks', 'results'))
+    parser.add_argument('--compare', help='earlier results file to diff against')
+    args = parser.parse_args()
+
+    data_dir = os.path.abspath(args.data)
+    results = {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'git_commit': git_commit(),
+        'host': {'python': platform.python_version(), 'platform': platform.platform(), 'cpus': os.cpu_count()},
+        'config': {k: v for k, v in vars(args).items() if k not in ('results_dir', 'compare')},
+        'data': data_set_size(data_dir),
+    }
+    print(f"data set: {results['data']}")
+    if not args.skip_service:
+        results['service'] = bench_service(data_dir, args)
+    if args.train:
+        results['training'] = bench_training(data_dir, args)
+        print(f"training: {json.dumps(results['training'])}")
+
+    os.makedirs(args.results_dir, exist_ok=True)
+    path = os.path.join(args.results_dir, f"{results['timestamp'].replace(':', '')}-{results['git_commit'] or 'nogit'}.json")
+    with open(path, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"results saved to {path}")
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f), results)
+
+
+if __name__ == '__main__':
+    main()
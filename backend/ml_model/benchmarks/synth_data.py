@@ -0,0 +1,175 @@
+# Synthetic user_profiles.csv, diet_logs.csv and feedback_logs.csv at scale.
+#
+# Users are generated in vectorised chunks and appended to the CSVs, so memory
+# stays flat from 1k to 1M users. Each user gets stable body measurements,
+# a fitness level and dietary restrictions; feedback shows weights creeping up
+# session over session and diet logs scatter around a calorie target. The
+# food and exercise catalogs can be enlarged too. Run from backend/ml_model:
+#
+#     python -m benchmarks.synth_data --users 10000 --out /tmp/synth
+#
+# The output directory is laid out like backend/ml_model (data/ plus a copy of
+# models/) so the service and the benchmark suite can run from it directly.
+import argparse
+import os
+import shutil
+import time
+import numpy as np
+import pandas as pd
+from benchmarks.bench_meal_selection import synthetic_catalog
+
+PROFILE_COLUMNS = ['username', 'name', 'age', 'height_cm', 'weight_kg', 'email', 'fitness_level', 'gender',
+                   'bicep_cm', 'chest_cm', 'shoulder_cm', 'lat_cm', 'waist_cm', 'abs_cm', 'thigh_cm', 'calf_cm',
+                   'blood_sugar_mg_dl', 'cholesterol_mg_dl', 'medical_history', 'dietary_restrictions']
+FEEDBACK_COLUMNS = ['username', 'date', 'exercise_name', 'category', 'actual_reps', 'actual_weight', 'number_of_sets',
+                    'pain_level', 'intensity', 'fitness_level', 'gender', 'bicep_cm', 'chest_cm', 'shoulder_cm',
+                    'lat_cm', 'waist_cm', 'abs_cm', 'thigh_cm', 'calf_cm', 'blood_sugar_mg_dl', 'cholesterol_mg_dl',
+                    'height_cm', 'weight_kg']
+DIET_COLUMNS = ['username', 'date', 'weight_kg', 'meal_type', 'calories', 'protein_g', 'carbs_g', 'fat_g', 'fooditem']
+MEASUREMENTS = ['bicep_cm', 'chest_cm', 'shoulder_cm', 'lat_cm', 'waist_cm', 'abs_cm', 'thigh_cm', 'calf_cm']
+# (mean, sd) for men; women are scaled by WOMEN_SCALE
+MEASUREMENT_STATS = {'bicep_cm': (34, 4), 'chest_cm': (100, 8), 'shoulder_cm': (115, 9), 'lat_cm': (42, 5),
+                     'waist_cm': (86, 10), 'abs_cm': (84, 10), 'thigh_cm': (56, 6), 'calf_cm': (38, 3)}
+WOMEN_SCALE = 0.88
+FITNESS_LEVELS = np.array(['beginner', 'intermediate', 'advanced'])
+INTENSITIES = np.array(['low', 'moderate', 'high'])
+RESTRICTIONS = np.array(['none', 'Vegetarian', 'Vegan', 'Paleo', 'Gluten-free', 'Vegetarian|Dairy-free'])
+RESTRICTION_WEIGHTS = [0.6, 0.15, 0.08, 0.07, 0.05, 0.05]
+MEAL_SHARES = {'breakfast': 0.3, 'lunch': 0.4, 'dinner': 0.3}
+START_DATE = np.datetime64('2025-01-01')
+
+
+def synthetic_exercises(n, seed=0, base_path='data/exercise_items.csv'):
+    base = pd.read_csv(base_path)
+    if n <= len(base):
+        return base.head(n).reset_index(drop=True)
+    rows = base.sample(n=n, replace=True, random_state=seed).reset_index(drop=True)
+    rows['ExerciseName'] = [f"{name} #{i}" for i, name in enumerate(rows['ExerciseName'])]
+    return rows
+
+
+def user_chunk(rng, first, count):
+    gender = rng.choice(['male', 'female'], size=count)
+    women = gender == 'female'
+    height = np.where(women, rng.normal(163, 7, count), rng.normal(177, 7, count))
+    bmi = rng.normal(25, 4, count).clip(17, 42)
+    users = pd.DataFrame({
+        'username': [f"user{i}" for i in range(first, first + count)],
+        'name': [f"User {i}" for i in range(first, first + count)],
+        'age': rng.integers(18, 70, count),
+        'height_cm': height.round(),
+        'weight_kg': (bmi * (height / 100) ** 2).round(),
+        'email': [f"user{i}@example.com" for i in range(first, first + count)],
+        'fitness_level': rng.choice(FITNESS_LEVELS, size=count, p=[0.5, 0.35, 0.15]),
+        'gender': gender,
+    })
+    for column in MEASUREMENTS:
+        mean, sd = MEASUREMENT_STATS[column]
+        users[column] = (rng.normal(mean, sd, count) * np.where(women, WOMEN_SCALE, 1.0) * (bmi / 25) ** 0.3).round()
+    users['blood_sugar_mg_dl'] = rng.normal(95, 15, count).round()
+    users['cholesterol_mg_dl'] = rng.normal(190, 30, count).round()
+    users['medical_history'] = 'none'
+    users['dietary_restrictions'] = rng.choice(RESTRICTIONS, size=count, p=RESTRICTION_WEIGHTS)
+    return users
+
+
+# One row per (user, session, exercise); weights grow a little each session
+def feedback_chunk(rng, users, exercises, sessions, per_session):
+    n_users = len(users)
+    per_user = sessions * per_session
+    user_idx = np.repeat(np.arange(n_users), per_user)
+    session = np.tile(np.repeat(np.arange(sessions), per_session), n_users)
+    exercise_idx = rng.integers(0, len(exercises), len(user_idx))
+    level = pd.Categorical(users['fitness_level'].to_numpy()[user_idx], categories=FITNESS_LEVELS).codes
+    start_weight = rng.uniform(10, 40, n_users)[user_idx] * (1 + 0.5 * level)
+    weight = start_weight * (1 + 0.02 * session) * rng.normal(1, 0.05, len(user_idx))
+    frame = pd.DataFrame({
+        'username': users['username'].to_numpy()[user_idx],
+        'date': (START_DATE + session * 2).astype(str),
+        'exercise_name': exercises['ExerciseName'].to_numpy()[exercise_idx],
+        'category': exercises['ExerciseType'].to_numpy()[exercise_idx],
+        'actual_reps': rng.integers(6, 15, len(user_idx)),
+        'actual_weight': weight.clip(2).round(),
+        'number_of_sets': rng.integers(2, 6, len(user_idx)),
+        'pain_level': rng.choice(np.arange(6), size=len(user_idx), p=[0.45, 0.25, 0.15, 0.08, 0.05, 0.02]),
+        'intensity': rng.choice(INTENSITIES, size=len(user_idx), p=[0.3, 0.5, 0.2]),
+    })
+    for column in FEEDBACK_COLUMNS[9:]:
+        frame[column] = users[column].to_numpy()[user_idx]
+    return frame[FEEDBACK_COLUMNS]
+
+
+# Three meals a day around a BMR-style calorie target with a 30/40/30 macro split
+def diet_chunk(rng, users, foods, days):
+    n_users, meals = len(users), list(MEAL_SHARES)
+    rows = n_users * days * len(meals)
+    user_idx = np.repeat(np.arange(n_users), days * len(meals))
+    day = np.tile(np.repeat(np.arange(days), len(meals)), n_users)
+    meal = np.tile(np.arange(len(meals)), n_users * days)
+    weight = users['weight_kg'].to_numpy()[user_idx]
+    target = (weight * 30) * np.array(list(MEAL_SHARES.values()))[meal]
+    calories = target * rng.normal(1, 0.15, rows)
+    names = foods['name'].to_numpy()
+    picks = rng.integers(0, len(names), (rows, 3))
+    return pd.DataFrame({
+        'username': users['username'].to_numpy()[user_idx],
+        'date': (START_DATE + day).astype(str),
+        'weight_kg': (weight - 0.02 * day).round(),
+        'meal_type': np.array(meals)[meal],
+        'calories': calories.round(),
+        'protein_g': (calories * 0.3 / 4 * rng.normal(1, 0.1, rows)).round(),
+        'carbs_g': (calories * 0.4 / 4 * rng.normal(1, 0.1, rows)).round(),
+        'fat_g': (calories * 0.3 / 9 * rng.normal(1, 0.1, rows)).round(),
+        'fooditem': ['|'.join(names[p]) for p in picks],
+    })[DIET_COLUMNS]
+
+
+def generate(out, users=1000, feedback_sessions=12, exercises_per_session=4, diet_days=20,
+             foods=None, exercises=None, chunk_size=20000, seed=0, models_dir='models'):
+    data_dir = os.path.join(out, 'data')
+    os.makedirs(data_dir, exist_ok=True)
+    rng = np.random.default_rng(seed)
+    food_df = synthetic_catalog(foods, seed) if foods else pd.read_csv('data/food_items.csv')
+    exercise_df = synthetic_exercises(exercises, seed) if exercises else pd.read_csv('data/exercise_items.csv')
+    food_df.to_csv(os.path.join(data_dir, 'food_items.csv'), index=False)
+    exercise_df.to_csv(os.path.join(data_dir, 'exercise_items.csv'), index=False)
+    if models_dir and os.path.isdir(models_dir):
+        shutil.copytree(models_dir, os.path.join(out, 'models'), dirs_exist_ok=True,
+                        ignore=shutil.ignore_patterns('forecasters', 'versions'))
+
+    counts = {'user_profiles': 0, 'feedback_logs': 0, 'diet_logs': 0}
+    for first in range(0, users, chunk_size):
+        chunk = user_chunk(rng, first, min(chunk_size, users - first))
+        frames = {
+            'user_profiles': chunk[PROFILE_COLUMNS],
+            'feedback_logs': feedback_chunk(rng, chunk, exercise_df, feedback_sessions, exercises_per_session),
+            'diet_logs': diet_chunk(rng, chunk, food_df, diet_days),
+        }
+        for name, frame in frames.items():
+            frame.to_csv(os.path.join(data_dir, f'{name}.csv'), mode='w' if first == 0 else 'a',
+                         header=first == 0, index=False)
+            counts[name] += len(frame)
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate synthetic CSVs for the ML service')
+    parser.add_argument('--out', required=True, help='output directory (data/ and models/ are created in it)')
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--feedback-sessions', type=int, default=12, help='workout sessions per user')
+    parser.add_argument('--exercises-per-session', type=int, default=4)
+    parser.add_argument('--diet-days', type=int, default=20, help='days of diet logs per user')
+    parser.add_argument('--foods', type=int, default=None, help='food catalog size (default: shipped catalog)')
+    parser.add_argument('--exercises', type=int, default=None, help='exercise catalog size (default: shipped catalog)')
+    parser.add_argument('--chunk-size', type=int, default=20000, help='users generated per chunk')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    counts = generate(args.out, args.users, args.feedback_sessions, args.exercises_per_session, args.diet_days,
+                      args.foods, args.exercises, args.chunk_size, args.seed)
+    print(f"wrote {counts} to {args.out} in {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,151 @@
+import logging
+import os
+import queue
+import threading
+import time
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+MAX_BATCH_ROWS = int(os.environ.get('INFERENCE_MAX_BATCH_ROWS', 512))
+MAX_WAIT_MS = float(os.environ.get('INFERENCE_MAX_WAIT_MS', 2))
+# Upper bounds (rows) of the batch-size histogram buckets
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024, 2048)
+
+
+class _PendingRequest:
+    def __init__(self, model, X):
+        self.model = model
+        self.X = X
+        self.enqueued = time.perf_counter()
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+# Dynamic micro-batching for model.predict. Concurrent callers enqueue feature
+# rows; a single worker thread drains the queue into groups of up to
+# max_batch_rows rows and runs one predict per model per group. A request
+# that finds the queue empty is predicted immediately; when others are
+# already queued the worker waits at most max_wait_ms after the first
+# arrival for more. Requests that arrive during a predict queue up and form
+# the next batch. The worker is also the only
+# thread that touches the model, so Keras never sees concurrent predicts.
+class InferenceBatcher:
+    def __init__(self, max_batch_rows=MAX_BATCH_ROWS, max_wait_ms=MAX_WAIT_MS):
+        self.max_batch_rows = max_batch_rows
+        self.max_wait = max_wait_ms / 1000.0
+        self._queue = queue.Queue()
+        self._carry = None
+        self._lock = threading.Lock()
+        self._thread = None
+        self._batch_sizes = [0] * (len(BATCH_SIZE_BUCKETS) + 1)
+        self._stats = {'requests': 0, 'batches': 0, 'rows': 0, 'errors': 0,
+                       'wait_seconds_sum': 0.0, 'wait_seconds_max': 0.0}
+
+    def start(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='inference-batcher', daemon=True)
+                self._thread.start()
+        return self
+
+    # Blocking predict routed through the batch queue
+    def predict(self, model, X):
+        self.start()
+        request = _PendingRequest(model, np.asarray(X))
+        self._queue.put(request)
+        request.done.wait()
+        if request.error is not None:
+            raise request.error
+        return request.result
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            histogram = list(self._batch_sizes)
+        stats['queue_depth'] = self._queue.qsize()
+        stats['max_batch_rows'] = self.max_batch_rows
+        stats['max_wait_ms'] = self.max_wait * 1000.0
+        stats['wait_seconds_avg'] = stats['wait_seconds_sum'] / stats['requests'] if stats['requests'] else 0.0
+        labels = [f"<={bound}" for bound in BATCH_SIZE_BUCKETS] + [f">{BATCH_SIZE_BUCKETS[-1]}"]
+        stats['batch_size_histogram'] = dict(zip(labels, histogram))
+        return stats
+
+    def _next_request(self, timeout=None):
+        if self._carry is not None:
+            request, self._carry = self._carry, None
+            return request
+        return self._queue.get(timeout=timeout)
+
+    def _collect(self):
+        first = self._next_request()
+        group, rows = [first], len(first.X)
+        # Nothing else waiting: a lone request is dispatched at once rather
+        # than held for max_wait_ms on the chance that another arrives
+        if self._carry is None and self._queue.empty():
+            return group
+        deadline = first.enqueued + self.max_wait
+        while rows < self.max_batch_rows:
+            # Past the deadline, still take whatever is already queued
+            remaining = max(deadline - time.perf_counter(), 0)
+            try:
+                request = self._next_request(timeout=remaining) if remaining else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if rows + len(request.X) > self.max_batch_rows:
+                self._carry = request
+                break
+            group.append(request)
+            rows += len(request.X)
+        return group
+
+    def _run(self):
+        while True:
+            group = self._collect()
+            by_model = {}
+            for request in group:
+                by_model.setdefault(id(request.model), []).append(request)
+            for requests in by_model.values():
+                self._execute(requests)
+
+    def _execute(self, requests):
+        started = time.perf_counter()
+        sizes = [len(r.X) for r in requests]
+        try:
+            output = requests[0].model.predict(np.concatenate([r.X for r in requests]), verbose=0)
+            error = None
+        except Exception as e:
+            logger.error(f"Batched predict of {sum(sizes)} rows failed: {e}")
+            output, error = None, e
+        offset = 0
+        for request, size in zip(requests, sizes):
+            if error is None:
+                request.result = output[offset:offset + size]
+            request.error = error
+            offset += size
+            request.done.set()
+        self._record(requests, sum(sizes), started, error)
+
+    def _record(self, requests, rows, started, error):
+        waits = [started - r.enqueued for r in requests]
+        bucket = next((i for i, bound in enumerate(BATCH_SIZE_BUCKETS) if rows <= bound), len(BATCH_SIZE_BUCKETS))
+        with self._lock:
+            self._stats['requests'] += len(requests)
+            self._stats['batches'] += 1
+            self._stats['rows'] += rows
+            self._stats['errors'] += error is not None
+            self._stats['wait_seconds_sum'] += sum(waits)
+            self._stats['wait_seconds_max'] = max(self._stats['wait_seconds_max'], max(waits))
+            self._batch_sizes[bucket] += 1
+
+
+# Model wrapper whose predict goes through an InferenceBatcher, so it can be
+# passed anywhere a Keras model is expected (e.g. recommend_workout).
+class BatchedModel:
+    def __init__(self, model, batcher):
+        self.model = model
+        self.batcher = batcher
+
+    def predict(self, X, verbose=0):
+        return self.batcher.predict(self.model, X)
@@ -0,0 +1,94 @@
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class ModelNotReady(Exception):
+    pass
+
+
+# Loads (and if needed trains) the workout model on a background thread so the
+# server can bind its port and serve model-independent routes immediately.
+# load_fn(bootstrap) must return (model, scaler_X, scaler_y); it may call
+# set_state/set_progress to report what it is doing.
+class ModelBootstrap:
+    def __init__(self, load_fn, name='workout-model'):
+        self.load_fn = load_fn
+        self.name = name
+        self._lock = threading.Lock()
+        self._thread = None
+        self._bundle = None
+        self._state = 'pending'
+        self._progress = {}
+        self._error = None
+        self._started = None
+        self._finished = None
+
+    def start(self):
+        with self._lock:
+            if self._thread is not None:
+                return self
+            self._started = time.time()
+            self._thread = threading.Thread(target=self._run, name=f'{self.name}-bootstrap', daemon=True)
+            self._thread.start()
+        return self
+
+    def _run(self):
+        try:
+            bundle = self.load_fn(self)
+        except Exception as e:
+            logger.exception(f"Bootstrap of {self.name} failed")
+            with self._lock:
+                self._state, self._error, self._finished = 'failed', str(e), time.time()
+            return
+        with self._lock:
+            self._bundle, self._state, self._finished = bundle, 'ready', time.time()
+        logger.info(f"{self.name} ready after {self._finished - self._started:.2f}s")
+
+    def set_state(self, state, **progress):
+        with self._lock:
+            self._state = state
+            self._progress = dict(progress)
+
+    def set_progress(self, **progress):
+        with self._lock:
+            self._progress.update(progress)
+
+    def ready(self):
+        return self._bundle is not None
+
+    def wait(self, timeout=None):
+        if self._thread is not None:
+            self._thread.join(timeout)
+        return self.ready()
+
+    def get(self):
+        bundle = self._bundle
+        if bundle is None:
+            raise ModelNotReady(f"{self.name} is {self._state}")
+        return bundle
+
+    def status(self):
+        with self._lock:
+            status = {'name': self.name, 'state': self._state, 'progress': dict(self._progress)}
+            if self._error:
+                status['error'] = self._error
+            if self._started is not None:
+                status['elapsed_seconds'] = round((self._finished or time.time()) - self._started, 3)
+        return status
+
+
+# Keras callback factory reporting epoch progress to a bootstrap; Keras is only
+# imported when training actually runs.
+def training_progress_callback(bootstrap, epochs):
+    from tensorflow.keras.callbacks import Callback
+
+    class BootstrapProgress(Callback):
+        def on_epoch_end(self, epoch, logs=None):
+            logs = logs or {}
+            bootstrap.set_progress(epoch=epoch + 1, epochs=epochs,
+                                   loss=float(logs.get('loss', 0.0)), val_loss=float(logs.get('val_loss', 0.0)))
+
+    return BootstrapProgress()
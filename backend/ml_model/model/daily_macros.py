@@ -0,0 +1,194 @@
+import argparse
+import json
+import logging
+import threading
+import time
+import numpy as np
+from model.forecaster_registry import WINDOW_SIZE
+from model.global_forecaster import MACRO_COLUMNS
+from model.utils import diet_logs_snapshot
+
+logger = logging.getLogger(__name__)
+
+# Room left for new days when a user's buffer is (re)built; appends past it
+# double the buffer
+SPARE_DAYS = 8
+# Appended rows beyond this many are grouped by user and day before adding
+GROUP_APPEND_ROWS = 1000
+
+
+# One user's daily macro totals, oldest day first, in a contiguous float64
+# buffer with spare room that doubles when full. Days are keyed by their
+# datetime64 value as int64, the way get_user_sequence groups them.
+class UserDays:
+    def __init__(self, days, totals):
+        self._fill(days, totals)
+
+    # A read-only view of the days so far; it never changes afterwards
+    def sequence(self):
+        self._shared = True
+        view = self.totals[:self.n]
+        view.flags.writeable = False
+        return view
+
+    # Add one day's totals. A new latest day is written past the end, where
+    # no view reaches. An existing day is updated in place unless a view has
+    # been handed out since the buffers were last filled, in which case they
+    # are copied first; a backfilled earlier day is inserted into fresh
+    # buffers.
+    def add(self, day, totals):
+        i = int(np.searchsorted(self.days[:self.n], day))
+        if i < self.n and self.days[i] == day:
+            if self._shared:
+                self._fill(self.days[:self.n], self.totals[:self.n])
+            self.totals[i] += totals
+        elif i == self.n:
+            if self.n == len(self.days):
+                self._resize(2 * len(self.days))
+            self.days[i] = day
+            self.totals[i] = totals
+            self.n += 1
+        else:
+            self._fill(np.insert(self.days[:self.n], i, day), np.insert(self.totals[:self.n], i, totals, axis=0))
+
+    # New buffers holding days and totals, with room to grow
+    def _fill(self, days, totals):
+        capacity = len(days) + SPARE_DAYS
+        self.days = np.empty(capacity, dtype=np.int64)
+        self.totals = np.empty((capacity, len(MACRO_COLUMNS)), dtype=np.float64)
+        self.n = len(days)
+        self.days[:self.n] = days
+        self.totals[:self.n] = totals
+        self._shared = False
+
+    def _resize(self, capacity):
+        days = np.empty(capacity, dtype=np.int64)
+        totals = np.empty((capacity, len(MACRO_COLUMNS)), dtype=np.float64)
+        days[:self.n] = self.days[:self.n]
+        totals[:self.n] = self.totals[:self.n]
+        self.days, self.totals = days, totals
+
+
+# Per-user daily macro totals kept in step with the diet logs. The logs
+# snapshot's generation says whether rows were only appended since the last
+# refresh: then just the new settled rows are grouped and added to their
+# users' days, otherwise (a rewritten file or table) everything is rebuilt.
+# The CSV's unterminated trailing row is not added; it is re-read on every
+# refresh and, once the snapshot includes it as a whole row, merged into a
+# copy of its user's days when they are asked for.
+# Sequences and windows are read-only and never change once returned: they
+# are views into the users' buffers, except for a user with a trailing row,
+# who gets a copy.
+class DailyMacroStore:
+    def __init__(self, source=diet_logs_snapshot):
+        self.source = source
+        self._lock = threading.Lock()
+        self._users = {}
+        self._tail = {}
+        self._generation = None
+        self._frame = None
+        self._rows = 0
+        self._counters = {'rebuilds': 0, 'appends': 0, 'appended_rows': 0}
+
+    def refresh(self):
+        snapshot = self.source()
+        with self._lock:
+            frame, settled = snapshot.frame, snapshot.settled_rows
+            # Snapshots share the frame until the logs change
+            if frame is self._frame:
+                return
+            if snapshot.generation != self._generation or settled < self._rows:
+                self._rebuild(frame.iloc[:settled])
+            elif settled > self._rows:
+                self._append(frame.iloc[self._rows:settled])
+            self._tail = {}
+            if len(frame) > settled:
+                for username, day, values in zip(*_row_totals(frame.iloc[settled:])):
+                    self._tail.setdefault(username, []).append((day, values))
+            self._generation, self._frame = snapshot.generation, frame
+            self._rows = settled
+
+    # The user's daily totals, shape (days, 4); what get_user_sequence
+    # returns for their rows of the logs
+    def sequence(self, username):
+        self.refresh()
+        with self._lock:
+            user = self._users.get(username)
+            tail = self._tail.get(username)
+            if tail is None:
+                return user.sequence() if user is not None else np.zeros((0, len(MACRO_COLUMNS)))
+            if user is None:
+                user = UserDays(np.zeros(0, dtype=np.int64), np.zeros((0, len(MACRO_COLUMNS))))
+            merged = UserDays(user.days[:user.n], user.totals[:user.n])
+            for day, values in tail:
+                merged.add(day, values)
+            return merged.sequence()
+
+    # Every window_size-day window of the user's days, shape
+    # (days - window_size + 1, window_size, 4), without copying
+    def windows(self, username, window_size=WINDOW_SIZE):
+        data = self.sequence(username)
+        if len(data) < window_size:
+            return np.zeros((0, window_size, len(MACRO_COLUMNS)))
+        return np.lib.stride_tricks.sliding_window_view(data, window_size, axis=0).transpose(0, 2, 1)
+
+    def stats(self):
+        with self._lock:
+            return dict(self._counters, users=len(self._users), days=sum(u.n for u in self._users.values()),
+                        rows=self._rows, tail_rows=sum(len(t) for t in self._tail.values()))
+
+    def _rebuild(self, frame):
+        start = time.perf_counter()
+        self._users = {}
+        usernames, days, totals = _daily_totals(frame)
+        starts = np.flatnonzero(np.r_[True, usernames[1:] != usernames[:-1]])
+        for s, e in zip(starts, np.r_[starts[1:], len(usernames)]):
+            self._users[usernames[s]] = UserDays(days[s:e], totals[s:e])
+        self._counters['rebuilds'] += 1
+        logger.info(f"Built daily macro totals for {len(self._users)} users from {len(frame)} rows "
+                    f"in {time.perf_counter() - start:.2f}s")
+
+    def _append(self, rows):
+        # A few rows are added one by one, skipping a groupby's fixed cost
+        entries = _daily_totals(rows) if len(rows) > GROUP_APPEND_ROWS else _row_totals(rows)
+        for username, day, values in zip(*entries):
+            user = self._users.get(username)
+            if user is None:
+                self._users[username] = UserDays(np.array([day]), values[None])
+            else:
+                user.add(day, values)
+        self._counters['appends'] += 1
+        self._counters['appended_rows'] += len(rows)
+
+
+# (username, day, totals) per row with a date
+def _row_totals(rows):
+    dated = rows['date'].notna().to_numpy()
+    days = rows['date'].to_numpy()[dated].astype('datetime64[us]').view(np.int64)
+    totals = np.column_stack([rows[c].to_numpy(dtype=np.float64)[dated] for c in MACRO_COLUMNS])
+    return np.asarray(rows['username'], dtype=object)[dated], days, totals
+
+
+# (username, day, totals) per user-day in rows, sorted by user then day.
+# Rows without a parseable date are left out, as groupby drops them in
+# get_user_sequence.
+def _daily_totals(rows):
+    rows = rows[rows['date'].notna()]
+    grouped = (rows.astype({c: np.float64 for c in MACRO_COLUMNS})
+               .groupby(['username', 'date'], observed=True, sort=True)[MACRO_COLUMNS].sum())
+    usernames = np.asarray(grouped.index.get_level_values('username'), dtype=object)
+    days = grouped.index.get_level_values('date').to_numpy().astype('datetime64[us]').view(np.int64)
+    return usernames, days, grouped.to_numpy()
+
+
+default_daily_macros = DailyMacroStore()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Build the per-user daily macro totals from the diet logs')
+    parser.add_argument('command', choices=['stats'])
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    default_daily_macros.refresh()
+    print(json.dumps(default_daily_macros.stats(), indent=2))
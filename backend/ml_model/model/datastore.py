@@ -0,0 +1,230 @@
+import csv
+import io
+import logging
+import os
+import threading
+import zlib
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# Block size for checksumming the already-parsed part of a file
+CRC_BLOCK_BYTES = 16 * 1024 * 1024
+# Block size for scanning back from the end of a file for its last newline
+SCAN_BLOCK_BYTES = 64 * 1024
+# Attempts at reading a file whose size/mtime are stable across the read
+MAX_READ_ATTEMPTS = 5
+
+
+# Parse CSV bytes that carry no header row
+def parse_rows(data, columns, **read_kwargs):
+    if not data.strip():
+        return pd.DataFrame(columns=columns)
+    return pd.read_csv(io.BytesIO(data), header=None, names=columns, **read_kwargs)
+
+
+# Concatenate frames row-wise. Categorical columns are unioned so appended
+# rows with new values keep the column categorical instead of falling back
+# to object.
+def concat_rows(frames):
+    first = frames[0]
+    categorical = [c for c in first.columns
+                   if all(isinstance(f[c].dtype, pd.CategoricalDtype) for f in frames)]
+    if not categorical:
+        return pd.concat(frames, ignore_index=True)
+    frame = pd.concat([f.drop(columns=categorical) for f in frames], ignore_index=True)
+    for column in categorical:
+        frame[column] = pd.api.types.union_categoricals([f[column] for f in frames], ignore_order=True)
+    return frame[list(first.columns)]
+
+
+# CRC32 of the first `length` bytes of a binary file, or None if it is
+# shorter. Incremental readers keep the CRC of the bytes they have parsed and
+# only parse the rest of a grown file when its prefix still has that CRC;
+# any in-place edit of an earlier row, whatever the file size, fails it.
+def prefix_crc(f, length):
+    f.seek(0)
+    crc = 0
+    while length > 0:
+        block = f.read(min(CRC_BLOCK_BYTES, length))
+        if not block:
+            return None
+        crc = zlib.crc32(block, crc)
+        length -= len(block)
+    return crc
+
+
+# Bytes of the file up to and including its last newline: the rows a reader
+# can treat as final while appendCSV may still be writing the trailing one
+def settled_size(path):
+    with open(path, 'rb') as f:
+        end = f.seek(0, os.SEEK_END)
+        while end > 0:
+            start = max(0, end - SCAN_BLOCK_BYTES)
+            f.seek(start)
+            cut = f.read(end - start).rfind(b'\n')
+            if cut >= 0:
+                return start + cut + 1
+            end = start
+    return 0
+
+
+# Split appended bytes at the last newline: everything before it is settled,
+# the remainder is the trailing record (appendCSV writes "\n" + row, so the
+# newest row is never newline-terminated).
+def split_settled(data):
+    cut = data.rfind(b'\n') + 1
+    return data[:cut], data[cut:]
+
+
+# Whether a trailing record (the bytes after the last newline) is a whole row
+# of n_columns fields, rather than an appendCSV write caught part way. That
+# writer quotes every field, so a record opening with a quote must also close
+# with one; a row cut inside an unquoted last field cannot be told apart.
+def record_complete(record, n_columns):
+    text = record.decode('utf-8', errors='replace').rstrip('\r')
+    if not text.strip() or (text.startswith('"') and not text.endswith('"')):
+        return False
+    try:
+        fields = next(csv.reader([text], strict=True))
+    except csv.Error:
+        return False
+    return len(fields) == n_columns
+
+
+# frame holds settled_rows newline-terminated rows, then the trailing record
+# if it is complete. That last row is re-parsed whenever the file changes, so
+# incremental readers should only treat the first settled_rows rows as final.
+class CSVSnapshot:
+    def __init__(self, frame, generation, version, settled_rows):
+        self.frame = frame
+        self.generation = generation
+        self.version = version
+        self.settled_rows = settled_rows
+
+
+# One CSV file held in memory. The file is reloaded only when its mtime or
+# size change; if it only grew and the bytes before the parsed offset are
+# unchanged, just the appended tail is parsed. Rows are parsed with `schema`
+# (a model.schema.Schema) when one is given.
+class CachedCSV:
+    def __init__(self, path, schema=None, **read_kwargs):
+        self.path = path
+        self.schema = schema
+        self.read_kwargs = read_kwargs
+        self.lock = threading.Lock()
+        self.stat_key = None
+        self.columns = None
+        self.settled = None
+        self.settled_offset = 0
+        self.settled_crc = 0
+        self.frame = None
+        self.generation = 0
+        self.version = 0
+        self.full_loads = 0
+        self.tail_loads = 0
+
+    def snapshot(self):
+        with self.lock:
+            for _ in range(MAX_READ_ATTEMPTS):
+                st = os.stat(self.path)
+                stat_key = (st.st_size, st.st_mtime_ns)
+                if stat_key == self.stat_key:
+                    break
+                with open(self.path, 'rb') as f:
+                    if self._can_append(f, st.st_size):
+                        f.seek(self.settled_offset)
+                        data, appended = f.read(st.st_size - self.settled_offset), True
+                    else:
+                        f.seek(0)
+                        data, appended = f.read(st.st_size), False
+                # A writer touched the file mid-read; keep the last consistent frame
+                after = os.stat(self.path)
+                if (after.st_size, after.st_mtime_ns) != stat_key or len(data) != st.st_size - (self.settled_offset if appended else 0):
+                    continue
+                if appended:
+                    self._apply_tail(data)
+                else:
+                    self._apply_full(data)
+                self.stat_key = stat_key
+                self.version += 1
+                break
+            else:
+                if self.frame is None:
+                    raise IOError(f"Could not get a consistent read of {self.path}")
+                logger.warning(f"{self.path} kept changing while being read; serving previous snapshot")
+            return CSVSnapshot(self.frame, self.generation, self.version, len(self.settled))
+
+    def _can_append(self, f, size):
+        if self.frame is None or size < self.settled_offset:
+            return False
+        return prefix_crc(f, self.settled_offset) == self.settled_crc
+
+    def _apply_full(self, data):
+        header_end = data.find(b'\n') + 1 or len(data)
+        header = pd.read_csv(io.BytesIO(data[:header_end]), nrows=0)
+        self.columns = list(header.columns)
+        body, tail = split_settled(data[header_end:])
+        self.settled = self._parse(body)
+        self.settled_offset = header_end + len(body)
+        self.settled_crc = zlib.crc32(data[:self.settled_offset])
+        self._set_frame(tail)
+        self.generation += 1
+        self.full_loads += 1
+        logger.info(f"Loaded {len(self.frame)} rows from {self.path}")
+
+    def _apply_tail(self, data):
+        body, tail = split_settled(data)
+        if body.strip():
+            self.settled = concat_rows([self.settled, self._parse(body)])
+        self.settled_crc = zlib.crc32(body, self.settled_crc)
+        self.settled_offset += len(body)
+        self._set_frame(tail)
+        self.tail_loads += 1
+
+    def _parse(self, data):
+        if self.schema is not None:
+            return self.schema.parse_rows(data, self.columns)
+        return parse_rows(data, self.columns, **self.read_kwargs)
+
+    # The trailing record is left out until it is a whole row
+    def _set_frame(self, tail):
+        if record_complete(tail, len(self.columns)):
+            self.frame = concat_rows([self.settled, self._parse(tail)])
+        else:
+            self.frame = self.settled
+
+
+# Process-wide cache of parsed CSV files keyed by absolute path. Frames are
+# shared between callers and must be treated as read-only.
+class CSVCache:
+    def __init__(self):
+        self._files = {}
+        self._lock = threading.Lock()
+
+    def entry(self, path, schema=None, **read_kwargs):
+        key = os.path.abspath(path)
+        with self._lock:
+            cached = self._files.get(key)
+            if cached is None:
+                cached = self._files[key] = CachedCSV(path, schema, **read_kwargs)
+        return cached
+
+    def snapshot(self, path, schema=None, **read_kwargs):
+        return self.entry(path, schema, **read_kwargs).snapshot()
+
+    def read(self, path, schema=None, **read_kwargs):
+        return self.snapshot(path, schema, **read_kwargs).frame
+
+    def stats(self):
+        with self._lock:
+            files = list(self._files.values())
+        return {f.path: {'rows': 0 if f.frame is None else len(f.frame), 'full_loads': f.full_loads,
+                         'tail_loads': f.tail_loads, 'version': f.version} for f in files}
+
+
+default_cache = CSVCache()
+
+
+def read_csv_cached(path, schema=None, **read_kwargs):
+    return default_cache.read(path, schema, **read_kwargs)
@@ -0,0 +1,257 @@
+import argparse
+import io
+import logging
+import os
+import tempfile
+import threading
+import time
+import zlib
+import joblib
+import pandas as pd
+from model.datastore import MAX_READ_ATTEMPTS, parse_rows, record_complete, split_settled
+from model.schema import feedback_times
+from model.storage import SqliteFeedbackIndex, default_store, sqlite_enabled
+
+logger = logging.getLogger(__name__)
+
+# Minimum seconds between persisting an incrementally updated index
+PERSIST_INTERVAL = float(os.environ.get('FEEDBACK_INDEX_PERSIST_SECONDS', 30))
+READ_BLOCK_BYTES = 64 * 1024 * 1024
+# Granularity of the checksums over the consumed part of the file
+VERIFY_BLOCK_BYTES = 256 * 1024
+
+
+def default_index_path(feedback_csv):
+    return os.path.splitext(feedback_csv)[0] + '_index.pkl'
+
+
+# Persisted username -> [latest, previous] feedback rows. The index records
+# how many bytes of feedback_logs.csv it has consumed and only parses rows
+# appended after that, so a lookup costs a stat and a dict access no matter
+# how large the table grows. Only newline-terminated rows are consumed:
+# appendCSV leaves the newest row unterminated, so it is parsed again on
+# every change, folded into an overlay of the users it touches and never
+# persisted. Rows are ordered by their dates parsed with FEEDBACK_SCHEMA, kept
+# per entry in `times`.
+#
+# The consumed bytes are checksummed per VERIFY_BLOCK_BYTES block. When the
+# file changes, the first block, the block new rows join and one more block
+# in rotation are re-checked, so an in-place rewrite of an earlier row forces
+# a rebuild within one pass over the blocks while a refresh reads a bounded
+# amount of the prefix.
+class FeedbackIndex:
+    def __init__(self, feedback_csv='data/feedback_logs.csv', index_path=None):
+        self.feedback_csv = feedback_csv
+        self.index_path = index_path or default_index_path(feedback_csv)
+        self.lock = threading.Lock()
+        self.columns = None
+        self.offset = 0
+        self.block_crcs = []
+        self.last_crc = 0
+        self.next_check = 0
+        self.stat_key = None
+        self.entries = {}
+        self.times = {}
+        self.trailing_entries = {}
+        self.loaded = False
+        self.dirty = False
+        self.last_persist = 0.0
+
+    def lookup(self, username):
+        with self.lock:
+            self._refresh()
+            entry = self.trailing_entries.get(username)
+            return entry if entry is not None else self.entries.get(username, (None, None))
+
+    def usernames(self):
+        with self.lock:
+            self._refresh()
+            return list(self.entries) + [u for u in self.trailing_entries if u not in self.entries]
+
+    def rebuild(self):
+        with self.lock:
+            self._reset()
+            self._refresh(persist_now=True)
+            return len(self.entries)
+
+    def _reset(self):
+        self.columns, self.offset, self.stat_key = None, 0, None
+        self.block_crcs, self.last_crc, self.next_check = [], 0, 0
+        self.entries = {}
+        self.times = {}
+        self.trailing_entries = {}
+        self.loaded = True
+
+    def _load(self):
+        self.loaded = True
+        if not os.path.exists(self.index_path):
+            return
+        try:
+            state = joblib.load(self.index_path)
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable feedback index {self.index_path}: {e}")
+            return
+        if 'block_crcs' not in state or 'times' not in state:
+            logger.info(f"Rebuilding feedback index {self.index_path} saved by an older version")
+            return
+        self.columns, self.offset = state['columns'], state['offset']
+        self.block_crcs, self.last_crc = state['block_crcs'], state['last_crc']
+        self.entries, self.times = state['entries'], state['times']
+        logger.info(f"Loaded feedback index with {len(self.entries)} users from {self.index_path}")
+
+    # Each write goes to its own temp file, so processes persisting at the
+    # same time never publish each other's partial writes
+    def _persist(self):
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(self.index_path) or '.', suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                joblib.dump({'columns': self.columns, 'offset': self.offset, 'block_crcs': self.block_crcs,
+                             'last_crc': self.last_crc, 'entries': self.entries, 'times': self.times}, f)
+            os.replace(tmp_path, self.index_path)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+        self.dirty = False
+        self.last_persist = time.monotonic()
+
+    def _refresh(self, persist_now=False):
+        if not self.loaded:
+            self._load()
+        for _ in range(MAX_READ_ATTEMPTS):
+            st = os.stat(self.feedback_csv)
+            stat_key = (st.st_size, st.st_mtime_ns)
+            if stat_key == self.stat_key:
+                break
+            with open(self.feedback_csv, 'rb') as f:
+                if not self._prefix_matches(f, st.st_size):
+                    logger.info(f"{self.feedback_csv} was rewritten; rebuilding feedback index")
+                    self._reset()
+                trailing = self._consume_from(f, st.st_size)
+            # A writer touched the file mid-read; its trailing row may be torn
+            after = os.stat(self.feedback_csv)
+            if (after.st_size, after.st_mtime_ns) != stat_key:
+                continue
+            self._set_trailing(trailing)
+            self.stat_key = stat_key
+            break
+        else:
+            logger.warning(f"{self.feedback_csv} kept changing while being read; leaving out its trailing row")
+            self.trailing_entries = {}
+        if self.dirty and (persist_now or time.monotonic() - self.last_persist >= PERSIST_INTERVAL):
+            self._persist()
+
+    def _prefix_matches(self, f, size):
+        if self.columns is None:
+            return True
+        if size < self.offset:
+            return False
+        full = len(self.block_crcs)
+        checks = [(full, self.offset - full * VERIFY_BLOCK_BYTES, self.last_crc)]
+        if full:
+            checks.append((0, VERIFY_BLOCK_BYTES, self.block_crcs[0]))
+            block = self.next_check % full
+            self.next_check += 1
+            checks.append((block, VERIFY_BLOCK_BYTES, self.block_crcs[block]))
+        for block, length, crc in checks:
+            f.seek(block * VERIFY_BLOCK_BYTES)
+            data = f.read(length)
+            if len(data) != length or zlib.crc32(data) != crc:
+                return False
+        return True
+
+    # Consume the newline-terminated rows after offset; returns the bytes of
+    # the unterminated trailing row
+    def _consume_from(self, f, size):
+        f.seek(self.offset)
+        if self.columns is None:
+            header = f.readline()
+            if not header.endswith(b'\n'):
+                return b''
+            self.columns = list(pd.read_csv(io.BytesIO(header), nrows=0).columns)
+            self._settle(header)
+        pending = b''
+        remaining = size - self.offset
+        while remaining > 0:
+            block = f.read(min(READ_BLOCK_BYTES, remaining))
+            if not block:
+                break
+            remaining -= len(block)
+            body, pending = split_settled(pending + block)
+            if body:
+                # Parsed before the offset moves, so a parse error leaves the index as it was
+                rows = parse_rows(body, self.columns)
+                self._settle(body)
+                self._consume(rows, self.entries, self.times)
+                self.dirty = True
+        return pending
+
+    # Advance offset over consumed bytes, extending the block checksums
+    def _settle(self, data):
+        data = memoryview(data)
+        while len(data):
+            take = VERIFY_BLOCK_BYTES - self.offset % VERIFY_BLOCK_BYTES
+            self.last_crc = zlib.crc32(data[:take], self.last_crc)
+            self.offset += len(data[:take])
+            data = data[take:]
+            if self.offset % VERIFY_BLOCK_BYTES == 0:
+                self.block_crcs.append(self.last_crc)
+                self.last_crc = 0
+
+    # The trailing row, once whole, updates copies of its user's entries
+    def _set_trailing(self, trailing):
+        self.trailing_entries = {}
+        if self.columns is None or not record_complete(trailing, len(self.columns)):
+            return
+        rows = parse_rows(trailing, self.columns)
+        users = set(rows['username'])
+        entries = {u: self.entries[u] for u in users if u in self.entries}
+        times = {u: self.times[u] for u in users if u in self.times}
+        self._consume(rows, entries, times)
+        self.trailing_entries = entries
+
+    # Fold rows into entries/times; a later row with an equal date wins
+    @staticmethod
+    def _consume(rows, entries, times):
+        if rows.empty:
+            return
+        rows = rows.assign(_time=feedback_times(rows['date'])).sort_values('_time', kind='mergesort')
+        newest = rows.groupby('username', sort=False).tail(2)
+        for record, time_ in zip(newest.drop(columns='_time').to_dict(orient='records'), newest['_time'].tolist()):
+            username = record['username']
+            latest, prev = entries.get(username, (None, None))
+            latest_time, prev_time = times.get(username, (None, None))
+            if latest is None or time_ >= latest_time:
+                latest, prev, latest_time, prev_time = record, latest, time_, latest_time
+            elif prev is None or time_ >= prev_time:
+                prev, prev_time = record, time_
+            entries[username] = (latest, prev)
+            times[username] = (latest_time, prev_time)
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+# With STORAGE_BACKEND=sqlite the feedback_logs table's index serves lookups
+def get_feedback_index(feedback_csv='data/feedback_logs.csv'):
+    if sqlite_enabled():
+        return SqliteFeedbackIndex(default_store)
+    key = os.path.abspath(feedback_csv)
+    with _indexes_lock:
+        index = _indexes.get(key)
+        if index is None:
+            index = _indexes[key] = FeedbackIndex(feedback_csv)
+    return index
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Maintain the per-user feedback index')
+    parser.add_argument('command', choices=['rebuild'])
+    parser.add_argument('--feedback-csv', default='data/feedback_logs.csv')
+    parser.add_argument('--index-path', default=None)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    start = time.perf_counter()
+    n_users = FeedbackIndex(args.feedback_csv, args.index_path).rebuild()
+    logger.info(f"Indexed {n_users} users in {time.perf_counter() - start:.2f}s")
@@ -0,0 +1,102 @@
+import logging
+import os
+import threading
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+from model.datastore import default_cache
+from model.meal_engine import FoodMatrix, NUTRIENT_COLUMNS
+from model.utils import restriction_column
+
+logger = logging.getLogger(__name__)
+
+FOOD_CSV = 'data/food_items.csv'
+MAX_FILTERED = int(os.environ.get('FOOD_MATRIX_CACHE_SIZE', 32))
+
+
+# The food catalog with its flag columns (Vegetarian, Vegan, ...) packed into
+# one bitmask per food, so any restriction set is a single mask test over the
+# catalog. The FoodMatrix for each restriction set is kept in a bounded LRU,
+# which also keeps the planners' per-matrix indexes warm.
+class FoodCatalog:
+    def __init__(self, food_df, max_filtered=MAX_FILTERED):
+        if not all(col in food_df.columns for col in NUTRIENT_COLUMNS):
+            logger.error("Missing necessary columns in food data.")
+            raise ValueError("Missing necessary columns in food data.")
+        self.names = food_df['name'].to_numpy()
+        self.nutrients = food_df[NUTRIENT_COLUMNS].apply(pd.to_numeric, errors='coerce').to_numpy(dtype=np.float64)
+        flag_columns = [c for c in food_df.columns if c not in ['name'] + NUTRIENT_COLUMNS]
+        self.bits = {column: i for i, column in enumerate(flag_columns)}
+        flags = np.column_stack([(food_df[c] == True).to_numpy() for c in flag_columns]) if flag_columns \
+            else np.zeros((len(food_df), 0), dtype=bool)
+        self.packed = np.packbits(flags, axis=1)
+        self.max_filtered = max_filtered
+        self._filtered = OrderedDict()
+        self._lock = threading.Lock()
+        self._counters = {'hits': 0, 'misses': 0, 'evictions': 0}
+
+    def __len__(self):
+        return len(self.names)
+
+    # Flag columns a dietary_restrictions string requires, matched the same
+    # way as utils.filter_food_by_dietary_restrictions; unknown names are ignored
+    def restriction_key(self, restrictions):
+        columns = {restriction_column(r) for r in restrictions.lower().split('|')}
+        return tuple(sorted(c for c in columns if c in self.bits))
+
+    def mask_for(self, key):
+        if not key:
+            return np.ones(len(self.names), dtype=bool)
+        required = np.zeros(len(self.bits), dtype=bool)
+        required[[self.bits[c] for c in key]] = True
+        required = np.packbits(required)
+        return np.all((self.packed & required) == required, axis=1)
+
+    # FoodMatrix of the foods satisfying every restriction, in catalog order
+    def matrix_for(self, restrictions):
+        key = self.restriction_key(restrictions)
+        with self._lock:
+            matrix = self._filtered.get(key)
+            if matrix is not None:
+                self._filtered.move_to_end(key)
+                self._counters['hits'] += 1
+                return matrix
+        mask = self.mask_for(key)
+        matrix = FoodMatrix(self.names[mask], self.nutrients[mask])
+        with self._lock:
+            self._counters['misses'] += 1
+            matrix = self._filtered.setdefault(key, matrix)
+            self._filtered.move_to_end(key)
+            while len(self._filtered) > self.max_filtered:
+                self._filtered.popitem(last=False)
+                self._counters['evictions'] += 1
+        return matrix
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counters)
+            stats['cached_restriction_sets'] = len(self._filtered)
+        stats['foods'] = len(self.names)
+        stats['flag_columns'] = list(self.bits)
+        return stats
+
+
+_catalogs = {}
+_catalogs_lock = threading.Lock()
+
+
+# Catalog for the current contents of path; rebuilt (dropping its filtered
+# matrices) whenever the CSV cache sees the file change
+def get_food_catalog(path=FOOD_CSV):
+    snapshot = default_cache.snapshot(path)
+    key = os.path.abspath(path)
+    version = (snapshot.generation, snapshot.version)
+    with _catalogs_lock:
+        current = _catalogs.get(key)
+        if current is not None and current[0] == version:
+            return current[1]
+    catalog = FoodCatalog(snapshot.frame)
+    with _catalogs_lock:
+        _catalogs[key] = (version, catalog)
+    logger.info(f"Built food catalog with {len(catalog)} foods from {path}")
+    return catalog
@@ -0,0 +1,197 @@
+import hashlib
+import logging
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+import joblib
+import numpy as np
+from model.metrics import stage
+
+logger = logging.getLogger(__name__)
+
+FORECASTER_DIR = 'models/forecasters'
+WINDOW_SIZE = 7
+TRAIN_EPOCHS = 20
+FINE_TUNE_EPOCHS = 5
+MAX_IN_MEMORY = int(os.environ.get('FORECASTER_CACHE_SIZE', 64))
+
+
+# Build (X, y) training windows from the daily macro sequence: the windows
+# starting at `start` or later that have a next day. X is a view into data.
+def make_windows(data, window_size=WINDOW_SIZE, start=0):
+    data = np.asarray(data)
+    start = max(start, 0)
+    if len(data) - window_size <= start:
+        return np.zeros((0, window_size) + data.shape[1:]), np.zeros((0,) + data.shape[1:])
+    windows = np.lib.stride_tricks.sliding_window_view(data, window_size, axis=0)
+    return np.moveaxis(windows, -1, 1)[start:len(data) - window_size], data[start + window_size:]
+
+
+def _digest(data):
+    return hashlib.sha1(np.ascontiguousarray(data, dtype=np.float64).tobytes()).hexdigest()
+
+
+# digest covers every day the model was fitted on, closed_digest all but the
+# last, which was still open (meals can be added to it) when it was fitted
+class ForecasterEntry:
+    def __init__(self, model, scaler, n_days, digest, closed_digest=None):
+        self.model = model
+        self.scaler = scaler
+        self.n_days = n_days
+        self.digest = digest
+        self.closed_digest = closed_digest
+
+
+# Keeps one trained LSTM forecaster per user, on disk and in a bounded LRU.
+# A stored model is reused while the user's daily sequence is unchanged; when
+# meals are added to its last day or new days are appended it is fine-tuned
+# on the windows that touch them, and only a rewritten earlier day triggers a
+# full retrain.
+class ForecasterRegistry:
+    def __init__(self, model_dir=FORECASTER_DIR, max_in_memory=MAX_IN_MEMORY,
+                 epochs=TRAIN_EPOCHS, fine_tune_epochs=FINE_TUNE_EPOCHS, build_model=None):
+        self.model_dir = model_dir
+        self.max_in_memory = max_in_memory
+        self.epochs = epochs
+        self.fine_tune_epochs = fine_tune_epochs
+        self._build_model = build_model
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._user_locks = {}
+        self._counters = {'hits': 0, 'misses': 0, 'evictions': 0, 'disk_loads': 0,
+                          'fine_tunes': 0, 'full_trains': 0}
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counters)
+            stats['in_memory'] = len(self._entries)
+            stats['max_in_memory'] = self.max_in_memory
+        return stats
+
+    # Predict the next day's macros for a user, or None if there are no windows
+    def forecast(self, username, data):
+        if len(data) <= WINDOW_SIZE:
+            return None
+        with self._user_lock(username):
+            entry = self._lookup(username)
+            digest = _digest(data)
+            if entry is not None and entry.n_days == len(data) and entry.digest == digest:
+                self._count('hits')
+            elif (entry is not None and entry.closed_digest is not None and entry.n_days <= len(data)
+                  and entry.closed_digest == _digest(data[:entry.n_days - 1])):
+                self._count('misses')
+                entry = self._fine_tune(username, entry, data, digest)
+            else:
+                self._count('misses')
+                entry = self._train(username, data, digest)
+
+            X, _ = make_windows(data, start=len(data) - WINDOW_SIZE - 1)
+            X_scaled = entry.scaler.transform(X.reshape(-1, 4)).reshape(X.shape)
+            with stage('lstm_predict'):
+                pred_scaled = entry.model.predict(X_scaled[-1].reshape(1, WINDOW_SIZE, 4), verbose=0)
+            return entry.scaler.inverse_transform(pred_scaled)[0]
+
+    def _train(self, username, data, digest):
+        from sklearn.preprocessing import MinMaxScaler
+        logger.info(f"Training LSTM forecaster for {username} on {len(data)} days")
+        X, y = make_windows(data)
+        scaler = MinMaxScaler()
+        X_scaled = scaler.fit_transform(X.reshape(-1, 4)).reshape(X.shape)
+        y_scaled = scaler.transform(y)
+        model = self._new_model((X.shape[1], X.shape[2]))
+        with stage('lstm_fit'):
+            model.fit(X_scaled, y_scaled, epochs=self.epochs, verbose=0)
+        self._count('full_trains')
+        return self._store(username, ForecasterEntry(model, scaler, len(data), digest, _digest(data[:-1])))
+
+    def _fine_tune(self, username, entry, data, digest):
+        # Only windows whose target is the previously open day or a new one
+        X, y = make_windows(data, start=entry.n_days - 1 - WINDOW_SIZE)
+        logger.info(f"Fine-tuning LSTM forecaster for {username} on {len(X)} new windows")
+        X_scaled = entry.scaler.transform(X.reshape(-1, 4)).reshape(X.shape)
+        y_scaled = entry.scaler.transform(y)
+        with stage('lstm_fit'):
+            entry.model.fit(X_scaled, y_scaled, epochs=self.fine_tune_epochs, verbose=0)
+        self._count('fine_tunes')
+        return self._store(username, ForecasterEntry(entry.model, entry.scaler, len(data), digest, _digest(data[:-1])))
+
+    def _new_model(self, input_shape):
+        if self._build_model is None:
+            from model.recommender import build_lstm_model
+            self._build_model = build_lstm_model
+        return self._build_model(input_shape)
+
+    # Locks of users no longer held in memory are dropped once there are more
+    # than twice max_in_memory, unless a forecast holds them
+    def _user_lock(self, username):
+        with self._lock:
+            lock = self._user_locks.get(username)
+            if lock is None:
+                if len(self._user_locks) >= 2 * self.max_in_memory:
+                    self._user_locks = {u: l for u, l in self._user_locks.items()
+                                        if u in self._entries or l.locked()}
+                lock = self._user_locks[username] = threading.Lock()
+            return lock
+
+    def _count(self, name, n=1):
+        with self._lock:
+            self._counters[name] += n
+
+    def _paths(self, username):
+        key = hashlib.sha1(str(username).encode('utf-8')).hexdigest()[:20]
+        base = os.path.join(self.model_dir, key)
+        return base + '.keras', base + '.pkl'
+
+    def _lookup(self, username):
+        with self._lock:
+            entry = self._entries.get(username)
+            if entry is not None:
+                self._entries.move_to_end(username)
+                return entry
+        model_path, meta_path = self._paths(username)
+        if not (os.path.exists(model_path) and os.path.exists(meta_path)):
+            return None
+        try:
+            from keras.models import load_model
+            meta = joblib.load(meta_path)
+            entry = ForecasterEntry(load_model(model_path), meta['scaler'], meta['n_days'], meta['digest'],
+                                    meta.get('closed_digest'))
+        except Exception as e:
+            logger.warning(f"Discarding unreadable forecaster for {username}: {e}")
+            return None
+        self._count('disk_loads')
+        self._remember(username, entry)
+        return entry
+
+    def _store(self, username, entry):
+        os.makedirs(self.model_dir, exist_ok=True)
+        model_path, meta_path = self._paths(username)
+        # Unique temp names, so processes storing the same user never share one
+        fd, tmp_model = tempfile.mkstemp(dir=self.model_dir, suffix='.tmp.keras')
+        os.close(fd)
+        fd, tmp_meta = tempfile.mkstemp(dir=self.model_dir, suffix='.pkl.tmp')
+        os.close(fd)
+        try:
+            entry.model.save(tmp_model)
+            joblib.dump({'scaler': entry.scaler, 'n_days': entry.n_days, 'digest': entry.digest,
+                         'closed_digest': entry.closed_digest}, tmp_meta)
+            os.replace(tmp_model, model_path)
+            os.replace(tmp_meta, meta_path)
+        finally:
+            for path in (tmp_model, tmp_meta):
+                if os.path.exists(path):
+                    os.remove(path)
+        self._remember(username, entry)
+        return entry
+
+    def _remember(self, username, entry):
+        with self._lock:
+            self._entries[username] = entry
+            self._entries.move_to_end(username)
+            while len(self._entries) > self.max_in_memory:
+                self._entries.popitem(last=False)
+                self._counters['evictions'] += 1
+
+
+default_registry = ForecasterRegistry()
@@ -0,0 +1,194 @@
+import argparse
+import logging
+import os
+import threading
+import numpy as np
+from model.forecaster_registry import WINDOW_SIZE
+from model.metrics import stage
+from model.response_cache import file_version
+
+logger = logging.getLogger(__name__)
+
+GLOBAL_FORECASTER_PATH = 'models/diet_forecaster.npz'
+DIET_LOGS_CSV = 'data/diet_logs.csv'
+MACRO_COLUMNS = ['calories', 'protein_g', 'carbs_g', 'fat_g']
+HIDDEN_UNITS = 32
+TRAIN_EPOCHS = 30
+# Windows sampled for training when the logs hold more
+MAX_TRAIN_WINDOWS = 500000
+
+
+# Daily macro totals per user, oldest day first: the sequence get_user_sequence
+# builds for one user, for every user in the logs at once
+def daily_sequences(logs):
+    totals = (logs.astype({c: np.float64 for c in MACRO_COLUMNS})
+              .groupby(['username', 'date'], observed=True, sort=True)[MACRO_COLUMNS].sum())
+    usernames = totals.index.get_level_values('username')
+    values = totals.to_numpy()
+    starts = np.flatnonzero(np.r_[True, usernames[1:] != usernames[:-1]])
+    ends = np.r_[starts[1:], len(values)]
+    return {usernames[s]: values[s:e] for s, e in zip(starts, ends)}
+
+
+# Each window is divided by its own mean day (per macro), so one model
+# serves users whatever their usual intake; forecasts are scaled back
+def window_scale(X):
+    return np.maximum(X.mean(axis=1), 1.0)
+
+
+# (X, y) windows from every sequence: WINDOW_SIZE days and the day after
+def build_windows(sequences, window_size=WINDOW_SIZE):
+    X, y = [], []
+    for data in sequences:
+        if len(data) <= window_size:
+            continue
+        windows = np.lib.stride_tricks.sliding_window_view(data, window_size, axis=0).transpose(0, 2, 1)
+        X.append(windows[:-1])
+        y.append(data[window_size:])
+    if not X:
+        return np.zeros((0, window_size, len(MACRO_COLUMNS))), np.zeros((0, len(MACRO_COLUMNS)))
+    return np.concatenate(X), np.concatenate(y)
+
+
+def _sigmoid(x):
+    return 1.0 / (1.0 + np.exp(-x))
+
+
+# Inference-only copy of the Keras LSTM(HIDDEN_UNITS) -> Dense(4) model, run
+# over a batch of windows at once. Products go through einsum in float64
+# rather than BLAS, whose rounding depends on the batch size, so a user's
+# forecast is the same whether they are forecast alone or in a batch.
+class GlobalForecaster:
+    def __init__(self, kernel, recurrent_kernel, bias, dense_kernel, dense_bias, window_size=WINDOW_SIZE):
+        self.kernel = np.asarray(kernel, dtype=np.float64)
+        self.recurrent_kernel = np.asarray(recurrent_kernel, dtype=np.float64)
+        self.bias = np.asarray(bias, dtype=np.float64)
+        self.dense_kernel = np.asarray(dense_kernel, dtype=np.float64)
+        self.dense_bias = np.asarray(dense_bias, dtype=np.float64)
+        self.window_size = int(window_size)
+
+    @classmethod
+    def load(cls, path=GLOBAL_FORECASTER_PATH):
+        with np.load(path) as data:
+            return cls(data['kernel'], data['recurrent_kernel'], data['bias'], data['dense_kernel'],
+                       data['dense_bias'], data['window_size'])
+
+    def save(self, path=GLOBAL_FORECASTER_PATH):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        tmp = path + '.tmp.npz'
+        np.savez(tmp, kernel=self.kernel, recurrent_kernel=self.recurrent_kernel, bias=self.bias,
+                 dense_kernel=self.dense_kernel, dense_bias=self.dense_bias, window_size=self.window_size)
+        os.replace(tmp, path)
+
+    # Forward pass on normalised windows of shape (n, window_size, 4). Gate
+    # order follows Keras: input, forget, cell, output.
+    def predict(self, X):
+        X = np.asarray(X, dtype=np.float64)
+        units = self.recurrent_kernel.shape[0]
+        h = np.zeros((len(X), units), dtype=np.float64)
+        c = np.zeros((len(X), units), dtype=np.float64)
+        inputs = np.einsum('ntk,kj->ntj', X, self.kernel) + self.bias
+        for t in range(X.shape[1]):
+            z = inputs[:, t] + np.einsum('nk,kj->nj', h, self.recurrent_kernel)
+            i, f, g, o = (z[:, k * units:(k + 1) * units] for k in range(4))
+            c = _sigmoid(f) * c + _sigmoid(i) * np.tanh(g)
+            h = _sigmoid(o) * np.tanh(c)
+        return np.einsum('nk,kj->nj', h, self.dense_kernel) + self.dense_bias
+
+    # Next day's macros for each daily sequence in one batched forward pass;
+    # None for sequences shorter than a window
+    def forecast_batch(self, sequences):
+        results = [None] * len(sequences)
+        ready = [i for i, data in enumerate(sequences) if len(data) >= self.window_size]
+        if not ready:
+            return results
+        X = np.stack([np.asarray(sequences[i][-self.window_size:], dtype=np.float64) for i in ready])
+        scale = window_scale(X)
+        with stage('forecast_predict'):
+            predicted = self.predict(X / scale[:, None, :]) * scale
+        for i, row in zip(ready, predicted):
+            results[i] = row
+        return results
+
+    def forecast(self, data):
+        return self.forecast_batch([data])[0]
+
+
+def build_keras_model(window_size=WINDOW_SIZE, units=HIDDEN_UNITS):
+    from keras.models import Sequential
+    from keras.layers import LSTM, Dense, Input
+    model = Sequential([Input((window_size, len(MACRO_COLUMNS))), LSTM(units), Dense(len(MACRO_COLUMNS))])
+    model.compile(optimizer='adam', loss='mse')
+    return model
+
+
+# Fit the global model on windows from all sequences (a sample of
+# max_windows when there are more) and return its NumPy copy
+def train_global_forecaster(sequences, epochs=TRAIN_EPOCHS, max_windows=MAX_TRAIN_WINDOWS, batch_size=256,
+                            verbose=0, seed=42):
+    from tensorflow.keras.callbacks import EarlyStopping
+    X, y = build_windows(sequences)
+    if len(X) == 0:
+        raise ValueError(f"No user has more than {WINDOW_SIZE} days of diet logs")
+    if len(X) > max_windows:
+        keep = np.random.default_rng(seed).choice(len(X), max_windows, replace=False)
+        X, y = X[keep], y[keep]
+    scale = window_scale(X)
+    X, y = (X / scale[:, None, :]).astype(np.float32), (y / scale).astype(np.float32)
+    logger.info(f"Training global diet forecaster on {len(X)} windows")
+    model = build_keras_model()
+    early_stop = EarlyStopping(monitor='val_loss', patience=3, restore_best_weights=True)
+    history = model.fit(X, y, validation_split=0.1, epochs=epochs, batch_size=batch_size, verbose=verbose,
+                        callbacks=[early_stop])
+    logger.info(f"Training completed after {len(history.history['loss'])} epochs, "
+                f"val_loss {min(history.history['val_loss']):.4f}")
+    lstm, dense = [layer for layer in model.layers if layer.get_weights()]
+    return GlobalForecaster(*lstm.get_weights(), *dense.get_weights())
+
+
+_loaded = {}
+_loaded_lock = threading.Lock()
+
+
+# The forecaster saved at path, reloaded when the file changes; None until
+# one has been trained
+def get_global_forecaster(path=GLOBAL_FORECASTER_PATH):
+    version = file_version(path)
+    with _loaded_lock:
+        current = _loaded.get(path)
+        if current is not None and current[0] == version:
+            return current[1]
+    forecaster = None
+    if version != 'missing':
+        forecaster = GlobalForecaster.load(path)
+        logger.info(f"Loaded global diet forecaster from {path}")
+    else:
+        logger.warning(f"No global diet forecaster at {path}; run `python -m model.global_forecaster train`")
+    with _loaded_lock:
+        _loaded[path] = (version, forecaster)
+    return forecaster
+
+
+def global_forecaster_status(path=GLOBAL_FORECASTER_PATH):
+    forecaster = get_global_forecaster(path)
+    status = {'path': path, 'trained': forecaster is not None, 'version': file_version(path)}
+    if forecaster is not None:
+        status.update(window_size=forecaster.window_size, hidden_units=forecaster.recurrent_kernel.shape[0])
+    return status
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Train the global diet forecaster offline')
+    parser.add_argument('command', choices=['train'])
+    parser.add_argument('--logs', default=DIET_LOGS_CSV)
+    parser.add_argument('--out', default=GLOBAL_FORECASTER_PATH)
+    parser.add_argument('--epochs', type=int, default=TRAIN_EPOCHS)
+    parser.add_argument('--max-windows', type=int, default=MAX_TRAIN_WINDOWS)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    from model.schema import DIET_LOG_SCHEMA
+    sequences = daily_sequences(DIET_LOG_SCHEMA.read_csv(args.logs))
+    train_global_forecaster(list(sequences.values()), epochs=args.epochs, max_windows=args.max_windows,
+                            verbose=1).save(args.out)
+    logger.info(f"Saved global diet forecaster to {args.out}")
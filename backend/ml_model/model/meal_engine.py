@@ -0,0 +1,98 @@
+import logging
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+NUTRIENT_COLUMNS = ['calories', 'protein_g', 'carbs_g', 'fat_g']
+MACRO_KEYS = ['calories', 'protein', 'carbs', 'fat']
+SCORE_WEIGHTS = (0.4, 0.3, 0.2, 0.1)
+MACRO_CAP = 1.05
+
+# Food catalog held as a dense (n_foods, 4) nutrient matrix so that scoring,
+# the macro-cap check and the pick are single array operations per step.
+class FoodMatrix:
+    def __init__(self, names, nutrients):
+        self.names = np.asarray(names, dtype=object)
+        self.nutrients = np.ascontiguousarray(nutrients, dtype=np.float64)
+        # Derived structures (search indexes) built lazily by planners
+        self.cache = {}
+        self._positions = {}
+        for i, name in enumerate(self.names):
+            self._positions.setdefault(name, []).append(i)
+
+    @classmethod
+    def from_frame(cls, food_df):
+        return cls(food_df['name'].to_numpy(), food_df[NUTRIENT_COLUMNS].to_numpy(dtype=np.float64))
+
+    def __len__(self):
+        return len(self.names)
+
+    # Boolean mask of foods still available once used_items are excluded
+    def available_mask(self, used_items=None):
+        mask = np.ones(len(self.names), dtype=bool)
+        for name in used_items or ():
+            for i in self._positions.get(name, ()):
+                mask[i] = False
+        return mask
+
+
+# Vectorized equivalent of recommender.score_food over every row of the matrix.
+# Terms are accumulated in the same order so scores are bit-identical.
+def score_foods(nutrients, remaining):
+    score = np.zeros(len(nutrients))
+    for j, weight in enumerate(SCORE_WEIGHTS):
+        r = remaining[j]
+        term = 1 - np.abs(nutrients[:, j] - r) / (r + 1e-6)
+        score += np.maximum(0, term) * weight
+    return score
+
+
+# Indices of scores in the order pandas' sort_values(ascending=False) puts
+# them: an unstable quicksort of the reversed scores, reversed, NaNs last.
+# Equal scores therefore come out in numpy's quicksort order, not catalog
+# order.
+def descending_order(score):
+    nan = np.isnan(score)
+    idx = np.flatnonzero(~nan)[::-1]
+    order = idx[score[idx].argsort(kind='quicksort')][::-1]
+    return np.concatenate([order, np.flatnonzero(nan)])
+
+
+# Greedy meal selection over a FoodMatrix. Matches the original pandas
+# select_meal: each step takes the highest scoring food that keeps every
+# macro within MACRO_CAP of its target. When several feasible foods share
+# the top score, the one its sort visited first is taken (see
+# descending_order).
+def select_meal_from_matrix(matrix, target_macros, used_items=None):
+    mask = matrix.available_mask(used_items)
+    nutrients = matrix.nutrients[mask]
+    names = matrix.names[mask]
+
+    target = np.array([target_macros[k] for k in MACRO_KEYS], dtype=np.float64)
+    cap = target * MACRO_CAP
+    total = np.zeros(4)
+    selected_items = []
+
+    if len(names) == 0:
+        return selected_items
+
+    while True:
+        remaining = target - total
+        scores = score_foods(nutrients, remaining)
+        feasible = np.all(total + nutrients <= cap, axis=1)
+        if not feasible.any():
+            break
+        score = np.where(feasible & ~np.isnan(scores), scores, -np.inf)
+        top = score.max()
+        if top == -np.inf:
+            # Only NaN-scored foods fit; the pandas sort puts those last
+            best = int(np.flatnonzero(feasible)[0])
+        elif np.count_nonzero(score == top) == 1:
+            best = int(np.argmax(score))
+        else:
+            order = descending_order(scores)
+            best = int(order[np.flatnonzero(feasible[order])[0]])
+        total = total + nutrients[best]
+        selected_items.append(names[best])
+
+    return selected_items
@@ -0,0 +1,134 @@
+import itertools
+import logging
+from functools import lru_cache
+import numpy as np
+from model.meal_engine import MACRO_KEYS, MACRO_CAP, SCORE_WEIGHTS
+
+logger = logging.getLogger(__name__)
+
+MAX_ITEMS_PER_MEAL = 3
+# Nearest foods kept per meal size (target / k for k = 1..MAX_ITEMS_PER_MEAL)
+CANDIDATES_PER_SIZE = 24
+# Best combinations per meal carried into the joint day search
+COMBINATIONS_PER_MEAL = 64
+# Grams per kcal in the calculate_macros split. Dividing by it (and weighting
+# like the greedy score) makes Euclidean distance to a meal target track the
+# weighted relative macro error the planner minimises.
+MACRO_SPLIT = np.array([1.0, 0.30 / 4, 0.40 / 4, 0.30 / 9])
+SEARCH_SCALE = np.array(SCORE_WEIGHTS) / MACRO_SPLIT
+
+
+# Weighted relative absolute error of meal totals against a target; an empty
+# meal scores sum(SCORE_WEIGHTS) = 1
+def macro_error(totals, target):
+    return (np.abs(totals - target) / (np.abs(target) + 1e-6) * SCORE_WEIGHTS).sum(axis=-1)
+
+
+@lru_cache(maxsize=32)
+def _combinations(n, k):
+    return np.array(list(itertools.combinations(range(n), k)), dtype=np.intp).reshape(-1, k)
+
+
+def _search_index(matrix):
+    tree = matrix.cache.get('kdtree')
+    if tree is None:
+        from sklearn.neighbors import KDTree
+        # Foods with missing nutrients are pushed out of reach of any query
+        tree = matrix.cache['kdtree'] = KDTree(np.nan_to_num(matrix.nutrients, nan=1e12) * SEARCH_SCALE)
+    return tree
+
+
+def _name_codes(matrix):
+    codes = matrix.cache.get('name_codes')
+    if codes is None:
+        codes = matrix.cache['name_codes'] = np.unique(matrix.names.astype(str), return_inverse=True)[1]
+    return codes
+
+
+# Catalog rows worth considering for a meal: for each meal size k the foods
+# nearest to an even 1/k share of the target, restricted to available foods
+# that fit under the cap on their own
+def prune_candidates(matrix, target, available, max_items=MAX_ITEMS_PER_MEAL, per_size=CANDIDATES_PER_SIZE):
+    tree = _search_index(matrix)
+    cap = target * MACRO_CAP
+    want = min(len(matrix), per_size + int(len(matrix) - available.sum()))
+    found = []
+    for k in range(1, max_items + 1):
+        _, idx = tree.query((target / k * SEARCH_SCALE)[None], k=want)
+        idx = idx[0]
+        idx = idx[available[idx]]
+        idx = idx[np.all(matrix.nutrients[idx] <= cap, axis=1)]
+        found.append(idx[:per_size])
+    return np.unique(np.concatenate(found))
+
+
+# Every feasible meal of up to max_items distinct foods from the candidates,
+# scored exactly; returns the `limit` best as (error, catalog rows), best
+# first, always including the empty meal
+def best_combinations(matrix, candidates, target, max_items=MAX_ITEMS_PER_MEAL, limit=COMBINATIONS_PER_MEAL):
+    cap = target * MACRO_CAP
+    nutrients = matrix.nutrients[candidates]
+    codes = _name_codes(matrix)[candidates]
+    errors, combos = [np.array([macro_error(np.zeros(4), target)])], [np.full((1, max_items), -1)]
+    for k in range(1, min(max_items, len(candidates)) + 1):
+        combo = _combinations(len(candidates), k)
+        totals = nutrients[combo].sum(axis=1)
+        ok = np.all(totals <= cap, axis=1)
+        if k > 1:
+            names = np.sort(codes[combo], axis=1)
+            ok &= np.all(np.diff(names, axis=1) != 0, axis=1)
+        combo, error = combo[ok], macro_error(totals[ok], target)
+        if len(error) > limit:
+            keep = np.argpartition(error, limit)[:limit]
+            combo, error = combo[keep], error[keep]
+        rows = np.full((len(combo), max_items), -1)
+        rows[:, :k] = candidates[combo]
+        errors.append(error)
+        combos.append(rows)
+    errors, combos = np.concatenate(errors), np.concatenate(combos)
+    order = np.argsort(errors, kind='stable')[:limit]
+    return [(float(errors[i]), tuple(int(r) for r in combos[i] if r >= 0)) for i in order]
+
+
+# Pick one option per meal with no food name repeated across the day,
+# minimising the summed error. Options are sorted, so each meal's loop stops
+# as soon as it cannot beat the best day found.
+def joint_search(options, codes):
+    floor = np.concatenate([np.cumsum([meal[0][0] for meal in options][::-1])[::-1], [0.0]])
+    best = [np.inf, None]
+
+    def visit(meal, used, error, chosen):
+        if meal == len(options):
+            if error < best[0]:
+                best[0], best[1] = error, list(chosen)
+            return
+        for option_error, rows in options[meal]:
+            if error + option_error + floor[meal + 1] >= best[0]:
+                break
+            names = {int(codes[r]) for r in rows}
+            if used & names:
+                continue
+            chosen.append(rows)
+            visit(meal + 1, used | names, error + option_error, chosen)
+            chosen.pop()
+
+    visit(0, frozenset(), 0.0, [])
+    return best[1]
+
+
+# Plan all meals of a day jointly: prune the catalog with a KD-tree around each
+# meal target, enumerate small meals exactly and choose the best combination
+# across meals under the MACRO_CAP and no-repeat rules. meal_targets maps
+# meal name -> target macros; returns meal name -> list of food names.
+def plan_day_optimized(matrix, meal_targets, used_items=None, max_items=MAX_ITEMS_PER_MEAL,
+                       per_size=CANDIDATES_PER_SIZE, limit=COMBINATIONS_PER_MEAL):
+    if len(matrix) == 0:
+        return {meal: [] for meal in meal_targets}
+    available = matrix.available_mask(used_items)
+    options = []
+    for macros in meal_targets.values():
+        target = np.array([macros[k] for k in MACRO_KEYS], dtype=np.float64)
+        candidates = prune_candidates(matrix, target, available, max_items, per_size)
+        options.append(best_combinations(matrix, candidates, target, max_items, limit))
+    chosen = joint_search(options, _name_codes(matrix))
+    return {meal: [matrix.names[r] for r in rows] for meal, rows in zip(meal_targets, chosen)}
@@ -0,0 +1,99 @@
+import bisect
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+
+# Upper bounds in seconds; covers sub-millisecond numpy work up to LSTM training
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+NO_ENDPOINT = 'none'
+
+_endpoint = contextvars.ContextVar('metrics_endpoint', default=NO_ENDPOINT)
+
+
+# Label stages timed in the current context (request thread) with an endpoint.
+# Returns a token for reset_endpoint.
+def set_endpoint(endpoint):
+    return _endpoint.set(endpoint)
+
+
+def reset_endpoint(token):
+    _endpoint.reset(token)
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+
+# Duration histograms and error counters per (stage, endpoint). Recording is a
+# bisect and a few additions under one lock, cheap enough for every request.
+class StageMetrics:
+    def __init__(self, buckets=DEFAULT_BUCKETS, prefix='ml'):
+        self.buckets = tuple(buckets)
+        self.prefix = prefix
+        self._lock = threading.Lock()
+        self._histograms = {}
+        self._errors = {}
+
+    def observe(self, stage, seconds, endpoint=None):
+        key = (stage, endpoint or _endpoint.get())
+        index = bisect.bisect_left(self.buckets, seconds)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram(self.buckets)
+            histogram.counts[index] += 1
+            histogram.sum += seconds
+            histogram.count += 1
+
+    def error(self, stage, endpoint=None):
+        key = (stage, endpoint or _endpoint.get())
+        with self._lock:
+            self._errors[key] = self._errors.get(key, 0) + 1
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        except Exception:
+            self.error(name)
+            raise
+        finally:
+            self.observe(name, time.perf_counter() - start)
+
+    def snapshot(self):
+        with self._lock:
+            histograms = {key: (list(h.counts), h.sum, h.count) for key, h in self._histograms.items()}
+            return histograms, dict(self._errors)
+
+    # Prometheus text exposition format (version 0.0.4)
+    def render_prometheus(self):
+        histograms, errors = self.snapshot()
+        name = f'{self.prefix}_stage_duration_seconds'
+        lines = [f'# HELP {name} Time spent in each recommendation stage.', f'# TYPE {name} histogram']
+        for (stage, endpoint), (counts, total, count) in sorted(histograms.items()):
+            labels = f'stage="{_escape(stage)}",endpoint="{_escape(endpoint)}"'
+            cumulative = 0
+            for bound, n in zip(self.buckets + (float('inf'),), counts):
+                cumulative += n
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                lines.append(f'{name}_bucket{{{labels},le="{le}"}} {cumulative}')
+            lines.append(f'{name}_sum{{{labels}}} {total!r}')
+            lines.append(f'{name}_count{{{labels}}} {count}')
+        name = f'{self.prefix}_stage_errors_total'
+        lines += [f'# HELP {name} Stage executions that raised.', f'# TYPE {name} counter']
+        for (stage, endpoint), count in sorted(errors.items()):
+            lines.append(f'{name}{{stage="{_escape(stage)}",endpoint="{_escape(endpoint)}"}} {count}')
+        return '\n'.join(lines) + '\n'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+default_metrics = StageMetrics()
+stage = default_metrics.stage
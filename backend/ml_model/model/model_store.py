@@ -0,0 +1,197 @@
+import json
+import logging
+import os
+import re
+import shutil
+import tempfile
+import threading
+import time
+from model.bootstrap import ModelNotReady
+
+logger = logging.getLogger(__name__)
+
+BASE_MODEL_DIR = 'models'
+VERSIONS_DIR = 'models/versions'
+CURRENT_FILE = 'CURRENT'
+KEEP_VERSIONS = int(os.environ.get('MODEL_KEEP_VERSIONS', 5))
+WATCH_SECONDS = float(os.environ.get('MODEL_WATCH_SECONDS', 10))
+ARTIFACTS = {
+    'model': 'workout_model.h5',
+    'scaler_X': 'scaler_X.pkl',
+    'scaler_y': 'scaler_y.pkl',
+    'npz': 'workout_model.npz',
+    'state': 'training_state.pkl',
+}
+VERSION_PATTERN = re.compile(r'^v(\d{6})$')
+
+
+def artifact_paths(model_dir):
+    return {name: os.path.join(model_dir, filename) for name, filename in ARTIFACTS.items()}
+
+
+def list_versions(root=VERSIONS_DIR):
+    if not os.path.isdir(root):
+        return []
+    return sorted(name for name in os.listdir(root) if VERSION_PATTERN.match(name))
+
+
+def current_version(root=VERSIONS_DIR):
+    try:
+        with open(os.path.join(root, CURRENT_FILE)) as f:
+            version = f.read().strip()
+    except FileNotFoundError:
+        return None
+    return version if os.path.isdir(os.path.join(root, version)) else None
+
+
+# Directory the live model is served from: the CURRENT version, or the base
+# models/ directory before any retrain has been published
+def current_model_dir(root=VERSIONS_DIR, base_dir=BASE_MODEL_DIR):
+    version = current_version(root)
+    return os.path.join(root, version) if version else base_dir
+
+
+def artifact_version(model_dir):
+    parts = [os.path.basename(os.path.normpath(model_dir))]
+    for name in ('npz', 'model'):
+        path = artifact_paths(model_dir)[name]
+        if os.path.exists(path):
+            st = os.stat(path)
+            parts.append(f"{ARTIFACTS[name]}:{st.st_size}-{st.st_mtime_ns}")
+    return '/'.join(parts)
+
+
+def read_meta(model_dir):
+    path = os.path.join(model_dir, 'meta.json')
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+# Point CURRENT at a version; the rename is atomic so readers never see a
+# half-written pointer
+def set_current(version, root=VERSIONS_DIR):
+    if not os.path.isdir(os.path.join(root, version)):
+        raise ValueError(f"Unknown model version {version}")
+    fd, tmp = tempfile.mkstemp(dir=root, prefix='.CURRENT.')
+    with os.fdopen(fd, 'w') as f:
+        f.write(version + '\n')
+    os.replace(tmp, os.path.join(root, CURRENT_FILE))
+    logger.info(f"Workout model version {version} is now current")
+
+
+# Move a fully written staging directory into place as the next version and
+# make it current. Versions beyond the newest `keep` are deleted, except the
+# one being served.
+def publish_version(staging_dir, meta, root=VERSIONS_DIR, keep=KEEP_VERSIONS):
+    os.makedirs(root, exist_ok=True)
+    versions = list_versions(root)
+    number = int(VERSION_PATTERN.match(versions[-1]).group(1)) + 1 if versions else 1
+    version = f"v{number:06d}"
+    meta = dict(meta, version=version, published_at=time.time())
+    with open(os.path.join(staging_dir, 'meta.json'), 'w') as f:
+        json.dump(meta, f, indent=2)
+    os.rename(staging_dir, os.path.join(root, version))
+    set_current(version, root)
+    prune_versions(root, keep)
+    return version
+
+
+def prune_versions(root=VERSIONS_DIR, keep=KEEP_VERSIONS):
+    current = current_version(root)
+    for version in list_versions(root)[:-keep]:
+        if version != current:
+            shutil.rmtree(os.path.join(root, version), ignore_errors=True)
+            logger.info(f"Pruned workout model version {version}")
+
+
+# Holds the (model, scaler_X, scaler_y) bundle being served and swaps it when
+# CURRENT changes or the served directory's artifacts are rewritten in place
+# (a retrain or export into models/). A new version is loaded completely
+# before the reference is replaced, so requests never wait on a load and
+# in-flight requests finish on the bundle they started with.
+class ModelStore:
+    def __init__(self, load_fn, root=VERSIONS_DIR, base_dir=BASE_MODEL_DIR, watch_seconds=WATCH_SECONDS):
+        self.load_fn = load_fn
+        self.root = root
+        self.base_dir = base_dir
+        self.watch_seconds = watch_seconds
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._bundle = None
+        self._model_dir = None
+        self._version_key = None
+        self._meta = {}
+        self._swaps = 0
+        self._errors = 0
+        self._last_swap = None
+        self._watcher = None
+
+    def get(self):
+        bundle = self._bundle
+        if bundle is None:
+            raise ModelNotReady("No workout model has been loaded")
+        return bundle
+
+    def ready(self):
+        return self._bundle is not None
+
+    # The served bundle together with its version_key, read atomically
+    def current(self):
+        with self._lock:
+            bundle, version_key = self._bundle, self._version_key
+        if bundle is None:
+            raise ModelNotReady("No workout model has been loaded")
+        return bundle, version_key
+
+    # Identifies the served weights, stable across restarts
+    def version_key(self):
+        return self._version_key
+
+    # Load the current version if it is not the one being served, by
+    # directory or by artifact size/mtime. Returns True when a swap happened.
+    def refresh(self):
+        with self._refresh_lock:
+            model_dir = current_model_dir(self.root, self.base_dir)
+            version_key = artifact_version(model_dir)
+            if model_dir == self._model_dir and version_key == self._version_key:
+                return False
+            bundle = self.load_fn(model_dir)
+            # Artifacts still being written; keep serving the previous bundle
+            # and load them once they have settled. With nothing served yet the
+            # bundle is kept, and its stale key makes the next poll reload.
+            if artifact_version(model_dir) != version_key and self._bundle is not None:
+                logger.info(f"Workout model in {model_dir} changed while loading; retrying on the next poll")
+                return False
+            with self._lock:
+                self._bundle, self._model_dir, self._meta = bundle, model_dir, read_meta(model_dir)
+                self._version_key = version_key
+                self._swaps += 1
+                self._last_swap = time.time()
+            logger.info(f"Serving workout model from {model_dir}")
+            return True
+
+    def start_watcher(self):
+        with self._lock:
+            if self._watcher is not None or self.watch_seconds <= 0:
+                return self
+            self._watcher = threading.Thread(target=self._watch, name='workout-model-watcher', daemon=True)
+            self._watcher.start()
+        return self
+
+    def _watch(self):
+        while True:
+            time.sleep(self.watch_seconds)
+            try:
+                self.refresh()
+            except Exception:
+                # Keep serving the previous bundle; the next poll retries
+                logger.exception("Failed to load new workout model version")
+                with self._lock:
+                    self._errors += 1
+
+    def status(self):
+        with self._lock:
+            return {'model_dir': self._model_dir, 'version': self._meta.get('version'),
+                    'swaps': self._swaps, 'load_errors': self._errors, 'last_swap': self._last_swap}
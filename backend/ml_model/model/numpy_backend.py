@@ -0,0 +1,103 @@
+import argparse
+import logging
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+NUMPY_MODEL_PATH = 'models/workout_model.npz'
+ACTIVATIONS = {
+    'linear': lambda x: x,
+    'relu': lambda x: np.maximum(x, 0),
+}
+
+
+VOCAB_PREFIX = 'vocab_'
+
+
+# StandardScaler parameters without sklearn at serving time; exercise_vocab
+# is the vocabulary the model's exercise encodings were trained with
+class NumpyStandardScaler:
+    def __init__(self, mean, scale, exercise_vocab=None):
+        self.mean_ = np.asarray(mean, dtype=np.float64)
+        self.scale_ = np.asarray(scale, dtype=np.float64)
+        self.n_features_in_ = len(self.mean_)
+        self.exercise_vocab = exercise_vocab
+
+    def transform(self, X):
+        return (np.asarray(X, dtype=np.float64) - self.mean_) / self.scale_
+
+    def inverse_transform(self, X):
+        return np.asarray(X, dtype=np.float64) * self.scale_ + self.mean_
+
+
+# Inference-only copy of the workout MLP (Dense layers; Dropout is a no-op at
+# inference). Computes in float32 like Keras so outputs match closely.
+class NumpyMLP:
+    def __init__(self, weights, biases, activations):
+        self.weights = [np.ascontiguousarray(w, dtype=np.float32) for w in weights]
+        self.biases = [np.asarray(b, dtype=np.float32) for b in biases]
+        self.activations = list(activations)
+
+    def predict(self, X, verbose=0):
+        out = np.asarray(X, dtype=np.float32)
+        for w, b, activation in zip(self.weights, self.biases, self.activations):
+            out = ACTIVATIONS[activation](out @ w + b)
+        return out
+
+
+def _scaler_params(scaler):
+    n = scaler.n_features_in_
+    mean = scaler.mean_ if getattr(scaler, 'mean_', None) is not None else np.zeros(n)
+    scale = scaler.scale_ if getattr(scaler, 'scale_', None) is not None else np.ones(n)
+    return mean, scale
+
+
+# Write Dense weights and scaler parameters of a trained Keras model to one .npz
+def export_numpy_artifact(model, scaler_X, scaler_y, path=NUMPY_MODEL_PATH):
+    arrays, activations = {}, []
+    for layer in model.layers:
+        if not layer.get_weights():
+            continue
+        activation = layer.get_config().get('activation', 'linear')
+        if activation not in ACTIVATIONS:
+            raise ValueError(f"Unsupported activation '{activation}' in layer {layer.name}")
+        kernel, bias = layer.get_weights()
+        arrays[f'W{len(activations)}'] = kernel.astype(np.float32)
+        arrays[f'b{len(activations)}'] = bias.astype(np.float32)
+        activations.append(activation)
+    arrays['activations'] = np.array(activations)
+    arrays['x_mean'], arrays['x_scale'] = _scaler_params(scaler_X)
+    arrays['y_mean'], arrays['y_scale'] = _scaler_params(scaler_y)
+    vocab = getattr(scaler_X, 'exercise_vocab', None)
+    if vocab is not None:
+        arrays.update({VOCAB_PREFIX + column: np.array(values, dtype=str) for column, values in vocab.items()})
+    np.savez_compressed(path, **arrays)
+    logger.info(f"Exported {len(activations)} dense layers and scalers to {path}")
+
+
+# Drop-in replacement for workout.load_model_and_scalers without TensorFlow
+def load_numpy_model_and_scalers(path=NUMPY_MODEL_PATH):
+    with np.load(path) as data:
+        activations = [str(a) for a in data['activations']]
+        model = NumpyMLP([data[f'W{i}'] for i in range(len(activations))],
+                         [data[f'b{i}'] for i in range(len(activations))], activations)
+        vocab = {name[len(VOCAB_PREFIX):]: [str(v) for v in data[name]]
+                 for name in data.files if name.startswith(VOCAB_PREFIX)} or None
+        scaler_X = NumpyStandardScaler(data['x_mean'], data['x_scale'], vocab)
+        scaler_y = NumpyStandardScaler(data['y_mean'], data['y_scale'])
+    logger.info(f"Loaded NumPy workout model from {path}")
+    return model, scaler_X, scaler_y
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Export the Keras workout model for NumPy inference')
+    parser.add_argument('command', choices=['export'])
+    parser.add_argument('--model', default='models/workout_model.h5')
+    parser.add_argument('--scaler-x', default='models/scaler_X.pkl')
+    parser.add_argument('--scaler-y', default='models/scaler_y.pkl')
+    parser.add_argument('--out', default=NUMPY_MODEL_PATH)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    from model.workout import load_model_and_scalers
+    export_numpy_artifact(*load_model_and_scalers(args.model, args.scaler_x, args.scaler_y), path=args.out)
@@ -0,0 +1,281 @@
+import argparse
+import json
+import logging
+import math
+import multiprocessing
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from model.daily_macros import default_daily_macros as daily_macros
+from model.datastore import read_csv_cached
+from model.feedback_index import get_feedback_index
+from model.model_store import artifact_paths, artifact_version, current_model_dir
+from model.numpy_backend import load_numpy_model_and_scalers
+from model.recommender import DEFAULT_PLANNER, PLANNERS, diet_data_versions, load_food_catalog, recommend_meals_batch
+from model.schema import EXERCISE_SCHEMA
+from model.utils import load_all_logs, load_all_profiles
+from model.workout import load_model_and_scalers, recommend_workout_batch, workout_data_version
+
+logger = logging.getLogger(__name__)
+
+PRECOMPUTE_DB = os.environ.get('PRECOMPUTE_DB', 'models/precomputed.sqlite')
+FEEDBACK_CSV = 'data/feedback_logs.csv'
+EXERCISE_CSV = 'data/exercise_items.csv'
+SHARD_USERS = 500
+DIET_ENDPOINT = '/recommend-diet'
+WORKOUT_ENDPOINT = '/recommend-workout'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS recommendations (
+    endpoint TEXT NOT NULL,
+    username TEXT NOT NULL,
+    data_version TEXT NOT NULL,
+    model_version TEXT NOT NULL,
+    result TEXT NOT NULL,
+    run_id INTEGER NOT NULL,
+    computed_at REAL NOT NULL,
+    PRIMARY KEY (endpoint, username)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS runs (
+    run_id INTEGER PRIMARY KEY,
+    planner TEXT NOT NULL,
+    n_shards INTEGER NOT NULL,
+    users INTEGER NOT NULL,
+    started_at REAL NOT NULL,
+    finished_at REAL
+);
+CREATE TABLE IF NOT EXISTS shards (
+    run_id INTEGER NOT NULL,
+    shard INTEGER NOT NULL,
+    users INTEGER NOT NULL,
+    errors INTEGER NOT NULL,
+    seconds REAL NOT NULL,
+    done_at REAL NOT NULL,
+    PRIMARY KEY (run_id, shard)
+);
+"""
+
+
+# Recommendations materialised by the precompute job, keyed like the response
+# cache: (endpoint, username) holds the data and model versions a result was
+# computed from, and is served only while both still match the request's.
+# Connections are opened per thread and per process, so the store can be
+# shared by Flask threads and forked serve.py workers.
+class PrecomputedStore:
+    def __init__(self, path=PRECOMPUTE_DB):
+        self.path = path
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._counters = {'hits': 0, 'misses': 0, 'stale': 0}
+
+    @property
+    def enabled(self):
+        return os.path.exists(self.path)
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = self._local.conn = sqlite3.connect(self.path, timeout=5.0)
+            self._local.pid = os.getpid()
+        return conn
+
+    def get(self, endpoint, username, data_version, model_version):
+        if not self.enabled:
+            return None
+        try:
+            row = self._connection().execute(
+                'SELECT data_version, model_version, result FROM recommendations WHERE endpoint = ? AND username = ?',
+                (endpoint, username)).fetchone()
+        except sqlite3.Error as e:
+            logger.warning(f"Precomputed lookup failed: {e}")
+            return None
+        if row is None:
+            self._count('misses')
+            return None
+        if (row[0], row[1]) != (data_version, model_version):
+            self._count('stale')
+            return None
+        self._count('hits')
+        return json.loads(row[2])
+
+    def _count(self, name):
+        with self._lock:
+            self._counters[name] += 1
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counters)
+        stats['path'] = self.path
+        if not self.enabled:
+            return dict(stats, rows=0, last_run=None)
+        conn = self._connection()
+        stats['rows'] = dict(conn.execute('SELECT endpoint, COUNT(*) FROM recommendations GROUP BY endpoint').fetchall())
+        run = conn.execute('SELECT run_id, started_at, finished_at, n_shards, users FROM runs '
+                           'ORDER BY run_id DESC LIMIT 1').fetchone()
+        stats['last_run'] = dict(zip(('run_id', 'started_at', 'finished_at', 'n_shards', 'users'), run)) if run else None
+        return stats
+
+
+default_precomputed = PrecomputedStore()
+
+
+def connect(path=PRECOMPUTE_DB):
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    conn = sqlite3.connect(path)
+    # Readers (the service) keep answering while the job writes
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.executescript(SCHEMA)
+    return conn
+
+
+# Stable across runs and user additions, so a resumed run reassigns every
+# user to the shard they were in
+def shard_of(username, n_shards):
+    return zlib.crc32(username.encode('utf-8')) % n_shards
+
+
+# The latest run if it did not finish, else a new one over n_users users
+def open_run(conn, n_users, shard_size, planner, restart=False):
+    run = conn.execute('SELECT run_id, planner, n_shards, finished_at FROM runs ORDER BY run_id DESC LIMIT 1').fetchone()
+    if run is not None and run[3] is None and not restart:
+        done = conn.execute('SELECT COUNT(*) FROM shards WHERE run_id = ?', (run[0],)).fetchone()[0]
+        logger.info(f"Resuming run {run[0]}: {done}/{run[2]} shards already done")
+        return run[0], run[1], run[2]
+    n_shards = max(1, math.ceil(n_users / shard_size))
+    with conn:
+        cursor = conn.execute('INSERT INTO runs (planner, n_shards, users, started_at) VALUES (?, ?, ?, ?)',
+                              (planner, n_shards, n_users, time.time()))
+    return cursor.lastrowid, planner, n_shards
+
+
+_worker_bundle = None
+
+
+def _init_worker(threads):
+    from threadpoolctl import threadpool_limits
+    for var in ('OMP_NUM_THREADS', 'TF_NUM_INTRAOP_THREADS'):
+        os.environ[var] = str(threads)
+    threadpool_limits(threads)
+    # The recommenders log every step at INFO; progress is logged per shard
+    logging.getLogger('model').setLevel(logging.WARNING)
+
+
+# The served workout model, loaded once per worker with the service's backend
+def _workout_bundle():
+    global _worker_bundle
+    if _worker_bundle is None:
+        model_dir = current_model_dir()
+        paths = artifact_paths(model_dir)
+        if os.environ.get('WORKOUT_BACKEND', 'numpy') == 'numpy' and os.path.exists(paths['npz']):
+            bundle = load_numpy_model_and_scalers(paths['npz'])
+        else:
+            bundle = load_model_and_scalers(paths['model'], paths['scaler_X'], paths['scaler_y'])
+        _worker_bundle = (bundle, artifact_version(model_dir))
+    return _worker_bundle
+
+
+# Compute one shard in a worker. Versions are read before the results, so
+# data that changes meanwhile leaves a row the service will not serve.
+def compute_shard(shard, diet_users, workout_users, planner):
+    start = time.perf_counter()
+    rows, errors = [], 0
+    if diet_users:
+        versions = diet_data_versions(diet_users)
+        for entry in recommend_meals_batch(diet_users, planner):
+            if 'result' in entry and entry['result'] is not None:
+                rows.append((DIET_ENDPOINT, entry['username'], versions[entry['username']], planner,
+                             json.dumps(entry['result'])))
+            else:
+                errors += 1
+    if workout_users:
+        (model, scaler_X, scaler_y), model_version = _workout_bundle()
+        versions = {u: workout_data_version(u, FEEDBACK_CSV, EXERCISE_CSV) for u in workout_users}
+        for entry in recommend_workout_batch(workout_users, model=model, scaler_X=scaler_X, scaler_y=scaler_y,
+                                             exercise_csv=EXERCISE_CSV, feedback_csv=FEEDBACK_CSV):
+            if 'result' in entry:
+                rows.append((WORKOUT_ENDPOINT, entry['username'], versions[entry['username']], model_version,
+                             json.dumps(entry['result'])))
+            else:
+                errors += 1
+    return shard, len(set(diet_users) | set(workout_users)), rows, errors, time.perf_counter() - start
+
+
+# Record a finished shard and its results in one transaction, so a shard is
+# either fully checkpointed or redone on resume
+def checkpoint_shard(conn, run_id, shard, users, rows, errors, seconds):
+    now = time.time()
+    with conn:
+        conn.executemany('INSERT OR REPLACE INTO recommendations VALUES (?, ?, ?, ?, ?, ?, ?)',
+                         [row + (run_id, now) for row in rows])
+        conn.execute('INSERT INTO shards VALUES (?, ?, ?, ?, ?, ?)', (run_id, shard, users, errors, seconds, now))
+
+
+# Materialise diet recommendations for every profile and workout
+# recommendations for every user with feedback, spread over a process pool.
+# Resumes the latest unfinished run unless restart is set.
+def run_precompute(db_path=PRECOMPUTE_DB, workers=None, shard_size=SHARD_USERS, planner=None, restart=False):
+    workers = workers or len(os.sched_getaffinity(0))
+    # Loaded before forking so the workers share one copy
+    profile_users = set(load_all_profiles()['username'].astype(str))
+    load_all_logs()
+    daily_macros.refresh()
+    load_food_catalog()
+    read_csv_cached(EXERCISE_CSV, EXERCISE_SCHEMA)
+    workout_users = set(get_feedback_index(FEEDBACK_CSV).usernames())
+    users = sorted(profile_users | workout_users)
+
+    conn = connect(db_path)
+    run_id, planner, n_shards = open_run(conn, len(users), shard_size, planner or DEFAULT_PLANNER, restart)
+    done = {row[0] for row in conn.execute('SELECT shard FROM shards WHERE run_id = ?', (run_id,))}
+    shards = {}
+    for username in users:
+        shards.setdefault(shard_of(username, n_shards), []).append(username)
+    pending = {shard: members for shard, members in shards.items() if shard not in done}
+    logger.info(f"Run {run_id}: {len(users)} users in {n_shards} shards, {len(pending)} to compute "
+                f"on {workers} workers")
+
+    start = time.perf_counter()
+    computed, failed = 0, 0
+    threads = max(1, len(os.sched_getaffinity(0)) // workers)
+    with ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context('fork'),
+                             initializer=_init_worker, initargs=(threads,)) as pool:
+        futures = [pool.submit(compute_shard, shard, [u for u in members if u in profile_users],
+                               [u for u in members if u in workout_users], planner)
+                   for shard, members in pending.items()]
+        for future in as_completed(futures):
+            shard, n_users, rows, errors, seconds = future.result()
+            checkpoint_shard(conn, run_id, shard, n_users, rows, errors, seconds)
+            computed += n_users
+            failed += errors
+            elapsed = time.perf_counter() - start
+            logger.info(f"Shard {shard}: {n_users} users in {seconds:.1f}s ({computed} users, "
+                        f"{computed / elapsed:.1f} users/s overall)")
+
+    with conn:
+        conn.execute('UPDATE runs SET finished_at = ? WHERE run_id = ?', (time.time(), run_id))
+    conn.close()
+    elapsed = time.perf_counter() - start
+    summary = {'run_id': run_id, 'users': computed, 'errors': failed, 'shards': len(pending),
+               'seconds': round(elapsed, 2), 'users_per_second': round(computed / elapsed, 1) if elapsed else None}
+    logger.info(f"Precompute run {run_id} finished: {summary}")
+    return summary
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Precompute diet and workout recommendations for all users')
+    parser.add_argument('command', choices=['run', 'status'])
+    parser.add_argument('--db', default=PRECOMPUTE_DB)
+    parser.add_argument('--workers', type=int, default=None, help='worker processes (default: one per core)')
+    parser.add_argument('--shard-size', type=int, default=SHARD_USERS, help='users per checkpointed shard')
+    parser.add_argument('--planner', choices=PLANNERS, default=None)
+    parser.add_argument('--restart', action='store_true', help='start a new run even if the last one did not finish')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    if args.command == 'run':
+        print(json.dumps(run_precompute(args.db, args.workers, args.shard_size, args.planner, args.restart)))
+    else:
+        print(json.dumps(PrecomputedStore(args.db).stats(), indent=2))
@@ -0,0 +1,139 @@
+import cProfile
+import io
+import logging
+import os
+import pstats
+import re
+import threading
+import time
+import tracemalloc
+import uuid
+
+logger = logging.getLogger(__name__)
+
+PROFILE_DIR = os.environ.get('PROFILE_DIR', 'profiles')
+# At most one profiled request per interval; tracemalloc is process-wide, so
+# profiles never overlap either
+MIN_INTERVAL_SECONDS = float(os.environ.get('PROFILE_MIN_INTERVAL_SECONDS', 60))
+KEEP_PROFILES = int(os.environ.get('PROFILE_KEEP', 50))
+TOP_N = 30
+TRACEBACK_FRAMES = 10
+PROFILE_ID = re.compile(r'^[0-9]{8}-[0-9]{6}-[0-9a-f]{8}$')
+
+
+class ProfileResult:
+    def __init__(self, profile_id, value, error=None):
+        self.profile_id = profile_id
+        self.value = value
+        self.error = error
+
+
+# Runs a call under cProfile and tracemalloc and writes <id>.pstats (open with
+# pstats/snakeviz) and <id>.txt (top functions, the request's peak traced
+# memory and the allocation sites that grew most over the request, by line).
+# Memory freed before the request returns, such as a temporary copy of a
+# frame, counts towards the peak but not the per-line growth. cProfile only
+# sees the calling thread; time spent waiting on another thread (e.g. the
+# inference batcher) shows up as that wait.
+class RequestProfiler:
+    def __init__(self, out_dir=PROFILE_DIR, min_interval=MIN_INTERVAL_SECONDS, keep=KEEP_PROFILES):
+        self.out_dir = out_dir
+        self.min_interval = min_interval
+        self.keep = keep
+        self._lock = threading.Lock()
+        self._busy = False
+        self._last_start = None
+
+    # Reserve the profiler; False when another profile runs or one ran too recently
+    def acquire(self):
+        with self._lock:
+            now = time.monotonic()
+            if self._busy or (self._last_start is not None and now - self._last_start < self.min_interval):
+                return False
+            self._busy, self._last_start = True, now
+            return True
+
+    def release(self):
+        with self._lock:
+            self._busy = False
+
+    # Profile fn(); the caller must hold the reservation from acquire()
+    def run(self, label, fn):
+        profile_id = f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:8]}"
+        started_tracing = not tracemalloc.is_tracing()
+        if started_tracing:
+            tracemalloc.start(TRACEBACK_FRAMES)
+        before = tracemalloc.take_snapshot()
+        tracemalloc.reset_peak()
+        baseline, _ = tracemalloc.get_traced_memory()
+        profiler = cProfile.Profile()
+        value, error = None, None
+        start = time.perf_counter()
+        profiler.enable()
+        try:
+            value = fn()
+        except Exception as e:
+            error = e
+        finally:
+            profiler.disable()
+            elapsed = time.perf_counter() - start
+            current, peak = tracemalloc.get_traced_memory()
+            after = tracemalloc.take_snapshot()
+            if started_tracing:
+                tracemalloc.stop()
+        try:
+            self._write(profile_id, label, profiler, before, after, elapsed, peak - baseline, error)
+        except OSError as e:
+            logger.error(f"Could not save profile {profile_id}: {e}")
+            profile_id = None
+        if error is not None:
+            raise error
+        return ProfileResult(profile_id, value)
+
+    def path(self, profile_id, kind):
+        if not PROFILE_ID.match(profile_id) or kind not in ('txt', 'pstats'):
+            return None
+        path = os.path.join(self.out_dir, f'{profile_id}.{kind}')
+        return path if os.path.exists(path) else None
+
+    def list(self):
+        if not os.path.isdir(self.out_dir):
+            return []
+        return sorted((name[:-len('.txt')] for name in os.listdir(self.out_dir) if name.endswith('.txt')), reverse=True)
+
+    def _write(self, profile_id, label, profiler, before, after, elapsed, peak, error):
+        os.makedirs(self.out_dir, exist_ok=True)
+        base = os.path.join(self.out_dir, profile_id)
+        profiler.dump_stats(base + '.pstats')
+
+        report = io.StringIO()
+        report.write(f"profile {profile_id}: {label}\n")
+        report.write(f"wall time {elapsed * 1000:.1f} ms, peak traced memory {peak / 1024 / 1024:.2f} MiB "
+                     f"above the start of the request\n")
+        if error is not None:
+            report.write(f"raised {type(error).__name__}: {error}\n")
+        for sort_key in ('cumulative', 'tottime'):
+            report.write(f"\n=== top {TOP_N} functions by {sort_key} time ===\n")
+            pstats.Stats(profiler, stream=report).sort_stats(sort_key).print_stats(TOP_N)
+        report.write(f"\n=== top {TOP_N} allocation sites by line (change over the request) ===\n")
+        filters = [tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, __file__)]
+        diff = after.filter_traces(filters).compare_to(before.filter_traces(filters), 'lineno')
+        for stat in diff[:TOP_N]:
+            frame = stat.traceback[0]
+            report.write(f"{stat.size_diff / 1024:+10.1f} KiB {stat.count_diff:+8d} blocks  "
+                         f"{frame.filename}:{frame.lineno}\n")
+        with open(base + '.txt', 'w') as f:
+            f.write(report.getvalue())
+        self._prune()
+        logger.info(f"Saved profile {profile_id} for {label}")
+
+    def _prune(self):
+        for profile_id in self.list()[self.keep:]:
+            for kind in ('txt', 'pstats'):
+                try:
+                    os.remove(os.path.join(self.out_dir, f'{profile_id}.{kind}'))
+                except FileNotFoundError:
+                    pass
+
+
+default_profiler = RequestProfiler()
@@ -1,15 +1,30 @@
 import logging
+import os
 import pandas as pd
 import numpy as np
-from keras.models import Sequential
-from keras.layers import LSTM, Dense
-from sklearn.preprocessing import MinMaxScaler
-from sklearn.ensemble import RandomForestRegressor
-from model.utils import load_user_profile, load_all_logs, load_food_items, filter_food_by_dietary_restrictions
+from model.utils import find_user_profiles, load_user_profile, load_all_profiles, load_all_logs, load_user_logs
+from model.food_catalog import FOOD_CSV, get_food_catalog
+from model.response_cache import digest, file_version
+from model.meal_engine import FoodMatrix, select_meal_from_matrix
+from model.meal_optimizer import plan_day_optimized
+from model.forecaster_registry import default_registry as forecaster_registry
+from model.global_forecaster import GLOBAL_FORECASTER_PATH, get_global_forecaster
+from model.daily_macros import default_daily_macros as daily_macros
+from model.metrics import stage
 
 # Set up logging
 logger = logging.getLogger(__name__)
 
+# "greedy" adds the best-scoring food one at a time per meal; "optimizer"
+# plans the whole day jointly (see meal_optimizer)
+PLANNERS = ('greedy', 'optimizer')
+DEFAULT_PLANNER = os.environ.get('MEAL_PLANNER', 'greedy')
+# "global" forecasts intake with one model trained offline on every user's
+# logs (see global_forecaster); "per_user" fits an LSTM per user on request
+FORECASTERS = ('global', 'per_user')
+DEFAULT_FORECASTER = os.environ.get('DIET_FORECASTER', 'global')
+MEAL_SHARES = (('breakfast', 0.3), ('lunch', 0.4), ('dinner', 0.3))
+
 # BMI calculation function
 def calculate_bmi(weight_kg, height_cm):
     height_m = height_cm / 100
@@ -41,7 +56,8 @@ def calculate_macros(calories):
 
 # Prepare user sequence for LSTM input
 def get_user_sequence(logs):
-    logs_sorted = logs.sort_values(by='date')
+    # Logs are stored as float32 (see model.schema); sum the days in float64
+    logs_sorted = logs.sort_values(by='date').astype({c: np.float64 for c in ['calories', 'protein_g', 'carbs_g', 'fat_g']})
     grouped = logs_sorted.groupby('date').agg({
         'calories': 'sum', 'protein_g': 'sum', 'carbs_g': 'sum', 'fat_g': 'sum'
     }).reset_index()
@@ -50,6 +66,8 @@ def get_user_sequence(logs):
 
 # Build LSTM model
 def build_lstm_model(input_shape):
+    from keras.models import Sequential
+    from keras.layers import LSTM, Dense
     model = Sequential()
     model.add(LSTM(64, input_shape=input_shape))
     model.add(Dense(4))
@@ -67,74 +85,117 @@ def score_food(food, remaining):
 
 # Select meals based on target macros and avoid previously selected items
 def select_meal(food_df, target_macros, used_items=None):
-    if used_items is None:
-        used_items = []
-
-    selected_items = []
-    total = {'calories': 0.0, 'protein': 0.0, 'carbs': 0.0, 'fat': 0.0}
-    food_df = food_df.copy()
-
-    # Exclude used items
-    food_df = food_df[~food_df['name'].isin(used_items)]
-
-    while True:
-        remaining = {
-            'calories': target_macros['calories'] - total['calories'],
-            'protein': target_macros['protein'] - total['protein'],
-            'carbs': target_macros['carbs'] - total['carbs'],
-            'fat': target_macros['fat'] - total['fat']
-        }
-
-        food_df['score'] = food_df.apply(lambda row: score_food(row, remaining), axis=1)
-        food_df_sorted = food_df.sort_values(by='score', ascending=False)
-
-        for _, food in food_df_sorted.iterrows():
-            new_total = {
-                'calories': total['calories'] + food['calories'],
-                'protein': total['protein'] + food['protein_g'],
-                'carbs': total['carbs'] + food['carbs_g'],
-                'fat': total['fat'] + food['fat_g']
-            }
-
-            if all(new_total[key] <= target_macros[key] * 1.05 for key in total):
-                total = new_total
-                selected_items.append(food['name'])
-                break
-        else:
-            break
-
-    return selected_items
+    return select_meal_from_matrix(FoodMatrix.from_frame(food_df), target_macros, used_items)
+
+# Load the food catalog with numeric nutrients and its restriction index;
+# reused until data/food_items.csv changes
+def load_food_catalog():
+    logger.info("Loading food items...")
+    food_catalog = get_food_catalog()
+    logger.info("Food items loaded successfully")
+    return food_catalog
+
+# Version of everything a user's diet recommendation is computed from: their
+# profile and diet-log rows, the food catalog and the global forecaster. Used
+# as a cache key.
+def diet_data_version(username):
+    return _diet_version(find_user_profiles(username), load_user_logs(username))
+
+# diet_data_version for many users, grouping the profiles and logs once
+def diet_data_versions(usernames):
+    profiles = load_all_profiles()
+    logs = load_all_logs('data/diet_logs.csv')
+    profile_rows = dict(tuple(profiles[profiles['username'].isin(usernames)].groupby('username', observed=True, sort=False)))
+    log_rows = dict(tuple(logs[logs['username'].isin(usernames)].groupby('username', observed=True, sort=False)))
+    return {u: _diet_version(profile_rows.get(u, profiles.iloc[0:0]), log_rows.get(u, logs.iloc[0:0]))
+            for u in usernames}
+
+def _diet_version(profile_rows, log_rows):
+    return digest(*(pd.util.hash_pandas_object(r, index=False).to_numpy().tobytes() for r in (profile_rows, log_rows)),
+                  file_version(FOOD_CSV), file_version(GLOBAL_FORECASTER_PATH))
+
+# The global forecaster when it is selected and has been trained, else None
+def active_global_forecaster():
+    if DEFAULT_FORECASTER != 'global':
+        return None
+    return get_global_forecaster()
+
+# Next day's macros forecast from a user's logs, or None when there are too
+# few to forecast from. Uses the per-user LSTM until the global model has
+# been trained.
+def forecast_intake(username, user_log_df):
+    if user_log_df.empty:
+        return None
+    logger.info("Preparing user sequence for LSTM model...")
+    data = daily_macros.sequence(username)
+    global_forecaster = active_global_forecaster()
+    if global_forecaster is not None:
+        return global_forecaster.forecast(data)
+    if len(user_log_df) < 10:
+        return None
+    # Forecast with the user's persisted LSTM, trained or fine-tuned only when logs change
+    return forecaster_registry.forecast(username, data)
+
+# forecast_intake for every user with diet logs in one forward pass of the
+# global model, keyed by username; None when the global model is not in use
+def forecast_intake_batch(usernames):
+    global_forecaster = active_global_forecaster()
+    if global_forecaster is None:
+        return None
+    sequences = {u: daily_macros.sequence(u) for u in usernames}
+    return dict(zip(sequences, global_forecaster.forecast_batch(list(sequences.values()))))
 
 # Main function for recommending meals
-def recommend_meals(username):
+def recommend_meals(username, planner=None):
     logger.info(f"Starting diet recommendation for user: {username}")
 
-    # Load user profile
-    logger.info("Loading user profile...")
-    profile = load_user_profile(username)
-    logger.info(f"User profile for {username}: {profile}")
+    with stage('csv_load'):
+        # Load user profile
+        logger.info("Loading user profile...")
+        profile = load_user_profile(username)
+        logger.info(f"User profile for {username}: {profile}")
 
-    # Load user logs
-    logger.info("Loading user logs...")
-    user_logs = load_all_logs('data/diet_logs.csv')
-    logger.info(f"User logs loaded successfully for {username}")
+        # Load user logs
+        logger.info("Loading user logs...")
+        user_log_df = load_user_logs(username, 'data/diet_logs.csv')
+        logger.info(f"User logs loaded successfully for {username}")
 
-    # Load food items
-    logger.info("Loading food items...")
-    food_df = load_food_items()
-    logger.info("Food items loaded successfully")
-
-    # Validate food columns
-    if not all(col in food_df.columns for col in ['calories', 'protein_g', 'carbs_g', 'fat_g']):
-        logger.error("Missing necessary columns in food data.")
-        raise ValueError("Missing necessary columns in food data.")
-    food_df[['calories', 'protein_g', 'carbs_g', 'fat_g']] = food_df[['calories', 'protein_g', 'carbs_g', 'fat_g']].apply(pd.to_numeric, errors='coerce')
+        food_catalog = load_food_catalog()
 
-    # Filter logs for user
-    logger.info(f"Retrieving user logs for {username}...")
-    user_log_df = user_logs[user_logs['username'] == username]
     logger.info(f"User logs for {username}: {user_log_df.head()}")
 
+    return plan_meals(username, profile, user_log_df, food_catalog, planner)
+
+# Recommend meals for many users, loading profiles, logs and the catalog once.
+# Returns one {'username', 'result'} or {'username', 'error'} entry per input.
+def recommend_meals_batch(usernames, planner=None):
+    logger.info(f"Starting diet recommendations for {len(usernames)} users")
+    with stage('csv_load'):
+        profiles = load_all_profiles().drop_duplicates(subset='username', keep='first').set_index('username', drop=False)
+        user_logs = load_all_logs('data/diet_logs.csv')
+        requested_logs = user_logs[user_logs['username'].isin(usernames)]
+        logs_by_user = dict(tuple(requested_logs.groupby('username', observed=True)))
+        food_catalog = load_food_catalog()
+    empty_logs = user_logs.iloc[0:0]
+    forecasts = forecast_intake_batch(list(logs_by_user))
+
+    results = []
+    for username in usernames:
+        if username not in profiles.index:
+            results.append({'username': username, 'error': f"No profile found for user {username}"})
+            continue
+        try:
+            result = plan_meals(username, profiles.loc[username], logs_by_user.get(username, empty_logs), food_catalog, planner,
+                                forecasts)
+            results.append({'username': username, 'result': result})
+        except Exception as e:
+            logger.error(f"Diet recommendation failed for {username}: {e}")
+            results.append({'username': username, 'error': str(e)})
+    return results
+
+# Compute target macros, forecast intake and plan the day's meals for one user.
+# forecasts holds intake forecasts already computed by forecast_intake_batch.
+def plan_meals(username, profile, user_log_df, food_catalog, planner=None, forecasts=None):
     # Calculate BMI
     logger.info(f"Calculating BMI for {username}...")
     bmi = calculate_bmi(profile['weight_kg'], profile['height_cm'])
@@ -151,44 +212,35 @@ def recommend_meals(username):
     target_macros = dict(zip(['calories', 'protein', 'carbs', 'fat'], calculate_macros(target_calories)))
     logger.info(f"Target macros: {target_macros}")
 
+    if forecasts is not None and username in forecasts:
+        predicted_macros = forecasts[username]
+    else:
+        predicted_macros = forecast_intake(username, user_log_df)
+
     # --- Fallback if logs are empty or insufficient ---
-    if user_log_df.empty or len(user_log_df) < 10:
+    if predicted_macros is None:
         logger.warning(f"Insufficient logs for {username}, using fallback macro estimation.")
 
         predicted_macros_dict = target_macros
         logger.info(f"Predicted macros (fallback): {predicted_macros_dict}")
     else:
-        # Prepare sequence for LSTM
-        logger.info("Preparing user sequence for LSTM model...")
-        data = get_user_sequence(user_log_df)
-        window_size = 7
-        X, y = [], []
-        for i in range(len(data) - window_size):
-            X.append(data[i:i + window_size])
-            y.append(data[i + window_size])
-        X, y = np.array(X), np.array(y)
-
-        if len(X) == 0:
-            logger.warning(f"Not enough data for LSTM after sequence prep. Using fallback.")
-            predicted_macros_dict = target_macros
-        else:
-            scaler = MinMaxScaler()
-            X_scaled = scaler.fit_transform(X.reshape(-1, 4)).reshape(X.shape)
-            y_scaled = scaler.transform(y)
-
-            logger.info("Training LSTM model...")
-            model = build_lstm_model((X.shape[1], X.shape[2]))
-            model.fit(X_scaled, y_scaled, epochs=20, verbose=0)
-            logger.info("LSTM training complete.")
-
-            pred_scaled = model.predict(X_scaled[-1].reshape(1, window_size, 4))
-            predicted_macros = scaler.inverse_transform(pred_scaled)[0]
-            predicted_macros_dict = dict(zip(['calories', 'protein', 'carbs', 'fat'], predicted_macros))
-            logger.info(f"Predicted macros from LSTM: {predicted_macros_dict}")
+        predicted_macros_dict = dict(zip(['calories', 'protein', 'carbs', 'fat'], predicted_macros))
+        logger.info(f"Predicted macros from LSTM: {predicted_macros_dict}")
 
     # Filter food for dietary restrictions
     logger.info(f"Filtering food items for {username}...")
-    food_df = filter_food_by_dietary_restrictions(food_df, profile.get('dietary_restrictions'))
+    food_matrix = food_catalog.matrix_for(profile.get('dietary_restrictions'))
+
+    if (planner or DEFAULT_PLANNER) == 'optimizer':
+        meal_macros = {meal: {k: float(predicted_macros_dict[k] * share) for k in predicted_macros_dict}
+                       for meal, share in MEAL_SHARES}
+        try:
+            with stage('select_meal'):
+                plan = plan_day_optimized(food_matrix, meal_macros)
+            logger.info(f"Optimized meal plan: {plan}")
+            return {meal: {'items': plan[meal], 'macros': meal_macros[meal]} for meal, _ in MEAL_SHARES}
+        except Exception as e:
+            logger.error(f"Meal optimizer failed, falling back to greedy selection: {e}")
 
     # Meal planning
     used_items = []
@@ -196,7 +248,8 @@ def recommend_meals(username):
     logger.info("Selecting breakfast...")
     breakfast_macros = {k: float(predicted_macros_dict[k] * 0.3) for k in predicted_macros_dict}
     try:
-        breakfast = select_meal(food_df, breakfast_macros, used_items)
+        with stage('select_meal'):
+            breakfast = select_meal_from_matrix(food_matrix, breakfast_macros, used_items)
         used_items.extend(breakfast)
         logger.info(f"Breakfast selected: {breakfast}")
     except Exception as e:
@@ -206,7 +259,8 @@ def recommend_meals(username):
     logger.info("Selecting lunch...")
     lunch_macros = {k: float(predicted_macros_dict[k] * 0.4) for k in predicted_macros_dict}
     try:
-        lunch = select_meal(food_df, lunch_macros, used_items)
+        with stage('select_meal'):
+            lunch = select_meal_from_matrix(food_matrix, lunch_macros, used_items)
         used_items.extend(lunch)
         logger.info(f"Lunch selected: {lunch}")
     except Exception as e:
@@ -216,7 +270,8 @@ def recommend_meals(username):
     logger.info("Selecting dinner...")
     dinner_macros = {k: float(predicted_macros_dict[k] * 0.3) for k in predicted_macros_dict}
     try:
-        dinner = select_meal(food_df, dinner_macros, used_items)
+        with stage('select_meal'):
+            dinner = select_meal_from_matrix(food_matrix, dinner_macros, used_items)
         used_items.extend(dinner)
         logger.info(f"Dinner selected: {dinner}")
     except Exception as e:
@@ -0,0 +1,184 @@
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+MAX_ENTRIES = int(os.environ.get('RESPONSE_CACHE_SIZE', 10000))
+TTL_SECONDS = float(os.environ.get('RESPONSE_CACHE_TTL_SECONDS', 3600))
+# Optional directory for a second tier that survives restarts
+DISK_DIR = os.environ.get('RESPONSE_CACHE_DIR') or None
+# Expired disk entries are swept every this many writes
+DISK_SWEEP_EVERY = 1000
+
+
+# Stable version of a data file for cache keys: changes whenever the file is
+# written, and means the same thing after a restart
+def file_version(path):
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return 'missing'
+    return f"{st.st_size}-{st.st_mtime_ns}"
+
+
+def digest(*parts):
+    h = hashlib.sha1()
+    for part in parts:
+        h.update(part if isinstance(part, bytes) else repr(part).encode('utf-8'))
+        h.update(b'\x00')
+    return h.hexdigest()
+
+
+# Caches JSON-serialisable responses under (endpoint, username, data version,
+# model version). Changed data or a new model gives a new key, so stale
+# entries are never served; storing a new version for an (endpoint, username)
+# drops the previous one. Memory entries are bounded by LRU and TTL; the
+# optional disk tier holds one JSON file per entry.
+class ResponseCache:
+    def __init__(self, max_entries=MAX_ENTRIES, ttl=TTL_SECONDS, disk_dir=DISK_DIR):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.disk_dir = disk_dir
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._latest = {}
+        self._counters = {}
+        self._evictions = 0
+        self._writes = 0
+
+    @property
+    def enabled(self):
+        return self.max_entries > 0
+
+    def get(self, endpoint, username, data_version, model_version):
+        key = (endpoint, username, data_version, model_version)
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    self._entries.move_to_end(key)
+                    self._count(endpoint, 'memory_hits')
+                    return entry[1]
+                del self._entries[key]
+                self._count(endpoint, 'expired')
+        value = self._disk_get(key, now)
+        with self._lock:
+            if value is None:
+                self._count(endpoint, 'misses')
+                return None
+            self._count(endpoint, 'disk_hits')
+            self._remember(key, now + self.ttl, value)
+        return value
+
+    def put(self, endpoint, username, data_version, model_version, value):
+        key = (endpoint, username, data_version, model_version)
+        expires = time.time() + self.ttl
+        with self._lock:
+            self._remember(key, expires, value)
+            self._writes += 1
+            sweep = self.disk_dir is not None and self._writes % DISK_SWEEP_EVERY == 0
+        self._disk_put(key, expires, value)
+        if sweep:
+            self.sweep_disk()
+
+    def _remember(self, key, expires, value):
+        previous = self._latest.get(key[:2])
+        if previous is not None and previous != key:
+            self._entries.pop(previous, None)
+        self._latest[key[:2]] = key
+        self._entries[key] = (expires, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            old, _ = self._entries.popitem(last=False)
+            if self._latest.get(old[:2]) == old:
+                del self._latest[old[:2]]
+            self._evictions += 1
+
+    def _count(self, endpoint, name):
+        counters = self._counters.setdefault(endpoint, {'memory_hits': 0, 'disk_hits': 0, 'misses': 0, 'expired': 0})
+        counters[name] += 1
+
+    def _disk_path(self, key):
+        name = digest(*key)
+        return os.path.join(self.disk_dir, name[:2], name + '.json')
+
+    def _disk_get(self, key, now):
+        if self.disk_dir is None:
+            return None
+        path = self._disk_path(key)
+        try:
+            with open(path) as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if entry.get('key') != list(key) or entry.get('expires_at', 0) <= now:
+            return None
+        return entry['value']
+
+    def _disk_put(self, key, expires, value):
+        if self.disk_dir is None:
+            return
+        path = self._disk_path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+            with os.fdopen(fd, 'w') as f:
+                json.dump({'key': list(key), 'expires_at': expires, 'value': value}, f)
+            os.replace(tmp, path)
+        except (OSError, TypeError, ValueError) as e:
+            logger.warning(f"Could not write response cache entry to disk: {e}")
+
+    def sweep_disk(self):
+        if self.disk_dir is None or not os.path.isdir(self.disk_dir):
+            return 0
+        now, removed = time.time(), 0
+        for root, _, files in os.walk(self.disk_dir):
+            for name in files:
+                path = os.path.join(root, name)
+                try:
+                    with open(path) as f:
+                        expired = json.load(f).get('expires_at', 0) <= now
+                except (OSError, ValueError):
+                    expired = True
+                if expired:
+                    try:
+                        os.remove(path)
+                        removed += 1
+                    except OSError:
+                        pass
+        return removed
+
+    def stats(self):
+        with self._lock:
+            endpoints = {}
+            for endpoint, counters in self._counters.items():
+                hits = counters['memory_hits'] + counters['disk_hits']
+                lookups = hits + counters['misses']
+                endpoints[endpoint] = dict(counters, hit_ratio=round(hits / lookups, 4) if lookups else None)
+            return {'entries': len(self._entries), 'max_entries': self.max_entries, 'ttl_seconds': self.ttl,
+                    'evictions': self._evictions, 'disk_dir': self.disk_dir, 'endpoints': endpoints}
+
+    def render_prometheus(self, prefix='ml'):
+        stats = self.stats()
+        name = f'{prefix}_response_cache_lookups_total'
+        lines = [f'# HELP {name} Response cache lookups by result.', f'# TYPE {name} counter']
+        for endpoint, counters in sorted(stats['endpoints'].items()):
+            for result in ('memory_hits', 'disk_hits', 'misses', 'expired'):
+                lines.append(f'{name}{{endpoint="{endpoint}",result="{result}"}} {counters[result]}')
+        lines += [f'# HELP {prefix}_response_cache_entries Entries held in memory.',
+                  f'# TYPE {prefix}_response_cache_entries gauge',
+                  f'{prefix}_response_cache_entries {stats["entries"]}',
+                  f'# HELP {prefix}_response_cache_evictions_total Entries dropped by the LRU bound.',
+                  f'# TYPE {prefix}_response_cache_evictions_total counter',
+                  f'{prefix}_response_cache_evictions_total {stats["evictions"]}']
+        return '\n'.join(lines) + '\n'
+
+
+default_response_cache = ResponseCache()
@@ -0,0 +1,160 @@
+import argparse
+import fcntl
+import io
+import logging
+import os
+import shutil
+import tempfile
+import time
+import joblib
+import numpy as np
+import pandas as pd
+from model.datastore import settled_size
+from model.model_store import (BASE_MODEL_DIR, VERSIONS_DIR, KEEP_VERSIONS, artifact_paths, current_model_dir,
+                               current_version, list_versions, publish_version, read_meta, set_current)
+from model.numpy_backend import export_numpy_artifact
+from model.schema import EXERCISE_SCHEMA, FEEDBACK_SCHEMA
+from model.workout import (build_exercise_vocab, build_training_matrix, load_model_and_scalers, load_training_state,
+                           merge_exercise_details, mse_registered, prepare_training_frame, save_training_state)
+
+logger = logging.getLogger(__name__)
+
+FEEDBACK_CSV = 'data/feedback_logs.csv'
+EXERCISE_CSV = 'data/exercise_items.csv'
+RETRAIN_EPOCHS = 10
+RETRAIN_MIN_ROWS = int(os.environ.get('RETRAIN_MIN_ROWS', 50))
+# A candidate may be at most this much worse than its parent on the holdout
+RETRAIN_TOLERANCE = float(os.environ.get('RETRAIN_TOLERANCE', 0.05))
+HOLDOUT_FRACTION = 0.2
+# Lower than Adam's default so a warm start refines rather than relearns
+FINE_TUNE_LEARNING_RATE = 1e-4
+
+
+# Feedback rows appended after byte `offset`, and the offset they end at.
+# Reading stops at the last newline, so a row appendCSV is still writing is
+# left for the next pass. A file that shrank was rewritten, so it is read
+# again from the start.
+def read_feedback_since(csv_path, offset):
+    size = settled_size(csv_path)
+    with open(csv_path, 'rb') as f:
+        header = f.readline()
+        if offset > os.path.getsize(csv_path):
+            logger.warning(f"{csv_path} is smaller than the trained offset; reading it from the start")
+            offset = 0
+        start = max(offset, len(header))
+        f.seek(start)
+        data = f.read(max(size - start, 0))
+    return FEEDBACK_SCHEMA.read_csv(io.BytesIO(header + data)), max(size, start)
+
+
+def holdout_mse(model, X, y):
+    return float(np.mean((model.predict(X, verbose=0) - y) ** 2))
+
+
+# One retraining pass: warm-start the served model on feedback added since it
+# was trained, and publish it as a new version if it does not do worse than
+# its parent on a holdout of the new rows. The scalers are kept from the
+# parent so the feature space (and the NumPy export) stays compatible.
+# Rejected or skipped passes do not advance the feedback offset, so the rows
+# are considered again, with whatever arrives meanwhile, on the next pass.
+def retrain_once(feedback_csv=FEEDBACK_CSV, exercise_csv=EXERCISE_CSV, root=VERSIONS_DIR, base_dir=BASE_MODEL_DIR,
+                 epochs=RETRAIN_EPOCHS, batch_size=64, min_rows=RETRAIN_MIN_ROWS, tolerance=RETRAIN_TOLERANCE,
+                 keep=KEEP_VERSIONS):
+    from sklearn.model_selection import train_test_split
+    from tensorflow.keras.callbacks import EarlyStopping
+    from tensorflow.keras.optimizers import Adam
+
+    parent_dir = current_model_dir(root, base_dir)
+    parent_version = current_version(root)
+    state = load_training_state(parent_dir)
+    new_df, end_offset = read_feedback_since(feedback_csv, state['feedback_offset'])
+    if len(new_df) < min_rows:
+        logger.info(f"{len(new_df)} new feedback rows since the last training run; need {min_rows}")
+        return {'status': 'skipped', 'rows': len(new_df)}
+
+    paths = artifact_paths(parent_dir)
+    model, scaler_X, scaler_y = load_model_and_scalers(paths['model'], paths['scaler_X'], paths['scaler_y'])
+    exercise_df = EXERCISE_SCHEMA.read_csv(exercise_csv)
+    if state['label_classes'] is None:
+        logger.warning(f"No training state in {parent_dir}; fitting label encodings on the new rows")
+    df, label_classes = prepare_training_frame(merge_exercise_details(new_df, exercise_df),
+                                               state['label_classes'], state['last_volume'])
+    if len(df) < min_rows:
+        logger.info(f"Only {len(df)} usable rows after cleaning; need {min_rows}")
+        return {'status': 'skipped', 'rows': len(df)}
+
+    # Keep encoding exercises the way the parent model was trained
+    vocab = state['exercise_vocab'] or getattr(scaler_X, 'exercise_vocab', None)
+    if vocab is None:
+        logger.warning(f"No exercise vocabulary saved in {parent_dir}; using the current catalog's")
+        vocab = build_exercise_vocab(exercise_df)
+    scaler_X.exercise_vocab = vocab
+    X, y = build_training_matrix(df, exercise_df, scaler_X.n_features_in_, vocab)
+    X_train, X_hold, y_train, y_hold = train_test_split(scaler_X.transform(X), scaler_y.transform(y),
+                                                        test_size=HOLDOUT_FRACTION, random_state=42)
+    parent_loss = holdout_mse(model, X_hold, y_hold)
+    started = time.time()
+    # A fresh optimizer: the one restored from .h5 is bound to the saved variables
+    model.compile(optimizer=Adam(learning_rate=FINE_TUNE_LEARNING_RATE), loss=mse_registered)
+    model.fit(X_train, y_train, validation_split=0.1, epochs=epochs, batch_size=batch_size, verbose=0,
+              callbacks=[EarlyStopping(monitor='val_loss', patience=2, restore_best_weights=True)])
+    candidate_loss = holdout_mse(model, X_hold, y_hold)
+    result = {'rows': len(df), 'parent_version': parent_version, 'parent_loss': parent_loss,
+              'candidate_loss': candidate_loss, 'train_seconds': round(time.time() - started, 3)}
+    logger.info(f"Holdout MSE parent {parent_loss:.5f}, candidate {candidate_loss:.5f} on {len(X_hold)} rows")
+
+    if candidate_loss > parent_loss * (1 + tolerance):
+        logger.warning("Candidate model rejected: holdout loss regressed")
+        return dict(result, status='rejected')
+
+    os.makedirs(root, exist_ok=True)
+    staging = tempfile.mkdtemp(dir=root, prefix='.staging-')
+    try:
+        out = artifact_paths(staging)
+        model.save(out['model'])
+        joblib.dump(scaler_X, out['scaler_X'])
+        joblib.dump(scaler_y, out['scaler_y'])
+        export_numpy_artifact(model, scaler_X, scaler_y, out['npz'])
+        save_training_state(staging, label_classes, end_offset, df, state['last_volume'], vocab)
+        version = publish_version(staging, dict(result, feedback_offset=end_offset), root, keep)
+    except Exception:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+    return dict(result, status='published', version=version)
+
+
+# Serialize retraining passes across processes
+def run_locked(root=VERSIONS_DIR, **kwargs):
+    os.makedirs(root, exist_ok=True)
+    with open(os.path.join(root, '.retrain.lock'), 'w') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        return retrain_once(root=root, **kwargs)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Incrementally retrain and publish workout model versions')
+    sub = parser.add_subparsers(dest='command', required=True)
+    run = sub.add_parser('run', help='retrain on new feedback and publish the result if it passes the holdout check')
+    run.add_argument('--loop', type=float, default=0, help='repeat every LOOP seconds')
+    run.add_argument('--epochs', type=int, default=RETRAIN_EPOCHS)
+    run.add_argument('--min-rows', type=int, default=RETRAIN_MIN_ROWS)
+    rollback = sub.add_parser('rollback', help='make an earlier version current')
+    rollback.add_argument('version')
+    sub.add_parser('list', help='list kept versions')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    if args.command == 'run':
+        while True:
+            print(run_locked(epochs=args.epochs, min_rows=args.min_rows))
+            if args.loop <= 0:
+                break
+            time.sleep(args.loop)
+    elif args.command == 'rollback':
+        set_current(args.version)
+    else:
+        current = current_version()
+        for version in list_versions():
+            meta = read_meta(os.path.join(VERSIONS_DIR, version))
+            print(f"{'*' if version == current else ' '} {version} rows={meta.get('rows')} "
+                  f"candidate_loss={meta.get('candidate_loss')} parent={meta.get('parent_version')}")
@@ -0,0 +1,86 @@
+import io
+import numpy as np
+import pandas as pd
+
+
+# Compact dtypes for one CSV file. Repeated strings are read as categoricals,
+# measurements are coerced to float32, counts to `int_dtype` when a column
+# has no missing or fractional values (float32 otherwise) and dates to
+# datetime64 (unparseable values become NaT). Columns not listed keep
+# pandas' defaults.
+class Schema:
+    def __init__(self, floats=(), ints=(), categories=(), dates=(), int_dtype=np.int16):
+        self.floats = tuple(floats)
+        self.ints = tuple(ints)
+        self.categories = tuple(categories)
+        self.dates = tuple(dates)
+        self.int_dtype = int_dtype
+
+    # Keyword arguments for pd.read_csv. Numbers are coerced after parsing so
+    # a stray non-numeric value becomes NaN instead of failing the read.
+    def read_kwargs(self):
+        return {'dtype': {column: 'category' for column in self.categories}}
+
+    def read_csv(self, source, **read_kwargs):
+        return self.apply(pd.read_csv(source, **self.read_kwargs(), **read_kwargs))
+
+    def iter_csv(self, source, chunksize, **read_kwargs):
+        for chunk in pd.read_csv(source, chunksize=chunksize, **self.read_kwargs(), **read_kwargs):
+            yield self.apply(chunk)
+
+    # Parse CSV bytes that carry no header row (see datastore.parse_rows)
+    def parse_rows(self, data, columns):
+        if not data.strip():
+            return self.apply(pd.DataFrame(columns=columns))
+        return self.read_csv(io.BytesIO(data), header=None, names=columns)
+
+    def apply(self, frame):
+        for column in self.categories:
+            if column in frame and not isinstance(frame[column].dtype, pd.CategoricalDtype):
+                frame[column] = frame[column].astype('category')
+        for column in self.floats:
+            if column in frame:
+                frame[column] = pd.to_numeric(frame[column], errors='coerce').astype(np.float32)
+        for column in self.ints:
+            if column in frame:
+                frame[column] = self._compact_int(pd.to_numeric(frame[column], errors='coerce'))
+        for column in self.dates:
+            if column in frame:
+                frame[column] = pd.to_datetime(frame[column], format='ISO8601', errors='coerce')
+        return frame
+
+    def _compact_int(self, values):
+        info = np.iinfo(self.int_dtype)
+        if values.notna().all() and (values % 1 == 0).all() and values.between(info.min, info.max).all():
+            return values.astype(self.int_dtype)
+        return values.astype(np.float32)
+
+
+# Written by feedbackController in the Node API
+FEEDBACK_SCHEMA = Schema(
+    floats=('actual_weight', 'bicep_cm', 'chest_cm', 'shoulder_cm', 'lat_cm', 'waist_cm', 'abs_cm', 'thigh_cm',
+            'calf_cm', 'blood_sugar_mg_dl', 'cholesterol_mg_dl', 'height_cm', 'weight_kg'),
+    ints=('actual_reps', 'number_of_sets', 'pain_level'),
+    categories=('username', 'exercise_name', 'category', 'intensity', 'fitness_level', 'gender'),
+    dates=('date',),
+)
+
+
+# fooditem holds free-form "|"-joined lists, so it stays a string column
+DIET_LOG_SCHEMA = Schema(
+    floats=('weight_kg', 'calories', 'protein_g', 'carbs_g', 'fat_g'),
+    categories=('username', 'meal_type'),
+    dates=('date',),
+)
+# One row per user: usernames are unique and the measurements feed the BMR
+# arithmetic, so only the repeated strings are compacted
+PROFILE_SCHEMA = Schema(categories=('fitness_level', 'gender', 'dietary_restrictions'))
+EXERCISE_SCHEMA = Schema(categories=('ExerciseType', 'TargetMuscle'))
+
+
+# Feedback dates parsed as FEEDBACK_SCHEMA parses them, as int64
+# microseconds, for ordering a user's rows the same way in every backend;
+# unparseable dates (NaT) sort before every real one
+def feedback_times(dates):
+    parsed = FEEDBACK_SCHEMA.apply(pd.DataFrame({'date': dates}))['date']
+    return parsed.to_numpy().astype('datetime64[us]').view(np.int64)
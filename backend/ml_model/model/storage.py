@@ -0,0 +1,287 @@
+import argparse
+import logging
+import os
+import re
+import sqlite3
+import tempfile
+import threading
+from datetime import date
+import numpy as np
+import pandas as pd
+from model.datastore import concat_rows
+from model.schema import DIET_LOG_SCHEMA, FEEDBACK_SCHEMA, PROFILE_SCHEMA, feedback_times
+
+logger = logging.getLogger(__name__)
+
+# "csv" reads the CSV files the Node API appends to and rewrites; "sqlite"
+# reads the WAL-mode database at STORAGE_DB, which the Node API writes to
+# when started with the same setting
+STORAGE_BACKEND = os.environ.get('STORAGE_BACKEND', 'csv')
+STORAGE_DB = os.environ.get('STORAGE_DB', 'data/storage.sqlite')
+SCHEMA_SQL = os.path.join(os.path.dirname(__file__), 'storage_schema.sql')
+# Table -> (CSV file it replaces, schema its rows are parsed with)
+TABLES = {
+    'diet_logs': ('data/diet_logs.csv', DIET_LOG_SCHEMA),
+    'feedback_logs': ('data/feedback_logs.csv', FEEDBACK_SCHEMA),
+    'user_profiles': ('data/user_profiles.csv', PROFILE_SCHEMA),
+}
+LOG_TABLES = ('diet_logs', 'feedback_logs')
+BUSY_TIMEOUT = 5.0
+MIGRATE_CHUNK_ROWS = 50000
+ISO_DATE = re.compile(r'\d{4}-\d{2}-\d{2}')
+
+
+def sqlite_enabled():
+    return STORAGE_BACKEND == 'sqlite'
+
+
+def connect(path=STORAGE_DB):
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    conn = sqlite3.connect(path, timeout=BUSY_TIMEOUT)
+    # Readers see the last committed state while a writer appends
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=NORMAL')
+    with open(SCHEMA_SQL) as f:
+        conn.executescript(f.read())
+    return conn
+
+
+class TableSnapshot:
+    def __init__(self, frame, version, rewrites, last_id):
+        self.frame = frame
+        self.version = version
+        self.rewrites = rewrites
+        self.last_id = last_id
+
+    # Like CSVSnapshot.generation: unchanged while rows are only appended
+    @property
+    def generation(self):
+        return self.rewrites
+
+    # Every committed row is final
+    @property
+    def settled_rows(self):
+        return len(self.frame)
+
+
+# Reads the storage database into frames shaped like the CSV loaders'
+# (same columns, schema dtypes, rows in insertion order). Whole tables are
+# cached and refreshed like CachedCSV: unchanged tables cost one indexed
+# lookup of table_versions, appended rows are fetched on their own, and any
+# update or delete reloads the table. Connections are per thread and per
+# process.
+class SqliteStore:
+    def __init__(self, path=STORAGE_DB):
+        self.path = path
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._columns = {}
+        self._snapshots = {}
+
+    # Readers never write, not even the schema, so they never wait on the
+    # write lock; the database is created by `migrate` or the Node API
+    def connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            if not os.path.exists(self.path):
+                raise FileNotFoundError(f"No storage database at {self.path}; run `python -m model.storage migrate`")
+            conn = self._local.conn = sqlite3.connect(self.path, timeout=BUSY_TIMEOUT)
+            self._local.pid = os.getpid()
+        return conn
+
+    def columns(self, table):
+        columns = self._columns.get(table)
+        if columns is None:
+            info = self.connection().execute(f'PRAGMA table_info({table})').fetchall()
+            columns = self._columns[table] = [row[1] for row in info if row[1] != 'id']
+        return columns
+
+    # Rows matching `where` in insertion order, and the largest rowid read
+    def _read_rows(self, table, where='', params=()):
+        columns = self.columns(table)
+        rows = self.connection().execute(f"SELECT rowid, {', '.join(columns)} FROM {table} {where} ORDER BY rowid",
+                                         params).fetchall()
+        last_id = rows[-1][0] if rows else None
+        frame = pd.DataFrame([row[1:] for row in rows], columns=columns)
+        return TABLES[table][1].apply(frame), last_id
+
+    def read_table(self, table):
+        return self.snapshot(table).frame
+
+    def snapshot(self, table):
+        version, rewrites = self.connection().execute(
+            'SELECT version, rewrites FROM table_versions WHERE name = ?', (table,)).fetchone()
+        with self._lock:
+            cached = self._snapshots.get(table)
+        if cached is not None and cached.version == version:
+            return cached
+        # The version is read before the rows, so a write landing in between
+        # makes the next read refresh again rather than miss it
+        if cached is not None and cached.rewrites == rewrites:
+            tail, last_id = self._read_rows(table, 'WHERE rowid > ?', (cached.last_id or 0,))
+            frame = concat_rows([cached.frame, tail]) if len(tail) else cached.frame
+            last_id = last_id or cached.last_id
+        else:
+            frame, last_id = self._read_rows(table)
+        snapshot = TableSnapshot(frame, version, rewrites, last_id)
+        with self._lock:
+            self._snapshots[table] = snapshot
+        return snapshot
+
+    # One user's rows through the (username, date) index
+    def user_rows(self, table, username):
+        return self._read_rows(table, 'WHERE username = ?', (username,))[0]
+
+    # A user's latest and previous feedback rows as dicts, the way
+    # FeedbackIndex.lookup returns them: ordered by dates parsed with
+    # FEEDBACK_SCHEMA rather than as text (which puts "2025-1-9" after
+    # "2025-01-10"), a later row winning a date tie. The user's ids and dates
+    # come from the (username, date) index.
+    def latest_feedback(self, username):
+        columns = self.columns('feedback_logs')
+        conn = self.connection()
+        dated = conn.execute('SELECT id, date FROM feedback_logs WHERE username = ?', (username,)).fetchall()
+        if not dated:
+            return None, None
+        newest = _newest_ids(dated)
+        found = {row[0]: row[1:] for row in conn.execute(
+            f"SELECT id, {', '.join(columns)} FROM feedback_logs WHERE id IN ({', '.join('?' * len(newest))})",
+            newest)}
+        rows = [found[i] for i in newest]
+        ints = set(FEEDBACK_SCHEMA.ints)
+        # REAL columns return whole counts as floats; the CSV index keeps ints
+        records = [{c: np.nan if v is None else int(v) if c in ints and float(v).is_integer() else v
+                    for c, v in zip(columns, row)} for row in rows]
+        records += [None] * (2 - len(records))
+        return records[0], records[1]
+
+    def usernames(self, table):
+        return [row[0] for row in self.connection().execute(f'SELECT DISTINCT username FROM {table}')]
+
+
+# Ids of the latest and previous of a user's (id, date) feedback rows. Plain
+# YYYY-MM-DD dates, what the API writes, are compared as dates directly;
+# anything else goes through feedback_times.
+def _newest_ids(dated):
+    try:
+        keys = [(date.fromisoformat(d) if ISO_DATE.fullmatch(d) else None, i) for i, d in dated]
+    except (TypeError, ValueError):
+        keys = None
+    if keys is not None and all(day is not None for day, _ in keys):
+        return [i for _, i in sorted(keys, reverse=True)[:2]]
+    ids = np.array([i for i, _ in dated], dtype=np.int64)
+    times = feedback_times([d for _, d in dated])
+    return [int(ids[i]) for i in np.lexsort((ids, times))[::-1][:2]]
+
+
+# FeedbackIndex's lookup interface over feedback_logs
+class SqliteFeedbackIndex:
+    def __init__(self, store):
+        self.store = store
+
+    def lookup(self, username):
+        return self.store.latest_feedback(username)
+
+    def usernames(self):
+        return self.store.usernames('feedback_logs')
+
+
+default_store = SqliteStore()
+
+
+# CSV values as SQL parameters: missing values become NULL
+def _sql_rows(frame):
+    return frame.astype(object).where(frame.notna(), None).itertuples(index=False, name=None)
+
+
+# One-shot import of the CSV files into an empty database. Profiles keep
+# the first row per username, as load_user_profile does. The log tables'
+# export marks are set to the imported rows, which the CSVs already hold.
+def migrate(db_path=STORAGE_DB, sources=None, force=False, chunk_rows=MIGRATE_CHUNK_ROWS):
+    sources = {table: path for table, (path, _) in TABLES.items()} | (sources or {})
+    conn = connect(db_path)
+    counts = {}
+    for table, csv_path in sources.items():
+        if not os.path.exists(csv_path):
+            logger.warning(f"{csv_path} not found; {table} left empty")
+            continue
+        existing = conn.execute(f'SELECT COUNT(*) FROM {table}').fetchone()[0]
+        if existing and not force:
+            raise SystemExit(f"{table} already holds {existing} rows; pass --force to replace them")
+        columns = SqliteStore(db_path).columns(table)
+        verb = 'INSERT OR IGNORE' if table == 'user_profiles' else 'INSERT'
+        counts[table] = 0
+        with conn:
+            conn.execute(f'DELETE FROM {table}')
+            for chunk in pd.read_csv(csv_path, chunksize=chunk_rows, dtype=str, keep_default_na=False):
+                chunk = chunk.reindex(columns=columns).replace('', np.nan)
+                conn.executemany(f"{verb} INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})",
+                                 _sql_rows(chunk))
+                counts[table] += len(chunk)
+            if table in LOG_TABLES:
+                conn.execute('INSERT OR REPLACE INTO csv_exports VALUES (?, (SELECT COALESCE(MAX(id), 0) FROM {}))'
+                             .format(table), (table,))
+        logger.info(f"Imported {counts[table]} rows from {csv_path} into {table}")
+    conn.close()
+    return counts
+
+
+# Bring the CSV files up to date for the offline jobs that still read them
+# (training, retraining, the global forecaster, the precompute job). Log
+# rows written since the last export are appended, so the byte offsets
+# incremental readers keep stay valid; profiles are rewritten whole.
+def export_csv(db_path=STORAGE_DB, targets=None):
+    targets = {table: path for table, (path, _) in TABLES.items()} | (targets or {})
+    conn = connect(db_path)
+    store = SqliteStore(db_path)
+    counts = {}
+    for table, csv_path in targets.items():
+        columns = store.columns(table)
+        if table not in LOG_TABLES:
+            frame = pd.read_sql_query(f"SELECT {', '.join(columns)} FROM {table} ORDER BY rowid", conn)
+            fd, tmp = tempfile.mkstemp(dir=os.path.dirname(csv_path) or '.', suffix='.csv')
+            with os.fdopen(fd, 'w', newline='') as f:
+                frame.to_csv(f, index=False)
+            os.replace(tmp, csv_path)
+            counts[table] = len(frame)
+            continue
+        row = conn.execute('SELECT last_id FROM csv_exports WHERE name = ?', (table,)).fetchone()
+        last_id = row[0] if row else 0
+        frame = pd.read_sql_query(f"SELECT id, {', '.join(columns)} FROM {table} WHERE id > ? ORDER BY id",
+                                  conn, params=(last_id,))
+        if len(frame):
+            write_header = not os.path.exists(csv_path) or os.path.getsize(csv_path) == 0
+            with open(csv_path, 'ab') as f:
+                # appendCSV leaves the last row without a newline
+                if not write_header and f.tell() and _last_byte(csv_path) != b'\n':
+                    f.write(b'\n')
+                f.write(frame.drop(columns='id').to_csv(index=False, header=write_header).encode('utf-8'))
+            with conn:
+                conn.execute('INSERT OR REPLACE INTO csv_exports VALUES (?, ?)', (table, int(frame['id'].iloc[-1])))
+        counts[table] = len(frame)
+    conn.close()
+    return counts
+
+
+def _last_byte(path):
+    with open(path, 'rb') as f:
+        f.seek(-1, os.SEEK_END)
+        return f.read(1)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Manage the SQLite storage backend')
+    parser.add_argument('command', choices=['migrate', 'export'],
+                        help='migrate: import the CSV files once; export: bring the CSV files up to date')
+    parser.add_argument('--db', default=STORAGE_DB)
+    parser.add_argument('--profiles-csv', default=None,
+                        help='profiles file to use instead of data/user_profiles.csv (e.g. ../profile.csv)')
+    parser.add_argument('--force', action='store_true', help='migrate: replace rows already in the database')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    paths = {'user_profiles': args.profiles_csv} if args.profiles_csv else None
+    if args.command == 'migrate':
+        print(migrate(args.db, paths, args.force))
+    else:
+        print(export_csv(args.db, paths))
@@ -0,0 +1,116 @@
+-- Tables of the optional SQLite storage backend (STORAGE_BACKEND=sqlite).
+-- Loaded by model/storage.py and backend/utils/sqliteStore.js; columns
+-- match the CSV headers so rows move between the two unchanged.
+
+CREATE TABLE IF NOT EXISTS diet_logs (
+    id INTEGER PRIMARY KEY,
+    username TEXT NOT NULL,
+    date TEXT,
+    weight_kg REAL,
+    meal_type TEXT,
+    calories REAL,
+    protein_g REAL,
+    carbs_g REAL,
+    fat_g REAL,
+    fooditem TEXT
+);
+CREATE INDEX IF NOT EXISTS diet_logs_username_date ON diet_logs (username, date);
+
+CREATE TABLE IF NOT EXISTS feedback_logs (
+    id INTEGER PRIMARY KEY,
+    username TEXT NOT NULL,
+    date TEXT,
+    exercise_name TEXT,
+    category TEXT,
+    actual_reps REAL,
+    actual_weight REAL,
+    number_of_sets REAL,
+    pain_level REAL,
+    intensity TEXT,
+    fitness_level TEXT,
+    gender TEXT,
+    bicep_cm REAL,
+    chest_cm REAL,
+    shoulder_cm REAL,
+    lat_cm REAL,
+    waist_cm REAL,
+    abs_cm REAL,
+    thigh_cm REAL,
+    calf_cm REAL,
+    blood_sugar_mg_dl REAL,
+    cholesterol_mg_dl REAL,
+    height_cm REAL,
+    weight_kg REAL
+);
+CREATE INDEX IF NOT EXISTS feedback_logs_username_date ON feedback_logs (username, date);
+-- The Node API matches feedback usernames case-insensitively
+CREATE INDEX IF NOT EXISTS feedback_logs_username_nocase_date ON feedback_logs (username COLLATE NOCASE, date);
+
+CREATE TABLE IF NOT EXISTS user_profiles (
+    username TEXT PRIMARY KEY,
+    name TEXT,
+    age REAL,
+    height_cm REAL,
+    weight_kg REAL,
+    email TEXT,
+    fitness_level TEXT,
+    gender TEXT,
+    bicep_cm REAL,
+    chest_cm REAL,
+    shoulder_cm REAL,
+    lat_cm REAL,
+    waist_cm REAL,
+    abs_cm REAL,
+    thigh_cm REAL,
+    calf_cm REAL,
+    blood_sugar_mg_dl REAL,
+    cholesterol_mg_dl REAL,
+    medical_history TEXT,
+    dietary_restrictions TEXT
+);
+CREATE INDEX IF NOT EXISTS user_profiles_username_nocase ON user_profiles (username COLLATE NOCASE);
+
+-- Bumped by the triggers below on every write, so readers can tell whether
+-- a cached table is current (version) and whether rows were only appended
+-- since (rewrites unchanged)
+CREATE TABLE IF NOT EXISTS table_versions (
+    name TEXT PRIMARY KEY,
+    version INTEGER NOT NULL DEFAULT 0,
+    rewrites INTEGER NOT NULL DEFAULT 0
+);
+INSERT OR IGNORE INTO table_versions (name) VALUES ('diet_logs'), ('feedback_logs'), ('user_profiles');
+
+CREATE TRIGGER IF NOT EXISTS diet_logs_insert AFTER INSERT ON diet_logs BEGIN
+    UPDATE table_versions SET version = version + 1 WHERE name = 'diet_logs';
+END;
+CREATE TRIGGER IF NOT EXISTS diet_logs_update AFTER UPDATE ON diet_logs BEGIN
+    UPDATE table_versions SET version = version + 1, rewrites = rewrites + 1 WHERE name = 'diet_logs';
+END;
+CREATE TRIGGER IF NOT EXISTS diet_logs_delete AFTER DELETE ON diet_logs BEGIN
+    UPDATE table_versions SET version = version + 1, rewrites = rewrites + 1 WHERE name = 'diet_logs';
+END;
+CREATE TRIGGER IF NOT EXISTS feedback_logs_insert AFTER INSERT ON feedback_logs BEGIN
+    UPDATE table_versions SET version = version + 1 WHERE name = 'feedback_logs';
+END;
+CREATE TRIGGER IF NOT EXISTS feedback_logs_update AFTER UPDATE ON feedback_logs BEGIN
+    UPDATE table_versions SET version = version + 1, rewrites = rewrites + 1 WHERE name = 'feedback_logs';
+END;
+CREATE TRIGGER IF NOT EXISTS feedback_logs_delete AFTER DELETE ON feedback_logs BEGIN
+    UPDATE table_versions SET version = version + 1, rewrites = rewrites + 1 WHERE name = 'feedback_logs';
+END;
+CREATE TRIGGER IF NOT EXISTS user_profiles_insert AFTER INSERT ON user_profiles BEGIN
+    UPDATE table_versions SET version = version + 1 WHERE name = 'user_profiles';
+END;
+CREATE TRIGGER IF NOT EXISTS user_profiles_update AFTER UPDATE ON user_profiles BEGIN
+    UPDATE table_versions SET version = version + 1, rewrites = rewrites + 1 WHERE name = 'user_profiles';
+END;
+CREATE TRIGGER IF NOT EXISTS user_profiles_delete AFTER DELETE ON user_profiles BEGIN
+    UPDATE table_versions SET version = version + 1, rewrites = rewrites + 1 WHERE name = 'user_profiles';
+END;
+
+-- Last row of each log table appended to its CSV by `python -m model.storage
+-- export`, for the offline jobs that still train from the CSVs
+CREATE TABLE IF NOT EXISTS csv_exports (
+    name TEXT PRIMARY KEY,
+    last_id INTEGER NOT NULL
+);
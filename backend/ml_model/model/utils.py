@@ -1,32 +1,66 @@
 import pandas as pd
 import os
 import logging
+from model.datastore import default_cache, read_csv_cached
+from model.schema import DIET_LOG_SCHEMA, PROFILE_SCHEMA
+from model.storage import default_store, sqlite_enabled
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Loaders return frames shared through the CSV cache (or the SQLite store's
+# table cache with STORAGE_BACKEND=sqlite); callers must not mutate them
+def find_user_profiles(username, path='data/user_profiles.csv'):
+    if sqlite_enabled():
+        return default_store.user_rows('user_profiles', username)
+    profiles = read_csv_cached(path, PROFILE_SCHEMA)
+    return profiles[profiles['username'] == username]
+
+
 def load_user_profile(username, path='data/user_profiles.csv'):
-    profiles = pd.read_csv(path)
-    return profiles[profiles['username'] == username].iloc[0]
+    return find_user_profiles(username, path).iloc[0]
+
+
+def load_all_profiles(path='data/user_profiles.csv'):
+    if sqlite_enabled():
+        return default_store.read_table('user_profiles')
+    return read_csv_cached(path, PROFILE_SCHEMA)
 
 
 def load_user_logs(username, path='data/diet_logs.csv'):
-    logs = pd.read_csv(path)
+    if sqlite_enabled():
+        return default_store.user_rows('diet_logs', username)
+    logs = read_csv_cached(path, DIET_LOG_SCHEMA)
     return logs[logs['username'] == username]
 
 
 def load_all_logs(path='data/diet_logs.csv'):
-    return pd.read_csv(path)
+    if sqlite_enabled():
+        return default_store.read_table('diet_logs')
+    return read_csv_cached(path, DIET_LOG_SCHEMA)
+
+
+# The diet logs with their generation, which changes only when existing rows
+# were rewritten (appended rows keep it), for incremental consumers
+def diet_logs_snapshot(path='data/diet_logs.csv'):
+    if sqlite_enabled():
+        return default_store.snapshot('diet_logs')
+    return default_cache.snapshot(path, DIET_LOG_SCHEMA)
 
 
 def load_food_items(path='data/food_items.csv'):
-    return pd.read_csv(path)
+    return read_csv_cached(path).copy()
+
+
+# Catalog column a single dietary restriction name refers to
+def restriction_column(restriction):
+    return restriction.strip().capitalize().replace('-', '')
 
 
 def filter_food_by_dietary_restrictions(food_df, restrictions):
     restrictions = restrictions.lower().split('|')
     for restriction in restrictions:
-        col = restriction.strip().capitalize().replace('-', '')
+        col = restriction_column(restriction)
         if col in food_df.columns:
             food_df = food_df[food_df[col] == True]
     return food_df
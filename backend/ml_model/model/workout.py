@@ -1,16 +1,17 @@
+import io
+import math
+import tempfile
 import pandas as pd
 import numpy as np
-import tensorflow as tf
-from tensorflow.keras.models import Sequential
-from tensorflow.keras.layers import Dense, Dropout
-from tensorflow.keras.callbacks import EarlyStopping
-from tensorflow.keras.losses import mse
-from tensorflow.keras.utils import register_keras_serializable
-from sklearn.model_selection import train_test_split
-from sklearn.preprocessing import StandardScaler, LabelEncoder
 import logging
 import joblib
 import os
+from model.datastore import read_csv_cached, settled_size
+from model.feedback_index import get_feedback_index
+from model.metrics import stage
+from model.response_cache import digest, file_version
+from model.schema import EXERCISE_SCHEMA, FEEDBACK_SCHEMA
+from model.numpy_backend import export_numpy_artifact
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger('model.workout')
@@ -18,29 +19,62 @@ logger = logging.getLogger('model.workout')
 INTENSITY_MAP = {'low': 3, 'moderate': 6, 'medium': 6, 'high': 9}
 FITNESS_EXERCISE_LIMIT = {'beginner': 4, 'intermediate': 6, 'advanced': 8}
 
-@register_keras_serializable()
+BASE_FEATURES = ['pain_level', 'intensity', 'gender', 'fitness_level', 'bicep_cm', 'chest_cm', 'shoulder_cm', 'lat_cm',
+                 'waist_cm', 'abs_cm', 'thigh_cm', 'calf_cm', 'blood_sugar_mg_dl', 'cholesterol_mg_dl', 'height_cm',
+                 'weight_kg', 'bmi', 'waist_to_height', 'volume', 'est_1rm', 'overload', 'bodypart_volume']
+TARGETS = ['actual_reps', 'actual_weight']
+# Feedback rows per chunk in chunked training; 0 trains in memory
+TRAIN_CHUNK_ROWS = int(os.environ.get('TRAIN_CHUNK_ROWS', 0))
+VALIDATION_FRACTION = 0.2
+
+# TensorFlow/Keras and sklearn are imported on first use so that serving with
+# the NumPy backend never loads them.
 def mse_registered(y_true, y_pred):
+    from tensorflow.keras.losses import mse
     return mse(y_true, y_pred)
 
+_keras_loss_registered = False
+
+def keras_custom_objects():
+    global _keras_loss_registered
+    if not _keras_loss_registered:
+        from tensorflow.keras.utils import register_keras_serializable
+        register_keras_serializable()(mse_registered)
+        _keras_loss_registered = True
+    return {'mse_registered': mse_registered}
+
+# Attach ExerciseName/ExerciseType/TargetMuscle for a feedback row. Exercises
+# listed under several types are matched on the row's category when possible.
+def with_exercise_details(feedback_row, exercise_df):
+    details = exercise_df[exercise_df['ExerciseName'] == feedback_row['exercise_name']]
+    if len(details) > 1:
+        same_type = details[details['ExerciseType'] == feedback_row.get('category')]
+        if len(same_type):
+            details = same_type
+    row = pd.Series(feedback_row)
+    for column in ['ExerciseName', 'ExerciseType', 'TargetMuscle']:
+        row[column] = details[column].iloc[0] if len(details) else np.nan
+    return row
+
 def load_user_feedback(username, feedback_csv='data/feedback_logs.csv', exercise_csv='data/exercise_items.csv'):
     logger.info(f"Loading feedback logs for user: {username} from {feedback_csv}")
-    feedback_df = pd.read_csv(feedback_csv)
-    exercise_df = pd.read_csv(exercise_csv)
-
-    merged_df = feedback_df.merge(
-        exercise_df[['ExerciseName', 'ExerciseType', 'TargetMuscle']],
-        left_on='exercise_name', right_on='ExerciseName', how='left'
-    )
-
-    user_df = merged_df[merged_df['username'] == username].sort_values(by='date', ascending=False)
-    if user_df.empty:
+    latest, prev = get_feedback_index(feedback_csv).lookup(username)
+    if latest is None:
         logger.error(f"No feedback logs found for user {username}")
         raise ValueError(f"No feedback logs found for user {username}")
-    latest = user_df.iloc[0]
-    prev = user_df.iloc[1] if len(user_df) > 1 else None
+    exercise_df = read_csv_cached(exercise_csv, EXERCISE_SCHEMA)
+    latest = with_exercise_details(latest, exercise_df)
+    prev = with_exercise_details(prev, exercise_df) if prev is not None else None
     logger.info(f"Latest feedback date: {latest['date']}, Previous feedback date: {prev['date'] if prev is not None else 'None'}")
     return latest, prev
 
+# Version of the inputs of a user's workout recommendation (their two latest
+# feedback rows and the exercise catalog). Used as a cache key.
+def workout_data_version(username, feedback_csv='data/feedback_logs.csv', exercise_csv='data/exercise_items.csv'):
+    latest, prev = get_feedback_index(feedback_csv).lookup(username)
+    return digest(sorted(latest.items()) if latest else None, sorted(prev.items()) if prev else None,
+                  file_version(exercise_csv))
+
 def compute_progressive_overload(current, previous):
     if previous is None:
         logger.info("No previous feedback available; progressive overload set to 0.0")
@@ -94,8 +128,114 @@ def preprocess_features(current, previous):
         logger.error(f"Error in preprocessing: {e}")
         raise ValueError(f"Error in preprocessing: {e}")
 
+def _numeric_column(frame, column):
+    if column not in frame:
+        return np.full(len(frame), np.nan)
+    return pd.to_numeric(frame[column], errors='coerce').to_numpy(dtype=float)
+
+# Vectorized preprocess_features for many users: row i of current/previous
+# holds a user's latest and prior feedback (previous rows may be all-NaN).
+# Returns the (n, 22) feature matrix and a mask of rows that preprocessed cleanly.
+def preprocess_features_batch(current, previous):
+    gender_raw = current['gender']
+    fitness_raw = current['fitness_level']
+    text_ok = gender_raw.map(lambda v: isinstance(v, str)).to_numpy() & fitness_raw.map(lambda v: isinstance(v, str)).to_numpy()
+
+    intensity = current['intensity'].astype(str).str.lower().map(INTENSITY_MAP).fillna(6.0).to_numpy(dtype=float)
+    gender = (gender_raw.astype(str).str.lower() == 'male').to_numpy(dtype=float)
+    fitness_level = fitness_raw.astype(str).str.lower().map({'beginner': 0, 'intermediate': 1, 'advanced': 2}).fillna(1).to_numpy(dtype=float)
+
+    height, weight, waist = _numeric_column(current, 'height_cm'), _numeric_column(current, 'weight_kg'), _numeric_column(current, 'waist_cm')
+    reps, load, sets = _numeric_column(current, 'actual_reps'), _numeric_column(current, 'actual_weight'), _numeric_column(current, 'number_of_sets')
+    volume = reps * load * sets
+    prev_volume = _numeric_column(previous, 'actual_reps') * _numeric_column(previous, 'actual_weight') * _numeric_column(previous, 'number_of_sets')
+    has_prev = ~np.isnan(prev_volume) & (prev_volume != 0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        overload = np.where(has_prev, (volume - prev_volume) / np.where(has_prev, prev_volume, 1), 0.0)
+        bmi = weight / ((height / 100) ** 2)
+        waist_to_height = waist / height
+
+    X = np.column_stack([
+        _numeric_column(current, 'pain_level'), intensity, gender, fitness_level,
+        _numeric_column(current, 'bicep_cm'), _numeric_column(current, 'chest_cm'), _numeric_column(current, 'shoulder_cm'), _numeric_column(current, 'lat_cm'),
+        waist, _numeric_column(current, 'abs_cm'), _numeric_column(current, 'thigh_cm'), _numeric_column(current, 'calf_cm'),
+        _numeric_column(current, 'blood_sugar_mg_dl'), _numeric_column(current, 'cholesterol_mg_dl'), height, weight,
+        bmi, waist_to_height, volume, load * (1 + reps / 30), overload, volume,
+    ])
+    valid = text_ok & np.isfinite(X).all(axis=1)
+    logger.info(f"Batch feature matrix shape: {X.shape}, {int((~valid).sum())} invalid rows")
+    return X, valid
+
+# Exercise vocabularies, sorted so training and serving agree on column order.
+# The vocabulary a model was trained with is saved with it (on scaler_X, in
+# the .npz export and in training_state) and serving encodes against that,
+# so catalog edits cannot shift or resize the model's input.
+def build_exercise_vocab(exercise_df):
+    return {
+        'ExerciseName': sorted(exercise_df['ExerciseName'].dropna().astype(str).unique()),
+        'ExerciseType': sorted(exercise_df['ExerciseType'].dropna().astype(str).unique()),
+        'TargetMuscle': sorted(exercise_df['TargetMuscle'].dropna().astype(str).unique()),
+    }
+
+def exercise_encoding_dim(vocab):
+    return sum(len(values) for values in vocab.values())
+
+# One-hot encode exercise identity, type and target muscle, one row per exercise
+def encode_exercises(exercise_rows, vocab, dtype=np.float64):
+    blocks = []
+    for column, values in vocab.items():
+        codes = pd.Categorical(exercise_rows[column].astype(str), categories=values).codes
+        block = np.zeros((len(exercise_rows), len(values)), dtype=dtype)
+        known = codes >= 0
+        block[np.flatnonzero(known), codes[known]] = 1.0
+        blocks.append(block)
+    return np.hstack(blocks)
+
+# The vocabulary a model's scaler_X was saved with. Models saved before it
+# was stored fall back to the live catalog.
+def model_exercise_vocab(scaler_X, exercise_df):
+    vocab = getattr(scaler_X, 'exercise_vocab', None)
+    if vocab is None:
+        logger.warning("Model has no saved exercise vocabulary; encoding against the current catalog")
+        return build_exercise_vocab(exercise_df)
+    return vocab
+
+# Models trained before exercise encoding take only the user's features, so
+# every exercise gets the same predicted reps and weight
+def uses_exercise_encoding(scaler_X):
+    return scaler_X.n_features_in_ != len(BASE_FEATURES)
+
+_warned_unknown = set()
+_warned_legacy = False
+
+# Log catalog exercises the model was not trained on, once per name; they are
+# scored with an all-zero exercise encoding
+def warn_unknown_exercises(exercise_df, vocab):
+    unknown = set(exercise_df['ExerciseName'].dropna().astype(str)) - set(vocab['ExerciseName']) - _warned_unknown
+    if unknown:
+        _warned_unknown.update(unknown)
+        logger.warning(f"Exercises not in the model's vocabulary, scored without an exercise encoding: {sorted(unknown)}")
+
+# Pair each user's feature vector with every candidate exercise. Models trained
+# before exercise encoding expect the bare user rows, which are returned as is.
+def build_exercise_batch(X_input, exercise_df, n_features, vocab=None):
+    if n_features == X_input.shape[1]:
+        return X_input
+    if vocab is None:
+        vocab = build_exercise_vocab(exercise_df)
+    warn_unknown_exercises(exercise_df, vocab)
+    if n_features != X_input.shape[1] + exercise_encoding_dim(vocab):
+        raise ValueError(f"Model expects {n_features} features, exercise vocabulary provides "
+                         f"{X_input.shape[1] + exercise_encoding_dim(vocab)}")
+    user_rows = np.repeat(X_input, len(exercise_df), axis=0)
+    exercise_rows = np.tile(encode_exercises(exercise_df, vocab), (len(X_input), 1))
+    return np.hstack([user_rows, exercise_rows])
+
 def build_model(input_dim, output_dim):
+    from tensorflow.keras.models import Sequential
+    from tensorflow.keras.layers import Dense, Dropout
     logger.info(f"Building model with input dim {input_dim} and output dim {output_dim}")
+    keras_custom_objects()
     model = Sequential([
         Dense(128, activation='relu', input_shape=(input_dim,)),
         Dropout(0.2),
@@ -107,10 +247,13 @@ def build_model(input_dim, output_dim):
     return model
 
 def load_model_and_scalers(model_path='models/workout_model.h5', scaler_X_path='models/scaler_X.pkl', scaler_y_path='models/scaler_y.pkl'):
+    import tensorflow as tf
     logger.info("Loading model and scalers from disk")
-    model = tf.keras.models.load_model(model_path, custom_objects={'mse_registered': mse_registered})
+    model = tf.keras.models.load_model(model_path, custom_objects=keras_custom_objects())
     scaler_X = joblib.load(scaler_X_path)
     scaler_y = joblib.load(scaler_y_path)
+    if getattr(scaler_X, 'exercise_vocab', None) is None:
+        scaler_X.exercise_vocab = load_training_state(os.path.dirname(scaler_X_path)).get('exercise_vocab')
     logger.info("Model and scalers loaded successfully")
     return model, scaler_X, scaler_y
 
@@ -127,28 +270,36 @@ def balanced_exercise_selection(candidates, num_per_type=2):
 
     return selected
 
-def recommend_workout(username, model=None, scaler_X=None, scaler_y=None, exercise_csv='data/exercise_items.csv', feedback_csv='data/feedback_logs.csv'):
-    logger.info(f"Generating workout recommendation for user: {username}")
-    current, previous = load_user_feedback(username, feedback_csv, exercise_csv)
-    X_input = preprocess_features(current, previous)
-    X_scaled = scaler_X.transform(X_input)
-
-    fitness_level = current['fitness_level'].lower()
-    max_exercises = FITNESS_EXERCISE_LIMIT.get(fitness_level, 6)
-    logger.info(f"User fitness level: {fitness_level}, max exercises allowed: {max_exercises}")
-
-    exercise_df = pd.read_csv(exercise_csv)
+# Predict (reps, weight) for every user row x exercise in one forward pass.
+# Returns an array of shape (n_users, n_exercises, 2).
+def predict_exercise_targets(X_users, exercise_df, model, scaler_X, scaler_y):
+    global _warned_legacy
+    if scaler_X.n_features_in_ == X_users.shape[1]:
+        if not _warned_legacy:
+            _warned_legacy = True
+            logger.warning("Serving a workout model without exercise encoding: every exercise gets the same "
+                           "predicted reps and weight until the model is retrained")
+        X_batch = X_users
+    else:
+        X_batch = build_exercise_batch(X_users, exercise_df, scaler_X.n_features_in_,
+                                       model_exercise_vocab(scaler_X, exercise_df))
+    X_scaled = scaler_X.transform(X_batch)
+    with stage('keras_predict'):
+        y_scaled = model.predict(X_scaled, verbose=0)
+    y_pred = scaler_y.inverse_transform(y_scaled)
+    if len(y_pred) == len(X_users):
+        y_pred = np.repeat(y_pred, len(exercise_df), axis=0)
+    return y_pred.reshape(len(X_users), len(exercise_df), -1)
+
+# Turn per-exercise predictions into a balanced, size-limited workout
+def select_workout(exercise_df, y_pred, max_exercises):
     outputs = []
-
-    # Predict scores for all exercises
-    for i, (_, row) in enumerate(exercise_df.iterrows()):
-        pred = model.predict(X_scaled, verbose=0)
-        y_pred = scaler_y.inverse_transform(pred)[0]
+    for (_, row), (reps, weight) in zip(exercise_df.iterrows(), y_pred):
         outputs.append({
             'name': row['ExerciseName'],
             'type': row['ExerciseType'],
-            'reps': int(round(y_pred[0])),
-            'weight': int(round(y_pred[1])),
+            'reps': int(round(reps)),
+            'weight': int(round(weight)),
             'muscle_group': row.get('TargetMuscle', 'Unknown')
         })
 
@@ -170,30 +321,75 @@ def recommend_workout(username, model=None, scaler_X=None, scaler_y=None, exerci
         balanced_selection.extend(to_add)
 
     # Trim to max_exercises just in case
-    final_recommendations = balanced_selection[:max_exercises]
+    return balanced_selection[:max_exercises]
 
-    logger.info(f"Workout recommendation generated with {len(final_recommendations)} exercises")
-    return final_recommendations
+def recommend_workout(username, model=None, scaler_X=None, scaler_y=None, exercise_csv='data/exercise_items.csv', feedback_csv='data/feedback_logs.csv'):
+    logger.info(f"Generating workout recommendation for user: {username}")
+    with stage('csv_load'):
+        current, previous = load_user_feedback(username, feedback_csv, exercise_csv)
+    with stage('preprocess_features'):
+        X_input = preprocess_features(current, previous)
 
-def train_workout_model(csv_path='data/feedback_logs.csv',
-                        exercise_csv='data/exercise_items.csv',
-                        save_dir='models',
-                        sample_frac=1.0,
-                        batch_size=64,
-                        epochs=50,
-                        verbose=1):
-    logger.info("Starting training of workout recommendation model")
-    feedback_df = pd.read_csv(csv_path)
-    exercise_df = pd.read_csv(exercise_csv)
-    df = feedback_df.merge(
-        exercise_df[['ExerciseName', 'ExerciseType', 'TargetMuscle']],
-        left_on='exercise_name', right_on='ExerciseName', how='left'
-    )
+    fitness_level = current['fitness_level'].lower()
+    max_exercises = FITNESS_EXERCISE_LIMIT.get(fitness_level, 6)
+    logger.info(f"User fitness level: {fitness_level}, max exercises allowed: {max_exercises}")
 
-    if sample_frac < 1.0:
-        df = df.sample(frac=sample_frac, random_state=42).reset_index(drop=True)
-        logger.info(f"Sampled {len(df)} rows from feedback logs for training")
+    with stage('csv_load'):
+        exercise_df = read_csv_cached(exercise_csv, EXERCISE_SCHEMA)
+
+    # Score every candidate exercise in a single forward pass
+    y_pred = predict_exercise_targets(X_input, exercise_df, model, scaler_X, scaler_y)[0]
+    with stage('balanced_exercise_selection'):
+        final_recommendations = select_workout(exercise_df, y_pred, max_exercises)
 
+    logger.info(f"Workout recommendation generated with {len(final_recommendations)} exercises")
+    return final_recommendations
+
+# Recommend workouts for many users with one feature build and one forward pass.
+# Returns one {'username', 'result'} or {'username', 'error'} entry per input.
+def recommend_workout_batch(usernames, model=None, scaler_X=None, scaler_y=None, exercise_csv='data/exercise_items.csv', feedback_csv='data/feedback_logs.csv'):
+    logger.info(f"Generating workout recommendations for {len(usernames)} users")
+    with stage('csv_load'):
+        index = get_feedback_index(feedback_csv)
+        errors, currents, previous = {}, [], []
+        for username in usernames:
+            latest, prev = index.lookup(username)
+            if latest is None:
+                errors[username] = f"No feedback logs found for user {username}"
+                continue
+            currents.append(latest)
+            previous.append(prev)
+        exercise_df = read_csv_cached(exercise_csv, EXERCISE_SCHEMA)
+
+    users = []
+    if currents:
+        with stage('preprocess_features'):
+            X_users, valid = preprocess_features_batch(pd.DataFrame(currents), pd.DataFrame([p or {} for p in previous], index=range(len(previous))))
+        for i, ok in enumerate(valid):
+            if not ok:
+                errors[currents[i]['username']] = "Error in preprocessing: invalid or missing feature values"
+        users = [currents[i] for i in np.flatnonzero(valid)]
+        X_users = X_users[valid]
+
+    results = {}
+    if users:
+        y_pred = predict_exercise_targets(X_users, exercise_df, model, scaler_X, scaler_y)
+        for current, user_pred in zip(users, y_pred):
+            max_exercises = FITNESS_EXERCISE_LIMIT.get(str(current['fitness_level']).lower(), 6)
+            with stage('balanced_exercise_selection'):
+                results[current['username']] = select_workout(exercise_df, user_pred, max_exercises)
+
+    logger.info(f"Batch workout recommendation: {len(results)} succeeded, {len(errors)} failed")
+    return [{'username': u, 'result': results[u]} if u in results else {'username': u, 'error': errors[u]}
+            for u in usernames]
+
+# Clean merged feedback rows and derive the model features. label_classes
+# pins the gender/fitness_level encodings fitted on an earlier run and
+# last_volume seeds each user's overload chain when training on new rows only.
+# Returns the prepared frame and the label classes used.
+def prepare_training_frame(df, label_classes=None, last_volume=None):
+    from sklearn.preprocessing import LabelEncoder
+    df = df.copy()
     df['intensity'] = df['intensity'].astype(str).str.lower().map(INTENSITY_MAP)
     if df['intensity'].isnull().any():
         missing_vals = df[df['intensity'].isnull()]['intensity']
@@ -201,8 +397,18 @@ def train_workout_model(csv_path='data/feedback_logs.csv',
         raise ValueError(f"Unmapped intensity values found: {missing_vals.unique()}")
 
     df['pain_level'] = pd.to_numeric(df['pain_level'], errors='coerce')
-    df['gender'] = LabelEncoder().fit_transform(df['gender'])
-    df['fitness_level'] = LabelEncoder().fit_transform(df['fitness_level'])
+    # Encoded from plain values: mapping a categorical would keep it categorical
+    for column in ['gender', 'fitness_level']:
+        df[column] = df[column].astype(object)
+    if label_classes is None:
+        label_classes = {}
+        for column in ['gender', 'fitness_level']:
+            encoder = LabelEncoder()
+            df[column] = encoder.fit_transform(df[column])
+            label_classes[column] = list(encoder.classes_)
+    else:
+        for column, classes in label_classes.items():
+            df[column] = df[column].map({value: i for i, value in enumerate(classes)})
     df.dropna(inplace=True)
     logger.info(f"Data cleaned, remaining samples: {len(df)}")
 
@@ -211,19 +417,90 @@ def train_workout_model(csv_path='data/feedback_logs.csv',
     df['volume'] = df['actual_reps'] * df['actual_weight'] * df['number_of_sets']
     df['est_1rm'] = df['actual_weight'] * (1 + df['actual_reps'] / 30)
 
-    df.sort_values(['username', 'date'], ascending=[True, True], inplace=True)
-    df['overload'] = df.groupby('username')['volume'].pct_change().fillna(0)
+    # Stable, so rows logged on the same date keep the order they were appended in
+    df.sort_values(['username', 'date'], ascending=[True, True], inplace=True, kind='mergesort')
+    if last_volume:
+        previous = df.groupby('username')['volume'].shift(1)
+        first = previous.isna()
+        previous[first] = df.loc[first, 'username'].map(last_volume)
+        df['overload'] = ((df['volume'] - previous) / previous).fillna(0)
+    else:
+        df['overload'] = df.groupby('username')['volume'].pct_change().fillna(0)
     logger.info("Computed overload feature")
 
     df['bodypart_volume'] = df['volume']
+    return df, label_classes
+
+# Feature/target matrices for a prepared frame, encoding exercises with vocab
+# (built from exercise_df when not given). Models trained on the bare 22
+# features (n_features == len(BASE_FEATURES)) get no exercise encoding.
+def build_training_matrix(df, exercise_df, n_features=None, vocab=None):
+    y = df[TARGETS].to_numpy(dtype=np.float32)
+    if n_features == len(BASE_FEATURES):
+        return df[BASE_FEATURES].to_numpy(dtype=np.float32), y
+    # Exercise identity/type/muscle columns let one model score every exercise
+    if vocab is None:
+        vocab = build_exercise_vocab(exercise_df)
+    X = np.hstack([df[BASE_FEATURES].to_numpy(dtype=np.float32), encode_exercises(df, vocab, dtype=np.float32)])
+    logger.info(f"Feature matrix built with {X.shape[1]} columns ({exercise_encoding_dim(vocab)} exercise encodings)")
+    return X, y
+
+# State an incremental retrain needs to continue from a training run: the
+# label encodings, the exercise vocabulary, how many bytes of the feedback log
+# were consumed and each user's last training volume (merged over
+# last_volume from earlier runs)
+def save_training_state(save_dir, label_classes, feedback_offset, df=None, last_volume=None, exercise_vocab=None):
+    last_volume = dict(last_volume or {})
+    if df is not None:
+        last_volume.update(df.groupby('username')['volume'].last().to_dict())
+    joblib.dump({'label_classes': label_classes, 'feedback_offset': feedback_offset, 'last_volume': last_volume,
+                 'exercise_vocab': exercise_vocab},
+                os.path.join(save_dir, 'training_state.pkl'))
+
+def load_training_state(model_dir):
+    path = os.path.join(model_dir, 'training_state.pkl')
+    if not os.path.exists(path):
+        return {'label_classes': None, 'feedback_offset': 0, 'last_volume': {}, 'exercise_vocab': None}
+    return dict({'exercise_vocab': None}, **joblib.load(path))
+
+def merge_exercise_details(feedback_df, exercise_df):
+    return feedback_df.merge(
+        exercise_df[['ExerciseName', 'ExerciseType', 'TargetMuscle']],
+        left_on='exercise_name', right_on='ExerciseName', how='left'
+    )
 
-    features = ['pain_level', 'intensity', 'gender', 'fitness_level', 'bicep_cm', 'chest_cm', 'shoulder_cm', 'lat_cm',
-                'waist_cm', 'abs_cm', 'thigh_cm', 'calf_cm', 'blood_sugar_mg_dl', 'cholesterol_mg_dl', 'height_cm',
-                'weight_kg', 'bmi', 'waist_to_height', 'volume', 'est_1rm', 'overload', 'bodypart_volume']
-    targets = ['actual_reps', 'actual_weight']
+def train_workout_model(csv_path='data/feedback_logs.csv',
+                        exercise_csv='data/exercise_items.csv',
+                        save_dir='models',
+                        sample_frac=1.0,
+                        batch_size=64,
+                        epochs=50,
+                        verbose=1,
+                        callbacks=None,
+                        chunk_rows=TRAIN_CHUNK_ROWS):
+    if chunk_rows:
+        return train_workout_model_chunked(csv_path, exercise_csv, save_dir, chunk_rows=chunk_rows,
+                                           sample_frac=sample_frac, batch_size=batch_size, epochs=epochs,
+                                           verbose=verbose, callbacks=callbacks)
+    from tensorflow.keras.callbacks import EarlyStopping
+    from sklearn.model_selection import train_test_split
+    from sklearn.preprocessing import StandardScaler
+    logger.info("Starting training of workout recommendation model")
+    # Rows up to the last newline; one appendCSV is still writing waits for
+    # the next incremental retrain
+    feedback_offset = settled_size(csv_path)
+    with open(csv_path, 'rb') as f:
+        feedback_df = FEEDBACK_SCHEMA.read_csv(io.BytesIO(f.read(feedback_offset)))
+    exercise_df = EXERCISE_SCHEMA.read_csv(exercise_csv)
+    df = merge_exercise_details(feedback_df, exercise_df)
 
-    X = df[features].values
-    y = df[targets].values
+    if sample_frac < 1.0:
+        df = df.sample(frac=sample_frac, random_state=42).reset_index(drop=True)
+        logger.info(f"Sampled {len(df)} rows from feedback logs for training")
+
+    df, label_classes = prepare_training_frame(df)
+    vocab = build_exercise_vocab(exercise_df)
+    X, y = build_training_matrix(df, exercise_df, vocab=vocab)
 
     scaler_X = StandardScaler()
     scaler_y = StandardScaler()
@@ -241,13 +518,161 @@ def train_workout_model(csv_path='data/feedback_logs.csv',
                         epochs=epochs,
                         batch_size=batch_size,
                         verbose=verbose,
-                        callbacks=[early_stop])
+                        callbacks=[early_stop] + list(callbacks or []))
     logger.info(f"Training completed after {len(history.history['loss'])} epochs")
 
+    scaler_X.exercise_vocab = vocab
+    save_workout_artifacts(save_dir, model, scaler_X, scaler_y)
+    save_training_state(save_dir, label_classes, feedback_offset, df, exercise_vocab=vocab)
+    logger.info(f"Model and scalers saved to {save_dir}")
+
+    return model, scaler_X, scaler_y
+
+def save_workout_artifacts(save_dir, model, scaler_X, scaler_y):
     os.makedirs(save_dir, exist_ok=True)
     model.save(os.path.join(save_dir, 'workout_model.h5'))
     joblib.dump(scaler_X, os.path.join(save_dir, 'scaler_X.pkl'))
     joblib.dump(scaler_y, os.path.join(save_dir, 'scaler_y.pkl'))
+    export_numpy_artifact(model, scaler_X, scaler_y, os.path.join(save_dir, 'workout_model.npz'))
+
+# Read-only view of a binary file that ends at `end`, so rows appended while
+# a training run streams the log are left for the next incremental retrain
+class _BoundedReader(io.RawIOBase):
+    def __init__(self, f, end):
+        self.f = f
+        self.end = end
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        n = min(len(buffer), self.end - self.f.tell())
+        if n <= 0:
+            return 0
+        data = self.f.read(n)
+        buffer[:len(data)] = data
+        return len(data)
+
+def iter_feedback_chunks(csv_path, end, chunk_rows, **read_kwargs):
+    with open(csv_path, 'rb') as f:
+        yield from FEEDBACK_SCHEMA.iter_csv(io.BufferedReader(_BoundedReader(f, end)), chunk_rows, **read_kwargs)
+
+# The gender/fitness_level encodings LabelEncoder would fit on the whole log
+def scan_label_classes(csv_path, end, chunk_rows):
+    values = {'gender': set(), 'fitness_level': set()}
+    for chunk in iter_feedback_chunks(csv_path, end, chunk_rows, usecols=list(values)):
+        for column, seen in values.items():
+            seen.update(chunk[column].dropna().unique())
+    return {column: sorted(seen) for column, seen in values.items()}
+
+# Batches read from float32 files spilled by train_workout_model_chunked and
+# scaled on the fly. Each batch is a single read rather than a memory map, so
+# the spilled data never counts towards the process's memory. Batch order is
+# reshuffled every epoch; rows were shuffled within each chunk when spilled.
+def spilled_batches(X_path, y_path, n_rows, n_features, scaler_X, scaler_y, batch_size, shuffle, seed=42):
+    from tensorflow.keras.utils import Sequence
+
+    def read(path, width, start, count):
+        rows = np.fromfile(path, dtype=np.float32, count=count * width, offset=start * width * 4)
+        return rows.reshape(-1, width)
+
+    class SpilledBatches(Sequence):
+        def __init__(self):
+            super().__init__()
+            self.order = np.arange(math.ceil(n_rows / batch_size))
+            self.rng = np.random.default_rng(seed)
+            self.on_epoch_end()
+
+        def __len__(self):
+            return len(self.order)
+
+        def __getitem__(self, i):
+            start = int(self.order[i]) * batch_size
+            count = min(batch_size, n_rows - start)
+            return (scaler_X.transform(read(X_path, n_features, start, count)).astype(np.float32),
+                    scaler_y.transform(read(y_path, len(TARGETS), start, count)).astype(np.float32))
+
+        def on_epoch_end(self):
+            if shuffle:
+                self.rng.shuffle(self.order)
+
+    return SpilledBatches()
+
+# Out-of-core variant of train_workout_model for feedback logs too large to
+# hold in memory. The log is streamed in chunks of chunk_rows rows, twice:
+# once for the label encodings, then to build features chunk by chunk (each
+# user's overload chain carries across chunks, so rows must be appended in
+# date order per user, as the API writes them), fit the scalers with
+# partial_fit and spill the matrices to float32 files under spill_dir. Keras
+# then trains from those files through a Sequence (see spilled_batches), so peak memory depends on
+# chunk_rows and batch_size, not on the size of the log.
+def train_workout_model_chunked(csv_path='data/feedback_logs.csv',
+                                exercise_csv='data/exercise_items.csv',
+                                save_dir='models',
+                                chunk_rows=100000,
+                                spill_dir=None,
+                                sample_frac=1.0,
+                                batch_size=64,
+                                epochs=50,
+                                verbose=1,
+                                callbacks=None):
+    from tensorflow.keras.callbacks import EarlyStopping
+    from sklearn.preprocessing import StandardScaler
+    logger.info(f"Starting chunked training of workout recommendation model ({chunk_rows} rows per chunk)")
+    feedback_offset = settled_size(csv_path)
+    exercise_df = EXERCISE_SCHEMA.read_csv(exercise_csv)
+    label_classes = scan_label_classes(csv_path, feedback_offset, chunk_rows)
+    vocab = build_exercise_vocab(exercise_df)
+    scaler_X = StandardScaler()
+    scaler_y = StandardScaler()
+    last_volume = {}
+    counts = {'train': 0, 'val': 0}
+
+    with tempfile.TemporaryDirectory(prefix='workout-train-', dir=spill_dir) as tmp:
+        paths = {(split, kind): os.path.join(tmp, f'{split}_{kind}.f32') for split in counts for kind in 'Xy'}
+        files = {key: open(path, 'wb') for key, path in paths.items()}
+        try:
+            for i, chunk in enumerate(iter_feedback_chunks(csv_path, feedback_offset, chunk_rows)):
+                if sample_frac < 1.0:
+                    chunk = chunk.sample(frac=sample_frac, random_state=42 + i)
+                df, _ = prepare_training_frame(merge_exercise_details(chunk, exercise_df), label_classes, last_volume)
+                if df.empty:
+                    continue
+                last_volume.update(df.groupby('username')['volume'].last().to_dict())
+                X, y = build_training_matrix(df, exercise_df, vocab=vocab)
+                scaler_X.partial_fit(X)
+                scaler_y.partial_fit(y)
+                rng = np.random.default_rng([42, i])
+                order = rng.permutation(len(X))
+                is_val = rng.random(len(X)) < VALIDATION_FRACTION
+                for split, rows in (('train', order[~is_val[order]]), ('val', order[is_val[order]])):
+                    files[(split, 'X')].write(X[rows].astype(np.float32).tobytes())
+                    files[(split, 'y')].write(y[rows].astype(np.float32).tobytes())
+                    counts[split] += len(rows)
+                n_features = X.shape[1]
+        finally:
+            for f in files.values():
+                f.close()
+        if counts['train'] == 0:
+            raise ValueError(f"No usable training rows in {csv_path}")
+        logger.info(f"Spilled train ({counts['train']}) and val ({counts['val']}) rows to {tmp}")
+
+        train = spilled_batches(paths[('train', 'X')], paths[('train', 'y')], counts['train'], n_features,
+                                scaler_X, scaler_y, batch_size, shuffle=True)
+        val = None
+        if counts['val']:
+            val = spilled_batches(paths[('val', 'X')], paths[('val', 'y')], counts['val'], n_features,
+                                  scaler_X, scaler_y, batch_size, shuffle=False)
+
+        model = build_model(input_dim=n_features, output_dim=len(TARGETS))
+        early_stop = EarlyStopping(monitor='val_loss' if val is not None else 'loss', patience=5, restore_best_weights=True)
+        history = model.fit(train, validation_data=val, epochs=epochs, verbose=verbose,
+                            callbacks=[early_stop] + list(callbacks or []))
+        logger.info(f"Training completed after {len(history.history['loss'])} epochs")
+
+    scaler_X.exercise_vocab = vocab
+    save_workout_artifacts(save_dir, model, scaler_X, scaler_y)
+    save_training_state(save_dir, label_classes, feedback_offset, last_volume=last_volume, exercise_vocab=vocab)
     logger.info(f"Model and scalers saved to {save_dir}")
 
     return model, scaler_X, scaler_y
@@ -0,0 +1,200 @@
+# serve.py
+#
+# Production entry point for the ML service. The parent process loads the
+# workout model, scalers, diet forecaster and data catalogs once, freezes
+# them out of the garbage collector's reach and forks --workers processes
+# that share that memory copy-on-write and accept connections on one listening socket. Each
+# worker pins its BLAS/OpenMP/TensorFlow intra-op thread pools to
+# --threads-per-worker (default: cores // workers) so workers don't
+# oversubscribe the cores between them. The parent restarts workers that die
+# and stops them all on SIGTERM/SIGINT. Run from backend/ml_model:
+#
+#     python serve.py --workers 4 --port 5001
+import argparse
+import gc
+import logging
+import os
+import signal
+import socket
+import sys
+import time
+
+# Read by OpenMP, OpenBLAS, MKL and TensorFlow when their pools are created,
+# so they are set before numpy (or anything else) is imported
+THREAD_ENV_VARS = ('OMP_NUM_THREADS', 'OPENBLAS_NUM_THREADS', 'MKL_NUM_THREADS', 'NUMEXPR_NUM_THREADS',
+                   'TF_NUM_INTRAOP_THREADS')
+# A worker that exits sooner than this after starting is restarted only after
+# this long, so a worker that cannot start does not spin
+MIN_WORKER_LIFETIME = 1.0
+
+logger = logging.getLogger('serve')
+
+
+def parse_args(argv=None):
+    cores = len(os.sched_getaffinity(0))
+    parser = argparse.ArgumentParser(description='Serve the ML API with preloaded, forked workers')
+    parser.add_argument('--host', default=os.environ.get('ML_HOST', '0.0.0.0'))
+    parser.add_argument('--port', type=int, default=int(os.environ.get('ML_PORT', 5001)))
+    parser.add_argument('--workers', type=int, default=int(os.environ.get('ML_WORKERS', cores)))
+    parser.add_argument('--threads-per-worker', type=int, default=None,
+                        help='intra-op threads per worker (default: cores // workers)')
+    parser.add_argument('--threaded', action='store_true',
+                        help='handle each request on its own thread within a worker, so concurrent '
+                             'workout predicts can share a batch')
+    parser.add_argument('--backlog', type=int, default=1024, help='listen queue length')
+    args = parser.parse_args(argv)
+    if args.workers < 1:
+        parser.error('--workers must be at least 1')
+    if args.threads_per_worker is None:
+        args.threads_per_worker = max(1, cores // args.workers)
+    return args
+
+
+def pin_threads(n):
+    for var in THREAD_ENV_VARS:
+        os.environ[var] = str(n)
+    os.environ.setdefault('TF_NUM_INTEROP_THREADS', '1')
+
+
+# Train the initial model in a throwaway child, so TensorFlow's thread pools
+# never exist in the process that forks the workers
+def train_in_child(app):
+    pid = os.fork()
+    if pid == 0:
+        code = 1
+        try:
+            app.train_workout_model(csv_path=app.FEEDBACK_CSV, save_dir=app.MODEL_DIR, epochs=app.TRAIN_EPOCHS, verbose=0)
+            code = 0
+        except Exception:
+            logger.exception("Training the workout model failed")
+        finally:
+            os._exit(code)
+    _, status = os.waitpid(pid, 0)
+    if os.waitstatus_to_exitcode(status) != 0:
+        raise SystemExit("Could not train the workout model")
+
+
+# Load everything requests read into the parent. The numpy backend is loaded
+# here and shared; the Keras backend starts TensorFlow, which does not survive
+# a fork, so each worker loads it itself.
+def preload(app):
+    from model.daily_macros import default_daily_macros
+    from model.datastore import read_csv_cached
+    from model.feedback_index import get_feedback_index
+    from model.food_catalog import get_food_catalog
+    from model.global_forecaster import get_global_forecaster
+    from model.model_store import artifact_paths, current_model_dir
+    from model.schema import EXERCISE_SCHEMA
+    from model.utils import load_all_logs, load_all_profiles
+
+    start = time.perf_counter()
+    paths = artifact_paths(current_model_dir(base_dir=app.MODEL_DIR))
+    if not all(os.path.exists(paths[name]) for name in ('model', 'scaler_X', 'scaler_y')):
+        logger.warning("Model or scaler files not found. Training new model...")
+        train_in_child(app)
+        paths = artifact_paths(current_model_dir(base_dir=app.MODEL_DIR))
+    if app.WORKOUT_BACKEND == 'numpy' and os.path.exists(paths['npz']):
+        app.workout_bootstrap.start()
+        if not app.workout_bootstrap.wait():
+            raise SystemExit(f"Could not load the workout model: {app.workout_bootstrap.status()}")
+    else:
+        logger.warning("Keras backend selected; each worker loads its own copy of the model")
+
+    for name, load in (('food catalog', get_food_catalog), ('feedback index', lambda: get_feedback_index(app.FEEDBACK_CSV)),
+                       ('user profiles', load_all_profiles), ('diet logs', load_all_logs),
+                       ('daily macro totals', default_daily_macros.refresh),
+                       ('exercise items', lambda: read_csv_cached('data/exercise_items.csv', EXERCISE_SCHEMA)),
+                       ('diet forecaster', get_global_forecaster)):
+        try:
+            load()
+        except Exception as e:
+            logger.warning(f"Could not preload {name}: {e}")
+    logger.info(f"Preloaded model and data in {time.perf_counter() - start:.2f}s")
+
+
+def run_worker(app, listener, args):
+    from threadpoolctl import threadpool_limits
+    from werkzeug.serving import make_server
+
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    # Ctrl-C reaches the whole process group; the parent turns it into SIGTERM
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    threadpool_limits(args.threads_per_worker)
+    # Threads do not survive fork, so background work starts here
+    if not app.workout_bootstrap.ready():
+        app.workout_bootstrap.start()
+    app.workout_store.start_watcher()
+    server = make_server(args.host, args.port, app.app, threaded=args.threaded, fd=listener.fileno())
+    logger.info(f"Worker {os.getpid()} serving on {args.host}:{args.port}")
+    server.serve_forever()
+
+
+def spawn_worker(app, listener, args):
+    pid = os.fork()
+    if pid == 0:
+        code = 1
+        try:
+            run_worker(app, listener, args)
+            code = 0
+        except Exception:
+            logger.exception("Worker failed")
+        finally:
+            os._exit(code)
+    return pid
+
+
+# Keep args.workers workers running until SIGTERM/SIGINT, then stop them
+def supervise(app, listener, args):
+    started = {}
+    for _ in range(args.workers):
+        started[spawn_worker(app, listener, args)] = time.monotonic()
+    stopping = False
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in list(started):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    while started:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        since = started.pop(pid, None)
+        if since is None or stopping:
+            continue
+        logger.warning(f"Worker {pid} exited with status {os.waitstatus_to_exitcode(status)}; restarting")
+        lifetime = time.monotonic() - since
+        if lifetime < MIN_WORKER_LIFETIME:
+            time.sleep(MIN_WORKER_LIFETIME - lifetime)
+        if not stopping:
+            started[spawn_worker(app, listener, args)] = time.monotonic()
+    logger.info("All workers stopped")
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    pin_threads(args.threads_per_worker)
+    os.environ['ML_PREFORK'] = '1'
+    import app
+
+    preload(app)
+    # Objects loaded so far are never collected; keeping the collector off
+    # them stops workers from writing to (and so copying) the shared pages
+    gc.collect()
+    gc.freeze()
+    listener = socket.create_server((args.host, args.port), backlog=args.backlog)
+    # Workers race to accept; the losers get EAGAIN instead of blocking
+    listener.setblocking(False)
+    logger.info(f"Starting {args.workers} workers with {args.threads_per_worker} intra-op threads each")
+    supervise(app, listener, args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
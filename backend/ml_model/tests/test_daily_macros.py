@@ -0,0 +1,49 @@
+# Run from backend/ml_model: python -m pytest tests
+import os
+import numpy as np
+from model.daily_macros import DailyMacroStore
+from model.datastore import CSVCache
+from model.schema import DIET_LOG_SCHEMA
+
+HEADER = 'username,date,weight_kg,meal_type,calories,protein_g,carbs_g,fat_g,fooditem\n'
+
+
+def write(path, text, mtime_ns):
+    with open(path, 'w') as f:
+        f.write(text)
+    os.utime(path, ns=(mtime_ns, mtime_ns))
+
+
+def store_for(path):
+    cache = CSVCache()
+    return DailyMacroStore(source=lambda: cache.snapshot(path, DIET_LOG_SCHEMA))
+
+
+def test_returned_sequence_does_not_change(tmp_path):
+    path = str(tmp_path / 'diet_logs.csv')
+    rows = HEADER + 'user0,2025-01-01,70,lunch,500,30,60,20,Rice\nuser0,2025-01-02,70,lunch,400,20,50,10,Rice\n'
+    write(path, rows, 1_000_000_000)
+    store = store_for(path)
+    before = store.sequence('user0')
+    assert before[:, 0].tolist() == [500, 400]
+
+    # More rows for the current day, one of them still unterminated
+    write(path, rows + 'user0,2025-01-02,70,dinner,300,20,40,10,Rice\nuser0,2025-01-02,70,snack,100,5,10,5,Rice',
+          2_000_000_000)
+    assert store.sequence('user0')[:, 0].tolist() == [500, 800]
+    assert before[:, 0].tolist() == [500, 400]
+
+
+def test_trailing_row_is_reread_once_complete(tmp_path):
+    path = str(tmp_path / 'diet_logs.csv')
+    rows = HEADER + 'user0,2025-01-01,70,lunch,500,30,60,20,Rice\n'
+    # The newest row caught mid-write is held back until it is whole
+    write(path, rows + 'user0,2025-01-01,70,dinner,6', 1_000_000_000)
+    store = store_for(path)
+    assert np.array_equal(store.sequence('user0'), [[500, 30, 60, 20]])
+
+    write(path, rows + 'user0,2025-01-01,70,dinner,650,40,70,20,Rice\nuser1,2025-01-01,80,lunch,700,35,80,25,Rice',
+          2_000_000_000)
+    assert np.array_equal(store.sequence('user0'), [[1150, 70, 130, 40]])
+    assert np.array_equal(store.sequence('user1'), [[700, 35, 80, 25]])
+    assert store.stats()['rebuilds'] == 1
@@ -0,0 +1,49 @@
+# Run from backend/ml_model: python -m pytest tests
+import os
+from model.datastore import CSVCache
+
+
+def write(path, text, mtime_ns):
+    with open(path, 'w') as f:
+        f.write(text)
+    os.utime(path, ns=(mtime_ns, mtime_ns))
+
+
+def test_in_place_rewrite_of_earlier_row_reloads(tmp_path):
+    path = str(tmp_path / 'user_profiles.csv')
+    header = 'username,age,weight_kg,fitness_level\n'
+    write(path, header + 'user0,30,70,beginner\nuser1,40,80,advanced\n', 1_000_000_000)
+    cache = CSVCache()
+    assert cache.read(path)['weight_kg'].tolist() == [70, 80]
+
+    # Same length as before, as writeCSV produces for an edited profile
+    write(path, header + 'user0,30,99,advanced\nuser1,40,80,advanced\n', 2_000_000_000)
+    frame = cache.read(path)
+    assert frame.iloc[0].tolist() == ['user0', 30, 99, 'advanced']
+    assert cache.stats()[path]['full_loads'] == 2
+
+    # A longer file whose earlier row also changed
+    write(path, header + 'user0,30,71,advanced\nuser1,40,80,advanced\nuser2,50,90,beginner\n', 3_000_000_000)
+    assert cache.read(path)['weight_kg'].tolist() == [71, 80, 90]
+    assert cache.stats()[path]['full_loads'] == 3
+
+
+def test_appended_rows_are_parsed_incrementally(tmp_path):
+    path = str(tmp_path / 'diet_logs.csv')
+    write(path, 'username,calories\nuser0,500\n', 1_000_000_000)
+    cache = CSVCache()
+    cache.read(path)
+    write(path, 'username,calories\nuser0,500\nuser1,600\n', 2_000_000_000)
+    assert cache.read(path)['calories'].tolist() == [500, 600]
+    assert cache.stats()[path]['full_loads'] == 1
+    assert cache.stats()[path]['tail_loads'] == 1
+
+
+def test_partly_written_trailing_row_is_held_back(tmp_path):
+    path = str(tmp_path / 'diet_logs.csv')
+    write(path, 'username,calories,fooditem\n"user0","500","Rice"\n"user1","6', 1_000_000_000)
+    cache = CSVCache()
+    snapshot = cache.snapshot(path)
+    assert snapshot.frame['calories'].tolist() == [500] and snapshot.settled_rows == 1
+    write(path, 'username,calories,fooditem\n"user0","500","Rice"\n"user1","650","Rice"', 2_000_000_000)
+    assert cache.read(path)['calories'].tolist() == [500, 650]
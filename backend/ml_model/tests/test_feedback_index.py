@@ -0,0 +1,85 @@
+# Run from backend/ml_model: python -m pytest tests
+import os
+from model.feedback_index import FeedbackIndex
+
+HEADER = 'username,date,exercise_name,actual_reps\n'
+
+
+def write(path, text, mtime_ns):
+    with open(path, 'w') as f:
+        f.write(text)
+    os.utime(path, ns=(mtime_ns, mtime_ns))
+
+
+def test_in_place_rewrite_of_earlier_row_rebuilds(tmp_path):
+    path = str(tmp_path / 'feedback_logs.csv')
+    write(path, HEADER + 'user0,2025-01-01,Squat,10\nuser0,2025-01-02,Squat,12\nuser1,2025-01-01,Row,8\n',
+          1_000_000_000)
+    index = FeedbackIndex(path, index_path=str(tmp_path / 'index.pkl'))
+    assert index.lookup('user0')[0]['actual_reps'] == 12
+
+    write(path, HEADER + 'user0,2025-01-01,Squat,10\nuser0,2025-01-02,Squat,15\nuser1,2025-01-01,Row,8\n',
+          2_000_000_000)
+    assert index.lookup('user0')[0]['actual_reps'] == 15
+
+
+def test_rows_are_ordered_by_parsed_date(tmp_path):
+    path = str(tmp_path / 'feedback_logs.csv')
+    # As strings "2025-1-9" sorts after "2025-01-10"
+    write(path, HEADER + 'user0,2025-01-10,Squat,10\nuser0,2025-1-9,Squat,12\n', 1_000_000_000)
+    latest, prev = FeedbackIndex(path, index_path=str(tmp_path / 'index.pkl')).lookup('user0')
+    assert (latest['actual_reps'], prev['actual_reps']) == (10, 12)
+
+
+def test_persisted_index_resumes(tmp_path):
+    path = str(tmp_path / 'feedback_logs.csv')
+    index_path = str(tmp_path / 'index.pkl')
+    write(path, HEADER + 'user0,2025-01-01,Squat,10\n', 1_000_000_000)
+    FeedbackIndex(path, index_path=index_path).rebuild()
+    write(path, HEADER + 'user0,2025-01-01,Squat,10\nuser0,2025-01-02,Squat,11\n', 2_000_000_000)
+    latest, prev = FeedbackIndex(path, index_path=index_path).lookup('user0')
+    assert (latest['actual_reps'], prev['actual_reps']) == (11, 10)
+    assert [name for name in os.listdir(tmp_path) if name.endswith('.tmp')] == []
+
+
+def test_partly_written_trailing_row_is_not_indexed(tmp_path):
+    path = str(tmp_path / 'feedback_logs.csv')
+    index_path = str(tmp_path / 'index.pkl')
+    rows = HEADER + '"u0","2025-01-01","Squat","10"'
+    write(path, rows + '\n"u0","2025-01-02",', 1_000_000_000)
+    index = FeedbackIndex(path, index_path=index_path)
+    assert index.lookup('u0')[0]['actual_reps'] == 10
+
+    # Cut inside a quoted field
+    write(path, rows + '\n"u0","2025-01-02","Sq', 2_000_000_000)
+    assert index.lookup('u0')[0]['actual_reps'] == 10
+
+    write(path, rows + '\n"u0","2025-01-02","Squat","12"', 3_000_000_000)
+    latest, prev = index.lookup('u0')
+    assert (latest['actual_reps'], prev['actual_reps']) == (12, 10)
+    assert index.usernames() == ['u0']
+
+    # The unterminated row is never persisted
+    index.rebuild()
+    persisted = FeedbackIndex(path, index_path=index_path)
+    persisted._load()
+    assert persisted.entries['u0'][0]['actual_reps'] == 10
+
+
+def test_rewrite_in_an_earlier_block_is_found(tmp_path, monkeypatch):
+    monkeypatch.setattr('model.feedback_index.VERIFY_BLOCK_BYTES', 64)
+    path = str(tmp_path / 'feedback_logs.csv')
+    rows = [f'user{i},2025-01-01,Squat,{i}\n' for i in range(20)]
+    write(path, HEADER + ''.join(rows), 1_000_000_000)
+    index = FeedbackIndex(path, index_path=str(tmp_path / 'index.pkl'))
+    assert index.lookup('user5')[0]['actual_reps'] == 5
+
+    rows[5] = 'user5,2025-01-01,Squat,9\n'
+    mtime = 2_000_000_000
+    for i in range(len(rows)):
+        rows.append(f'user{i},2025-01-02,Squat,{100 + i}\n')
+        write(path, HEADER + ''.join(rows), mtime + i)
+        if index.lookup('user5')[1] is not None and index.lookup('user5')[1]['actual_reps'] == 9:
+            break
+    else:
+        raise AssertionError('rewrite of an earlier row was never detected')
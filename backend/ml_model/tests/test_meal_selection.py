@@ -0,0 +1,26 @@
+# Run from backend/ml_model: python -m pytest tests
+import numpy as np
+import pandas as pd
+from benchmarks.bench_meal_selection import MEAL_TARGETS, legacy_select_meal, plan_day, synthetic_catalog
+from model.recommender import select_meal
+
+
+def test_matches_legacy_on_the_catalog():
+    for n in (31, 500):
+        catalog = synthetic_catalog(n)
+        assert plan_day(select_meal, catalog) == plan_day(legacy_select_meal, catalog)
+
+
+def test_matches_legacy_on_tied_scores():
+    # Few distinct nutrient values, so many foods share the top score
+    rng = np.random.default_rng(1)
+    for _ in range(50):
+        n = int(rng.integers(20, 400))
+        catalog = pd.DataFrame({'name': [f'food{i}' for i in range(n)],
+                                'calories': rng.choice([10.0, 20.0, 500.0, 900.0], n),
+                                'protein_g': rng.choice([1.0, 2.0, 50.0], n),
+                                'carbs_g': rng.choice([1.0, 3.0, 80.0], n),
+                                'fat_g': rng.choice([1.0, 2.0, 40.0], n)})
+        target = {'calories': 100.0, 'protein': 10.0, 'carbs': 10.0, 'fat': 5.0}
+        assert select_meal(catalog, target) == legacy_select_meal(catalog, target)
+        assert plan_day(select_meal, catalog) == plan_day(legacy_select_meal, catalog)
@@ -0,0 +1,27 @@
+# Run from backend/ml_model: python -m pytest tests
+import os
+from model.model_store import ModelStore, artifact_paths
+
+
+def write(path, text, mtime_ns):
+    with open(path, 'w') as f:
+        f.write(text)
+    os.utime(path, ns=(mtime_ns, mtime_ns))
+
+
+def test_artifacts_rewritten_in_place_are_reloaded(tmp_path):
+    base = tmp_path / 'models'
+    base.mkdir()
+    npz = artifact_paths(str(base))['npz']
+    write(npz, 'v1', 1_000_000_000)
+    loads = []
+    store = ModelStore(lambda model_dir: (loads.append(model_dir) or len(loads), None, None),
+                       root=str(tmp_path / 'versions'), base_dir=str(base), watch_seconds=0)
+    assert store.refresh() and not store.refresh()
+    first_key = store.version_key()
+
+    # A retrain saving into the same directory
+    write(npz, 'v2', 2_000_000_000)
+    assert store.refresh()
+    (bundle, _, _), version_key = store.current()
+    assert bundle == 2 and version_key != first_key
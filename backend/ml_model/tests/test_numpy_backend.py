@@ -0,0 +1,34 @@
+# Run from backend/ml_model: python -m pytest tests
+import os
+import numpy as np
+import pytest
+from model.numpy_backend import export_numpy_artifact, load_numpy_model_and_scalers
+
+MODEL_DIR = os.path.join(os.path.dirname(__file__), '..', 'models')
+
+
+def keras_backend():
+    pytest.importorskip('keras')
+    from model.workout import load_model_and_scalers
+    return load_model_and_scalers(os.path.join(MODEL_DIR, 'workout_model.h5'), os.path.join(MODEL_DIR, 'scaler_X.pkl'),
+                                  os.path.join(MODEL_DIR, 'scaler_y.pkl'))
+
+
+def predict(backend, X):
+    model, scaler_X, scaler_y = backend
+    return scaler_y.inverse_transform(model.predict(scaler_X.transform(X), verbose=0))
+
+
+def assert_parity(expected_backend, actual_backend):
+    X = np.random.default_rng(0).normal(size=(2048, expected_backend[1].n_features_in_)) * 10 + 50
+    np.testing.assert_allclose(predict(actual_backend, X), predict(expected_backend, X), rtol=1e-4, atol=1e-3)
+
+
+def test_shipped_npz_matches_keras():
+    assert_parity(keras_backend(), load_numpy_model_and_scalers(os.path.join(MODEL_DIR, 'workout_model.npz')))
+
+
+def test_export_matches_keras(tmp_path):
+    backend = keras_backend()
+    export_numpy_artifact(*backend, path=str(tmp_path / 'workout_model.npz'))
+    assert_parity(backend, load_numpy_model_and_scalers(str(tmp_path / 'workout_model.npz')))
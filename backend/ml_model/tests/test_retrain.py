@@ -0,0 +1,18 @@
+# Run from backend/ml_model: python -m pytest tests
+from model.retrain import read_feedback_since
+
+HEADER = 'username,date,exercise_name,actual_reps\n'
+ROW = '"u0","2025-01-01","Squat","10"\n'
+
+
+def test_partly_written_row_is_read_on_the_next_pass(tmp_path):
+    path = tmp_path / 'feedback_logs.csv'
+    path.write_text(HEADER + ROW + '"u0","2025-01-02","Sq')
+    rows, offset = read_feedback_since(str(path), 0)
+    assert rows['actual_reps'].tolist() == [10]
+    assert offset == len(HEADER + ROW)
+
+    path.write_text(HEADER + ROW + '"u0","2025-01-02","Squat","12"\n')
+    rows, offset = read_feedback_since(str(path), offset)
+    assert rows['actual_reps'].tolist() == [12]
+    assert offset == path.stat().st_size
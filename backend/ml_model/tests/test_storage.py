@@ -0,0 +1,24 @@
+# Run from backend/ml_model: python -m pytest tests
+from model.feedback_index import FeedbackIndex
+from model.storage import SqliteStore, migrate
+
+HEADER = 'username,date,exercise_name,actual_reps\n'
+
+
+def test_latest_feedback_matches_the_csv_index(tmp_path):
+    csv_path = str(tmp_path / 'feedback_logs.csv')
+    with open(csv_path, 'w') as f:
+        # Unpadded and unparseable dates, which sort differently as text
+        f.write(HEADER + 'user0,2025-01-10,Squat,10\nuser0,2025-1-9,Squat,12\nuser0,2025-01-10,Row,14\n'
+                'user1,not a date,Squat,5\nuser1,2025-2-1,Squat,6\nuser1,2025-01-03,Row,7\n')
+    db_path = str(tmp_path / 'storage.sqlite')
+    missing = str(tmp_path / 'missing.csv')
+    migrate(db_path, {'feedback_logs': csv_path, 'diet_logs': missing, 'user_profiles': missing})
+
+    index = FeedbackIndex(csv_path, index_path=str(tmp_path / 'index.pkl'))
+    store = SqliteStore(db_path)
+    for username in ('user0', 'user1', 'nobody'):
+        expected = [None if r is None else (r['exercise_name'], r['actual_reps']) for r in index.lookup(username)]
+        actual = [None if r is None else (r['exercise_name'], r['actual_reps']) for r in store.latest_feedback(username)]
+        assert actual == expected
+    assert [r['actual_reps'] for r in store.latest_feedback('user0')] == [14, 10]
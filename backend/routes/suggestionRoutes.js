@@ -30,4 +30,28 @@ res.status(500).json({ error: "Failed to fetch workout recommendation." });
 }
 });
 
+// Batch diet recommendations for many users in one Flask call
+router.post("/get-diet/batch", async (req, res) => {
+try {
+const { usernames } = req.body;
+const response = await axios.post("http://127.0.0.1:5001/recommend-diet/batch", { usernames });
+res.json(response.data);
+} catch (error) {
+console.error("Error getting batch diet recommendations:", error.message);
+res.status(500).json({ error: "Failed to fetch batch diet recommendations." });
+}
+});
+
+// Batch workout recommendations for many users in one Flask call
+router.post("/get-workout/batch", async (req, res) => {
+try {
+const { usernames } = req.body;
+const response = await axios.post("http://127.0.0.1:5001/recommend-workout/batch", { usernames });
+res.json(response.data);
+} catch (error) {
+console.error("Error getting batch workout recommendations:", error.message);
+res.status(500).json({ error: "Failed to fetch batch workout recommendations." });
+}
+});
+
 module.exports = router;
\ No newline at end of file
@@ -0,0 +1,86 @@
+const fs = require("fs");
+const path = require("path");
+
+// With STORAGE_BACKEND=sqlite the controllers read and write the WAL-mode
+// database the ML service reads (tables in ml_model/model/storage_schema.sql)
+// instead of the CSV files. better-sqlite3 (an optionalDependency, so a failed
+// native build does not break installs) is only required in that mode.
+const enabled = process.env.STORAGE_BACKEND === "sqlite";
+const dbPath = process.env.STORAGE_DB || path.join(__dirname, "../ml_model/data/storage.sqlite");
+const schemaPath = path.join(__dirname, "../ml_model/model/storage_schema.sql");
+
+let db = null;
+const statements = new Map();
+const tableColumns = new Map();
+
+function open() {
+  if (db) return db;
+  let Database;
+  try {
+    Database = require("better-sqlite3");
+  } catch (err) {
+    throw new Error("STORAGE_BACKEND=sqlite requires the better-sqlite3 package (npm install better-sqlite3)");
+  }
+  db = new Database(dbPath, { timeout: 5000 });
+  // Readers (the ML service) keep reading the last commit while we write
+  db.pragma("journal_mode = WAL");
+  db.pragma("synchronous = NORMAL");
+  db.exec(fs.readFileSync(schemaPath, "utf8"));
+  console.log(`Using SQLite storage at ${dbPath}`);
+  return db;
+}
+
+function statement(sql) {
+  let stmt = statements.get(sql);
+  if (!stmt) {
+    stmt = open().prepare(sql);
+    statements.set(sql, stmt);
+  }
+  return stmt;
+}
+
+// Table columns in CSV header order, without the internal row id
+function columns(table) {
+  if (!tableColumns.has(table)) {
+    const names = open().prepare(`PRAGMA table_info(${table})`).all().map(c => c.name).filter(n => n !== "id");
+    tableColumns.set(table, names);
+  }
+  return tableColumns.get(table);
+}
+
+// Empty form fields are stored as NULL, like a missing CSV value
+function values(table, obj) {
+  return columns(table).map(c => (obj[c] === undefined || obj[c] === "" ? null : obj[c]));
+}
+
+exports.enabled = enabled;
+exports.columns = columns;
+
+exports.get = (sql, ...params) => statement(sql).get(...params);
+
+exports.all = (sql, ...params) => statement(sql).all(...params);
+
+exports.insertRow = (table, obj) => {
+  const cols = columns(table);
+  statement(`INSERT INTO ${table} (${cols.join(",")}) VALUES (${cols.map(() => "?").join(",")})`)
+    .run(values(table, obj));
+};
+
+// Insert or replace the row with the same key (a profile update rewrites one
+// row instead of the whole file)
+exports.upsertRow = (table, key, obj) => {
+  const cols = columns(table);
+  const updates = cols.filter(c => c !== key).map(c => `${c} = excluded.${c}`).join(",");
+  statement(`INSERT INTO ${table} (${cols.join(",")}) VALUES (${cols.map(() => "?").join(",")}) ` +
+            `ON CONFLICT(${key}) DO UPDATE SET ${updates}`)
+    .run(values(table, obj));
+};
+
+// A row with every value as a string ("" for NULL), as readCSV returns it
+exports.asCSVRow = (row) => {
+  const result = {};
+  for (const key of Object.keys(row)) {
+    result[key] = row[key] === null || row[key] === undefined ? "" : String(row[key]);
+  }
+  return result;
+};